@@ -0,0 +1,164 @@
+"""Benchmarks the instruction throughput of the CPU emulator, run from
+projects/06, e.g.,
+
+    python -m CPUEmulator.benchmark --cycles 5000000 --output results.json
+
+Each program is set up by the load and set commands of its test script, so
+that it starts from the same state as when the script is run. It is then run
+for as many cycles as its script runs it, over and over, until it has run for
+the requested number of cycles. Programs without a test script, such as Pong,
+are run from reset for all of the cycles at once.
+
+With --translate, programs are run as Python basic blocks (see
+CPUEmulator.blocks) rather than an instruction at a time.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from array import array
+from typing import Optional
+
+from CPUEmulator.blocks import BlockCPU
+from CPUEmulator.cpu import CPU, load_program
+from CPUEmulator.script import Command, Repeat, TestScript
+
+PROJECTS_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEST_SCRIPTS = [
+    "04/mult/Mult.tst",
+    "05/ComputerAdd.tst",
+    "05/ComputerMax.tst",
+    "05/ComputerRect.tst",
+    "08/ProgramFlow/BasicLoop/BasicLoop.tst",
+    "08/ProgramFlow/FibonacciSeries/FibonacciSeries.tst",
+    "08/FunctionCalls/SimpleFunction/SimpleFunction.tst",
+    "08/FunctionCalls/NestedCall/NestedCall.tst",
+    "08/FunctionCalls/FibonacciElement/FibonacciElement.tst",
+    "08/FunctionCalls/StaticsTest/StaticsTest.tst",
+    "06/pong/Pong.asm",
+]
+DEFAULT_CYCLES = 1_000_000
+
+
+def prepare(path: str, translate: bool = False) -> tuple[CPU, Optional[int]]:
+    """Load the program of a test script, with its RAM and registers set as the
+    script sets them. Also returns the number of cycles the script runs it
+    for, or None for a program without a script."""
+    if not path.endswith(".tst"):
+        return (BlockCPU if translate else CPU)(load_program(path)), None
+    script = TestScript.from_file(path, translate)
+    for command in script.commands:
+        if isinstance(command, list) and (
+            command[0] in ("load", "set") or command[1:2] == ["load"]
+        ):
+            script.execute([command])
+    return script.cpu, _count_cycles(script.commands)
+
+
+def _count_cycles(commands: list[Command]) -> int:
+    cycles = 0
+    for command in commands:
+        if isinstance(command, Repeat):
+            cycles += (command.count or 0) * _count_cycles(command.body)
+        elif isinstance(command, list) and command[0] in ("ticktock", "tock"):
+            cycles += 1
+    return cycles
+
+
+def measure(path: str, cycles: int, translate: bool = False) -> float:
+    """Return the seconds taken to run the script's program for cycles. The
+    program is only run for as many cycles at a time as its script runs it,
+    after which it starts again from the same state."""
+    cpu, script_cycles = prepare(path, translate)
+    script_cycles = script_cycles or cycles
+    ram = array("h", cpu.ram)
+    registers = list(cpu.registers)
+    pc = cpu.pc
+
+    seconds = 0.0
+    done = 0
+    while done < cycles:
+        run_cycles = min(script_cycles, cycles - done)
+        start = time.perf_counter()
+        cpu.run(run_cycles)
+        seconds += time.perf_counter() - start
+        done += run_cycles
+        cpu.ram[:] = ram
+        cpu.registers[:] = registers
+        cpu.pc = pc
+    return seconds
+
+
+def run(
+    cycles: int, repeat: int, scripts: list[str], translate: bool = False
+) -> list[dict]:
+    results = []
+    for script in scripts:
+        seconds = min(
+            measure(os.path.join(PROJECTS_DIR, script), cycles, translate)
+            for _ in range(repeat)
+        )
+        results.append(
+            {
+                "program": os.path.splitext(os.path.basename(script))[0],
+                "cycles": cycles,
+                "seconds": seconds,
+                "instructions_per_second": cycles / seconds,
+            }
+        )
+        _print_result(results[-1])
+    return results
+
+
+def _print_result(result: dict) -> None:
+    print(
+        f"{result['program']:<20}"
+        f"{result['cycles']:>12,} cycles"
+        f"{result['seconds'] * 1000:>12.1f} ms"
+        f"{result['instructions_per_second']:>16,.0f} instructions/s"
+    )
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Benchmark the CPU emulator on the test programs"
+    )
+    argparser.add_argument("--cycles", type=int, default=DEFAULT_CYCLES)
+    argparser.add_argument("--repeat", type=int, default=3)
+    argparser.add_argument(
+        "--script", action="append", default=None,
+        help="a .tst or program file, relative to projects/, to benchmark;"
+        " may be repeated",
+    )
+    argparser.add_argument(
+        "--translate",
+        action="store_true",
+        help="run programs as Python basic blocks",
+    )
+    argparser.add_argument("--output", type=str, default=None,
+                           help="write the results to this JSON file")
+
+    args = argparser.parse_args()
+    results = run(args.cycles, args.repeat, args.script or TEST_SCRIPTS, args.translate)
+    total_cycles = sum(result["cycles"] for result in results)
+    total_seconds = sum(result["seconds"] for result in results)
+    print(f"{'total':<20}{total_cycles:>12,} cycles{total_seconds * 1000:>12.1f} ms"
+          f"{total_cycles / total_seconds:>16,.0f} instructions/s")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "python": sys.version,
+                    "parameters": {
+                        "cycles": args.cycles,
+                        "repeat": args.repeat,
+                        "translate": args.translate,
+                    },
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
@@ -0,0 +1,207 @@
+"""Runs Hack programs by translating them into Python, one basic block at a
+time, e.g.,
+
+    cpu = BlockCPU(load_program("pong/Pong.asm"))
+    cpu.run(10_000_000)
+
+A block starts wherever the program is entered, whether that is the start of
+the ROM, a label or a return address, and runs up to and including the next
+jump. Each block is generated as a single Python function which keeps A and D
+in locals and writes M straight to RAM, so that running a block costs one
+call rather than one per instruction. Where A holds a constant loaded earlier
+in the block, the constant is written in place of A.
+
+Blocks are compiled once and cached by their address and ROM words, so that
+running the same program again, or another program that shares code with it,
+doesn't compile them again. Cycle counts stay exact: when fewer cycles remain
+than the next block is long, the rest are run an instruction at a time.
+
+Idle loops are skipped over as by the interpreter, when a block which jumps
+back to its own start goes round without changing A or D.
+
+If an instruction uses an address outside RAM, the registers and PC are left
+as they were at the start of its block, although RAM written earlier in the
+block keeps its new values.
+"""
+
+from array import array
+from typing import Callable, Iterable
+
+from CPUEmulator.cpu import (
+    CPU,
+    DEST_A,
+    DEST_D,
+    DEST_M,
+    IDLE,
+    ROM_SIZE,
+    alu,
+    c_instruction_source,
+    comp_expression,
+    flag_idle,
+    idle_loop_start,
+)
+
+# Blocks are split after this many instructions even if they haven't reached
+# a jump, to bound the size of the generated functions
+MAX_BLOCK_LENGTH = 256
+
+# Block factories, by start address and ROM words, from the least to the most
+# recently used. Each program loaded and each word of ROM rewritten can add
+# more, so the least recently used are dropped beyond MAX_FACTORIES.
+_factories: dict[tuple[int, bytes], Callable] = {}
+MAX_FACTORIES = 4096
+
+
+def block_length(rom: array, start: int) -> int:
+    """The number of instructions from start up to and including the next
+    jump"""
+    end = start
+    limit = min(start + MAX_BLOCK_LENGTH, ROM_SIZE)
+    while end < limit:
+        instruction = rom[end]
+        end += 1
+        if instruction & 0x8000 and instruction & 0x7:
+            break
+    return end - start
+
+
+def block_source(words: Iterable[int], start: int) -> str:
+    """Generate the source of a factory for the block of words at start,
+    make(ram, registers), whose block returns the next PC"""
+    words = list(words)
+    lines = []
+    # The registers read before the block writes them, which are loaded at
+    # its start, and those it writes, which are stored at its end
+    reads: set[str] = set()
+    writes: set[str] = set()
+    # The value of A, if it is a constant loaded in this block
+    constant = None
+    condition, target = None, ""
+
+    for instruction in words:
+        if not instruction & 0x8000:
+            # A is only stored once it is computed, or at the end of the block
+            constant = instruction
+            condition = None
+            continue
+
+        _, operands = comp_expression(instruction)
+        used = operands - {"m"}
+        if constant is None:
+            if "m" in operands or instruction & (DEST_M | 0x7):
+                used.add("a")
+            address, a_value = "a & 65535", None
+        else:
+            used.discard("a")
+            address = a_value = str(constant)
+        reads |= used - writes
+
+        statements, condition, target = c_instruction_source(
+            instruction, "a", "d", address, a_value
+        )
+        lines.extend(statements)
+        if instruction & DEST_A:
+            writes.add("a")
+            constant = None
+        if instruction & DEST_D:
+            writes.add("d")
+
+    prologue = [f"{register} = registers[{index}]" for index, register in enumerate("ad")
+                if register in reads]
+    epilogue = []
+    if constant is not None:
+        epilogue.append(f"registers[0] = {constant}")
+    elif "a" in writes:
+        epilogue.append("registers[0] = a")
+    if "d" in writes:
+        epilogue.append("registers[1] = d")
+    next_pc = (start + len(words)) % ROM_SIZE
+    if condition == "True":
+        returns = [f"return {target}"]
+    elif condition is not None:
+        returns = [f"if {condition}:", f"    return {target}", f"return {next_pc}"]
+    else:
+        returns = [f"return {next_pc}"]
+
+    body = "\n        ".join(prologue + lines + epilogue + returns)
+    return (
+        "def make(ram, registers):\n"
+        "    def block():\n"
+        f"        {body}\n"
+        "    return block\n"
+    )
+
+
+class BlockCPU(CPU):
+    def __init__(self, rom: Iterable[int] = ()) -> None:
+        # Each block's function and length, by start address
+        self.blocks: dict[int, tuple[Callable[[], int], int]] = {}
+        super().__init__(rom)
+
+    def load_rom(self, words: Iterable[int]) -> None:
+        super().load_rom(words)
+        self.blocks = {}
+
+    def write_rom(self, address: int, word: int) -> None:
+        super().write_rom(address, word)
+        self.blocks = {}
+
+    def translate(self, start: int) -> tuple[Callable[[], int], int]:
+        """Build the function for the block at start"""
+        length = block_length(self.rom, start)
+        words = self.rom[start:start + length]
+        key = (start, words.tobytes())
+        factory = _factories.pop(key, None)
+        if factory is None:
+            namespace = {"alu": alu}
+            exec(block_source(words, start), namespace)
+            factory = namespace["make"]
+            if len(_factories) >= MAX_FACTORIES:
+                del _factories[next(iter(_factories))]
+        _factories[key] = factory
+        function = factory(self.ram, self.registers)
+        if idle_loop_start(self.rom, start + length - 1) == start:
+            function = flag_idle(function, start, length)
+        block = self.blocks[start] = (function, length)
+        return block
+
+    def run(self, cycles: int) -> None:
+        """Execute the given number of instructions"""
+        blocks = self.blocks
+        registers = self.registers
+        pc = self.pc
+        remaining = cycles
+        # Where an idle loop was last flagged, with A and D, and the cycles
+        # remaining then
+        idle_state, idle_remaining = None, 0
+        try:
+            while True:
+                block = blocks.get(pc)
+                if block is None:
+                    if pc >= IDLE:
+                        length, pc = divmod(pc, IDLE)
+                        state = (pc, registers[0], registers[1])
+                        # The program may have left the loop and come back
+                        # in since it was last flagged, unless it has only
+                        # been round it once
+                        if state == idle_state and idle_remaining - remaining == length:
+                            # Nothing changed going round the loop, so skip
+                            # every whole time round that is left
+                            remaining %= length
+                        idle_state, idle_remaining = state, remaining
+                        continue
+                    if pc >= ROM_SIZE:
+                        # ROM32K only sees the low 15 bits of the address
+                        pc &= ROM_SIZE - 1
+                        continue
+                    block = self.translate(pc)
+                function, length = block
+                if length > remaining:
+                    break
+                pc = function()
+                remaining -= length
+        finally:
+            self.pc = pc
+            self.time += cycles - remaining
+        if remaining:
+            super().run(remaining)
@@ -0,0 +1,159 @@
+"""Compares .out files with .cmp files, in place of tools/TextComparer, e.g.,
+run from projects/06,
+
+    python -m CPUEmulator.comparator ../04/mult/Mult.out ../04/mult/Mult.cmp
+
+Both files are read a line at a time, so long outputs are compared in
+constant memory, and every mismatching line is reported rather than only the
+first. Lines are split into their |-separated columns, named by the header
+line of the .cmp file, so that a report says which columns differ. A * in the
+.cmp file matches any character, as in the nand2tetris simulators.
+
+TextComparer itself ignores whitespace, which --ignore-whitespace does too.
+
+Comparison also checks output a line at a time as it is written, which is
+how the compare-to command of test scripts uses it.
+"""
+
+import argparse
+import re
+import sys
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+class Mismatch(NamedTuple):
+    line_number: int
+    # The names of the columns which differ, empty if the lines' columns don't
+    # line up
+    columns: list[str]
+    # None past the end of either file
+    expected: Optional[str]
+    actual: Optional[str]
+
+    def describe(self) -> str:
+        if self.expected is None:
+            return f"Line {self.line_number} is past the end of the compare file: {self.actual!r}"
+        if self.actual is None:
+            return f"Line {self.line_number} is missing: expected {self.expected!r}"
+        columns = ""
+        if self.columns:
+            plural = "s" if len(self.columns) > 1 else ""
+            columns = f", column{plural} {', '.join(self.columns)}"
+        return (
+            f"Comparison failure at line {self.line_number}{columns}:"
+            f" expected {self.expected!r}, got {self.actual!r}"
+        )
+
+
+def lines_match(line: str, expected: str) -> bool:
+    """Compare an output line with a compare file line, in which * matches any
+    character"""
+    return len(line) == len(expected) and all(
+        e == "*" or c == e for c, e in zip(line, expected)
+    )
+
+
+def split_columns(line: str) -> list[str]:
+    """The cells of a |-separated line, e.g., |  1 |  2 | is ["  1 ", "  2 "]"""
+    cells = line.split("|")
+    if len(cells) > 1 and not cells[0] and not cells[-1]:
+        cells = cells[1:-1]
+    return cells
+
+
+def mismatched_columns(line: str, expected: str, names: list[str]) -> list[str]:
+    """The names of the columns which differ, or their numbers from 1 where
+    they have no name. Empty if the lines have different numbers of columns."""
+    cells = split_columns(line)
+    expected_cells = split_columns(expected)
+    if len(cells) != len(expected_cells):
+        return []
+    return [
+        names[index] if index < len(names) else str(index + 1)
+        for index, (cell, expected_cell) in enumerate(zip(cells, expected_cells))
+        if not lines_match(cell, expected_cell)
+    ]
+
+
+class Comparison:
+    """Checks lines one at a time against the lines of a compare file"""
+
+    def __init__(self, expected: Iterable[str], ignore_whitespace: bool = False) -> None:
+        self.expected = iter(expected)
+        self.ignore_whitespace = ignore_whitespace
+        self.line_number = 0
+        # The column names, from the first line of the compare file
+        self.names: list[str] = []
+
+    def check(self, line: str) -> Optional[Mismatch]:
+        """Compare the next line, returning how it differs, if it does"""
+        expected = next(self.expected, None)
+        self.line_number += 1
+        line = line.rstrip("\r\n")
+        if expected is None:
+            return Mismatch(self.line_number, [], None, line)
+        expected = expected.rstrip("\r\n")
+        if self.line_number == 1:
+            self.names = [name.strip() for name in split_columns(expected)]
+
+        if self.ignore_whitespace:
+            line = WHITESPACE_PATTERN.sub("", line)
+            expected = WHITESPACE_PATTERN.sub("", expected)
+        if line == expected or lines_match(line, expected):
+            return None
+        return Mismatch(
+            self.line_number,
+            mismatched_columns(line, expected, self.names),
+            expected,
+            line,
+        )
+
+    def finish(self) -> Iterator[Mismatch]:
+        """The lines of the compare file which were never checked"""
+        for expected in self.expected:
+            self.line_number += 1
+            yield Mismatch(self.line_number, [], expected.rstrip("\r\n"), None)
+
+
+def compare(
+    lines: Iterable[str], expected: Iterable[str], ignore_whitespace: bool = False
+) -> Iterator[Mismatch]:
+    """Every line which differs from the expected lines"""
+    comparison = Comparison(expected, ignore_whitespace)
+    for line in lines:
+        mismatch = comparison.check(line)
+        if mismatch is not None:
+            yield mismatch
+    yield from comparison.finish()
+
+
+def compare_files(
+    out_path: str, cmp_path: str, ignore_whitespace: bool = False
+) -> Iterator[Mismatch]:
+    with open(out_path) as out, open(cmp_path) as cmp:
+        yield from compare(out, cmp, ignore_whitespace)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Compare a .out file with a .cmp file"
+    )
+    argparser.add_argument("out", type=str)
+    argparser.add_argument("cmp", type=str)
+    argparser.add_argument(
+        "--ignore-whitespace",
+        action="store_true",
+        help="ignore whitespace within lines, as TextComparer does",
+    )
+    args = argparser.parse_args()
+
+    mismatches = 0
+    for mismatch in compare_files(args.out, args.cmp, args.ignore_whitespace):
+        mismatches += 1
+        print(mismatch.describe())
+    if mismatches:
+        print(f"{mismatches} lines differ")
+        sys.exit(1)
+    print("Comparison ended successfully")
@@ -0,0 +1,384 @@
+"""An emulator of the Hack CPU and its memory, e.g.,
+
+    cpu = CPU(load_program("mult/Mult.asm"))
+    cpu.ram[0], cpu.ram[1] = 6, 7
+    cpu.run(210)
+
+RAM holds signed 16-bit words in an array('h'), so a program's view of memory
+can be shared with other code without copying. The A and D registers are held
+as signed values in the same range; A is only treated as unsigned when it is
+used as an address.
+
+Each ROM word is decoded once, into a handler which executes the instruction
+and returns the address of the next one, so running the program is just
+
+    pc = handlers[pc]()
+
+Handlers are generated for each distinct C-instruction from its dest, comp and
+jump fields, so that only the operands it uses are read and only the
+registers it writes are written.
+
+Programs which have finished, or are waiting for a key, spin in a loop such as
+(END) @END 0;JMP. When a loop which writes no memory goes round once without
+changing A or D, every later time round is the same, so the rest of the
+cycles are skipped over at once. The time, and where the program is left part
+way round the loop, are the same as if they had been run.
+"""
+
+import os
+import re
+from array import array
+from typing import Callable, Iterable, Optional
+
+from HackAssembler import assembler
+from HackAssembler.code import COMP_TO_BINARY, JUMP_TO_BINARY
+
+RAM_SIZE = 32768
+ROM_SIZE = 32768
+SCREEN = 16384
+KBD = 24576
+
+# Fields of a C-instruction
+A_BIT = 0x1000
+ZX, NX, ZY, NY, F, NO = 0x800, 0x400, 0x200, 0x100, 0x80, 0x40
+DEST_A, DEST_D, DEST_M = 0x20, 0x10, 0x8
+JLT, JEQ, JGT = 0x4, 0x2, 0x1
+
+# Words after the end of the program are decoded in chunks of this size as
+# they are reached, rather than decoding the whole ROM on every load
+DECODE_CHUNK = 1024
+
+# Loops of up to this many instructions are checked for being idle
+IDLE_LOOP_LIMIT = 16
+# Multiplied by the length of the loop and added to the next PC by the jumps
+# which close loops that may be idle, so that run checks whether they are
+IDLE = 0x10000
+
+# Python expressions for the computations, in terms of the operands a, d and m.
+# Those which can overflow are wrapped to 16 bits when the handler is built.
+COMP_EXPRESSIONS = {
+    "0": "0",
+    "1": "1",
+    "-1": "-1",
+    "D": "d",
+    "A": "a",
+    "!D": "~d",
+    "!A": "~a",
+    "-D": "-d",
+    "-A": "-a",
+    "D+1": "d + 1",
+    "A+1": "a + 1",
+    "D-1": "d - 1",
+    "A-1": "a - 1",
+    "D+A": "d + a",
+    "D-A": "d - a",
+    "A-D": "a - d",
+    "D&A": "d & a",
+    "D|A": "d | a",
+    "M": "m",
+    "!M": "~m",
+    "-M": "-m",
+    "M+1": "m + 1",
+    "M-1": "m - 1",
+    "D+M": "d + m",
+    "D-M": "d - m",
+    "M-D": "m - d",
+    "D&M": "d & m",
+    "D|M": "d | m",
+}
+COMP_BY_BITS = {
+    bits: mnemonic
+    for mnemonic, bits in COMP_TO_BINARY.items()
+    if mnemonic in COMP_EXPRESSIONS
+}
+JUMP_CONDITIONS = {
+    bits: condition
+    for bits, condition in zip(
+        [JUMP_TO_BINARY[jump] for jump in ["JGT", "JEQ", "JGE", "JLT", "JNE", "JLE"]],
+        ["out > 0", "out == 0", "out >= 0", "out < 0", "out != 0", "out <= 0"],
+    )
+}
+
+# Handler factories, by the low 13 bits of the C-instruction they execute
+_factories: dict[int, Callable] = {}
+
+
+def load_program(path: str) -> array:
+    """Read the instruction words of a .hack file, or assemble a .asm file"""
+    if path.endswith(".asm"):
+        with open(path) as f:
+            rom, _ = assembler.assemble(f)
+        return rom
+    with open(path) as f:
+        return array("H", (int(line, 2) for line in f if line.strip()))
+
+
+def to_signed(value: int) -> int:
+    """Wrap an int to the signed 16-bit range"""
+    return ((value + 0x8000) & 0xFFFF) - 0x8000
+
+
+def alu(x: int, y: int, instruction: int) -> int:
+    """Compute the ALU output for the comp bits of a C-instruction"""
+    if instruction & ZX:
+        x = 0
+    if instruction & NX:
+        x = ~x
+    if instruction & ZY:
+        y = 0
+    if instruction & NY:
+        y = ~y
+    out = to_signed(x + y) if instruction & F else x & y
+    if instruction & NO:
+        out = ~out
+    return out
+
+
+def comp_expression(instruction: int) -> tuple[str, set[str]]:
+    """The Python expression for the computation of a C-instruction and the
+    operands, of a, d and m, which it uses"""
+    mnemonic = COMP_BY_BITS.get((instruction >> 6) & 0x7F)
+    if mnemonic is None:
+        # Computations without a mnemonic go through the ALU itself
+        y = "m" if instruction & A_BIT else "a"
+        return f"alu(d, {y}, {instruction & 0x0FC0})", {"d", y}
+    expression = COMP_EXPRESSIONS[mnemonic]
+    if mnemonic != "-1" and ("+" in mnemonic or "-" in mnemonic):
+        expression = f"(({expression}) + 32768 & 65535) - 32768"
+    return expression, set(mnemonic.lower()) & {"a", "d", "m"}
+
+
+def c_instruction_source(
+    instruction: int, a: str, d: str, address: str, a_value: Optional[str] = None
+) -> tuple[list[str], Optional[str], str]:
+    """Generate the statements which execute a C-instruction, where a and d
+    are the expressions which read and write the registers and address is
+    that of A as an address into RAM or ROM. a_value replaces a where A is
+    read, if its value is known.
+
+    Returns the statements, the condition under which it jumps (None if it
+    never does, "True" if it always does) and the expression for where it
+    jumps to."""
+    expression, operands = comp_expression(instruction)
+    jump = instruction & 0x7
+    dests = [
+        target
+        for bit, target in [(DEST_M, "ram[address]"), (DEST_A, a), (DEST_D, d)]
+        if instruction & bit
+    ]
+
+    # Values used only once are written inline rather than held in locals. M
+    # is written through the value A had before this instruction, which is
+    # also where it jumps to, so that is held if A is written first.
+    lines = []
+    address_uses = ("m" in operands) + (instruction & DEST_M > 0) + (jump > 0)
+    if not address.isdigit() and (
+        address_uses > 1 or (jump and instruction & DEST_A)
+    ):
+        lines.append(f"address = {address}")
+        address = "address"
+    dests = [target.replace("address", address) for target in dests]
+    values = {"a": a_value or a, "d": d, "m": f"ram[{address}]"}
+    out = re.sub(r"\b[adm]\b", lambda match: values[match.group()], expression)
+
+    conditional = jump and jump != JUMP_TO_BINARY["JMP"]
+    if conditional and dests:
+        dests.append("out")
+    if dests:
+        lines.append(" = ".join(dests + [out]))
+    if "out" in dests:
+        out = "out"
+
+    if not jump:
+        return lines, None, address
+    if not conditional:
+        return lines, "True", address
+    condition = JUMP_CONDITIONS[jump].replace("out", out if out == "out" else f"({out})")
+    return lines, condition, address
+
+
+def handler_source(instruction: int) -> str:
+    """Generate the source of a factory for handlers of the C-instruction,
+    make(ram, registers, next_pc)"""
+    lines, condition, target = c_instruction_source(
+        instruction, "registers[0]", "registers[1]", "registers[0] & 65535"
+    )
+    if condition == "True":
+        lines.append(f"return {target}")
+    else:
+        if condition is not None:
+            lines.append(f"if {condition}:")
+            lines.append(f"    return {target}")
+        lines.append("return next_pc")
+
+    body = "\n        ".join(lines)
+    return (
+        "def make(ram, registers, next_pc):\n"
+        "    def handler():\n"
+        f"        {body}\n"
+        "    return handler\n"
+    )
+
+
+def _a_instruction(registers: list[int], value: int, next_pc: int) -> Callable[[], int]:
+    def handler():
+        registers[0] = value
+        return next_pc
+    return handler
+
+
+def idle_loop_start(rom: array, address: int) -> Optional[int]:
+    """The start of the loop closed by the jump at address, if it may be idle,
+    or else None. It may be if it runs straight from its start to the jump,
+    which always jumps back to the start, and it never writes to memory."""
+    instruction = rom[address]
+    if not instruction & 0x8000 or not instruction & 0x7 or instruction & DEST_M:
+        return None
+    target = None
+    for i in range(address - 1, max(address - IDLE_LOOP_LIMIT, -1), -1):
+        word = rom[i]
+        if word & 0x8000 and word & (DEST_M | 0x7):
+            return None
+        if target is None:
+            if word & 0x8000:
+                if word & DEST_A:
+                    return None
+                continue
+            # The last value loaded into A before the jump
+            target = word
+            if target > i:
+                return None
+        if i == target:
+            return target
+    return None
+
+
+def flag_idle(
+    function: Callable[[], int], start: int, length: int
+) -> Callable[[], int]:
+    """Wrap a handler or block which ends with the jump of an idle loop of
+    length instructions, so that it flags when it jumps back to start"""
+    flag = IDLE * length
+    def flagged():
+        pc = function()
+        return pc + flag if pc == start else pc
+    return flagged
+
+
+class CPU:
+    # Whether idle loops are skipped over rather than run
+    skip_idle_loops = True
+
+    def __init__(self, rom: Iterable[int] = ()) -> None:
+        self.rom = array("H", bytes(2 * ROM_SIZE))
+        self.ram = array("h", bytes(2 * RAM_SIZE))
+        # A and D, shared with the handlers
+        self.registers = [0, 0]
+        self.pc = 0
+        # The number of instructions executed
+        self.time = 0
+        self.handlers: list[Callable[[], int]] = []
+        self.load_rom(rom)
+
+    @property
+    def a(self) -> int:
+        return self.registers[0]
+
+    @a.setter
+    def a(self, value: int) -> None:
+        self.registers[0] = value
+
+    @property
+    def d(self) -> int:
+        return self.registers[1]
+
+    @d.setter
+    def d(self, value: int) -> None:
+        self.registers[1] = value
+
+    def load_rom(self, words: Iterable[int]) -> None:
+        """Replace the program in ROM; words after the program are zero,
+        i.e., @0"""
+        words = array("H", words)
+        if len(words) > ROM_SIZE:
+            raise ValueError(f"Program of {len(words)} words does not fit in ROM")
+        self.rom[:len(words)] = words
+        self.rom[len(words):] = array("H", bytes(2 * (ROM_SIZE - len(words))))
+        self.handlers = [self.decode(address) for address in range(len(words))]
+
+    def load(self, path: str) -> None:
+        """Load a .hack or .asm file into ROM"""
+        self.load_rom(load_program(os.fspath(path)))
+
+    def write_rom(self, address: int, word: int) -> None:
+        """Replace a single word of ROM"""
+        self.rom[address] = word
+        # The word may also be part of a loop closed by a later jump
+        for later in range(address, min(address + IDLE_LOOP_LIMIT, len(self.handlers))):
+            self.handlers[later] = self.decode(later)
+
+    def decode(self, address: int) -> Callable[[], int]:
+        """Build the handler for the word at the address in ROM"""
+        instruction = self.rom[address]
+        if not instruction & 0x8000:
+            return _a_instruction(self.registers, instruction, address + 1)
+
+        key = instruction & 0x1FFF
+        factory = _factories.get(key)
+        if factory is None:
+            namespace = {"alu": alu}
+            exec(handler_source(instruction), namespace)
+            factory = _factories[key] = namespace["make"]
+        handler = factory(self.ram, self.registers, address + 1)
+        start = idle_loop_start(self.rom, address) if self.skip_idle_loops else None
+        if start is None:
+            return handler
+        return flag_idle(handler, start, address - start + 1)
+
+    def step(self) -> None:
+        """Execute the instruction at PC"""
+        self.run(1)
+
+    def run(self, cycles: int) -> None:
+        """Execute the given number of instructions"""
+        registers = self.registers
+        pc = self.pc
+        remaining = cycles
+        # Where an idle loop was last flagged, with A and D, and when
+        idle_state, idle_time = None, 0
+        while remaining:
+            handlers = self.handlers
+            executed = 0
+            try:
+                for executed in range(remaining):
+                    pc = handlers[pc]()
+                executed = remaining
+            except IndexError:
+                if pc >= IDLE:
+                    length, pc = divmod(pc, IDLE)
+                    state = (pc, registers[0], registers[1])
+                    since = cycles - remaining + executed - idle_time
+                    # The program may have left the loop and come back in
+                    # since it was last flagged, unless it has only been
+                    # round it once
+                    if state == idle_state and since == length:
+                        # Nothing changed going round the loop, so skip
+                        # every whole time round that is left
+                        executed += (remaining - executed) // length * length
+                    idle_state, idle_time = state, cycles - remaining + executed
+                elif pc < len(handlers):
+                    # An instruction used an address outside RAM
+                    self.pc = pc
+                    self.time += cycles - remaining + executed
+                    raise
+                else:
+                    # ROM32K only sees the low 15 bits of the address
+                    pc &= ROM_SIZE - 1
+                if pc >= len(handlers):
+                    end = min(pc + DECODE_CHUNK, ROM_SIZE)
+                    handlers.extend(
+                        self.decode(address) for address in range(len(handlers), end)
+                    )
+            remaining -= executed
+        self.pc = pc & 0xFFFF
+        self.time += cycles
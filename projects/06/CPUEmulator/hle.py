@@ -0,0 +1,384 @@
+"""High-level emulation of the Jack OS: calls to some of the functions of
+tools/OS are run as Python rather than as their Hack code, e.g.,
+
+    cpu = with_hooks(CPU)()
+    cpu.load("MathTest/MathTest.asm")
+    cpu.run(100_000)
+
+or for the programs which test scripts load, with the --hle option of
+CPUEmulator.main and CPUEmulator.runner.
+
+A hook is entered at the label of its function, just after the call code of
+the VM translator (see VMTranslator CodeWriter.write_call) has pushed the
+frame and jumped there. It reads its arguments from ARG, computes what the
+real function would, and then returns as CodeWriter.write_return does:
+
+    R5 = LCL, the frame           R6 = RAM[frame - 5], the return address
+    R13 = ARG                     RAM[ARG] = the return value, SP = ARG + 1
+    THAT, THIS, ARG, LCL = RAM[frame - 1], ..., RAM[frame - 4]
+    A = the return address        D = LCL
+    PC = the return address
+
+The functions' own locals and working stack, above SP, aren't written, nor
+are the scratch tables Math.divide builds on the heap, as nothing reads them
+once the function has returned. Nor, with the translator's shared calls, are
+R14 and R15, which the function's own calls would have left their arguments
+in. Everything else in RAM, including the heap and the OS's static
+variables, ends up as the real code leaves it.
+
+Hooks only know the official OS of tools/OS, and the labels and static
+variables which this repo's VM translator writes for it, such as
+Output.printChar and Output.1. Programs translated with another OS should be
+run strictly. pong/Pong.asm was translated by another toolchain, with its own
+labels and calling convention, so nothing in it is hooked.
+
+Where a call would go down a path the hook doesn't emulate, such as
+Sys.error, or where the translated comparisons would overflow, the hook
+declines and the real code runs instead. A hooked call takes the time of a
+single instruction, or of the first block of the function with --translate,
+so time no longer counts the cycles the program would take.
+
+Setting strict on a CPU runs the real code of every function, as does leaving
+out --hle.
+"""
+
+import os
+from typing import Callable, NamedTuple, Optional
+
+from CPUEmulator.blocks import BlockCPU
+from CPUEmulator.cpu import RAM_SIZE, to_signed
+from CPUEmulator.profiler import load_labels
+from HackAssembler import assembler
+
+SP, LCL, ARG, THIS, THAT = range(5)
+
+# Memory.alloc gives up looking for a block after this many, in case the heap
+# has been corrupted into a loop
+ALLOC_SEARCH_LIMIT = RAM_SIZE
+
+
+class Decline(Exception):
+    """The hook doesn't emulate this call, so the real code should run"""
+
+
+class Hook(NamedTuple):
+    # Computes the return value from the memory, the addresses of the
+    # program's symbols and the function's arguments
+    function: Callable[..., int]
+    arguments: int
+    # The static variables the hook uses, without which it isn't installed
+    statics: tuple[str, ...] = ()
+
+
+class Overlay:
+    """RAM as a hook sees it, with its writes held back until it commits
+    them, so that a hook which declines leaves RAM as it was"""
+
+    def __init__(self, ram) -> None:
+        self.ram = ram
+        self.writes: dict[int, int] = {}
+
+    def __getitem__(self, address: int) -> int:
+        address = _address(address)
+        value = self.writes.get(address)
+        return self.ram[address] if value is None else value
+
+    def __setitem__(self, address: int, value: int) -> None:
+        self.writes[_address(address)] = to_signed(value)
+
+    def commit(self) -> None:
+        ram = self.ram
+        for address, value in self.writes.items():
+            ram[address] = value
+
+
+def _address(address: int) -> int:
+    address &= 0xFFFF
+    if address >= RAM_SIZE:
+        # The real code would stop with the address outside RAM
+        raise Decline
+    return address
+
+
+def _compare(x: int, y: int) -> int:
+    """x - y, for comparing x and y as the VM translator's eq, gt and lt do.
+    Declines where the subtraction would overflow, where they give a
+    different answer to the VM emulator."""
+    difference = x - y
+    if not -32768 <= difference <= 32767:
+        raise Decline
+    return difference
+
+
+def return_from(memory: Overlay, value: int) -> int:
+    """Return value from the function which has just been called, as
+    CodeWriter.write_return does, and return the return address"""
+    frame = memory[LCL]
+    return_address = memory[frame - 5]
+    arg = memory[ARG]
+    memory[5] = frame
+    memory[6] = return_address
+    memory[13] = arg
+    memory[arg] = value
+    memory[SP] = arg + 1
+    for offset, pointer in enumerate([THAT, THIS, ARG, LCL], start=1):
+        memory[pointer] = memory[frame - offset]
+    return return_address
+
+
+def multiply(memory: Overlay, symbols: dict[str, int], x: int, y: int) -> int:
+    # Math.abs(-32768) is itself
+    if x == -32768 or y == -32768:
+        raise Decline
+    return to_signed(x * y)
+
+
+def divide(memory: Overlay, symbols: dict[str, int], x: int, y: int) -> int:
+    # Sys.error(3) for dividing by zero
+    if y == 0 or x == -32768 or y == -32768:
+        raise Decline
+    quotient = abs(x) // abs(y)
+    return -quotient if (x < 0) != (y < 0) else quotient
+
+
+def alloc(memory: Overlay, symbols: dict[str, int], size: int) -> int:
+    """Memory.alloc, line by line, so that the heap is left exactly as the
+    real code leaves it"""
+    # Memory.init sets its base for peeking and poking to 0
+    if memory[symbols["Memory.0"]] != 0 or size < 0:
+        raise Decline
+    if size == 0:
+        size = 1
+
+    block = 2048
+    for _ in range(ALLOC_SEARCH_LIMIT):
+        # Both sides of the and are evaluated
+        below_end = _compare(block, 16383) < 0
+        if not (below_end & (_compare(memory[block], size) < 0)):
+            break
+        next_block = memory[block + 1]
+        if (
+            (memory[block] == 0)
+            | (_compare(next_block, 16382) > 0)
+            | (memory[next_block] == 0)
+        ):
+            block = next_block
+        else:
+            # Merge the next block into this one
+            memory[block] = memory[block + 1] - block + memory[next_block]
+            if memory[next_block + 1] == to_signed(next_block + 2):
+                memory[block + 1] = block + 2
+            else:
+                memory[block + 1] = memory[next_block + 1]
+    else:
+        raise Decline
+
+    # Sys.error(6) when the heap is used up
+    if _compare(to_signed(block + size), 16379) > 0:
+        raise Decline
+    if _compare(memory[block], to_signed(size + 2)) > 0:
+        # Split off what's left of the block
+        memory[size + 2 + block] = memory[block] - size - 2
+        if memory[block + 1] == to_signed(block + 2):
+            memory[size + 3 + block] = block + size + 4
+        else:
+            memory[size + 3 + block] = memory[block + 1]
+        memory[block + 1] = block + size + 2
+    memory[block] = 0
+    return to_signed(block + 2)
+
+
+def print_char(memory: Overlay, symbols: dict[str, int], c: int) -> int:
+    if c < 0:
+        raise Decline
+    column, cursor, left = (symbols[f"Output.{index}"] for index in range(3))
+    if c == 128:
+        _println(memory, column, cursor, left)
+    elif c == 129:
+        # Output.backSpace
+        if memory[left]:
+            if _compare(memory[column], 0) > 0:
+                memory[column] -= 1
+                memory[cursor] -= 1
+            else:
+                memory[column] = 31
+                if memory[cursor] == 32:
+                    memory[cursor] = 8128
+                memory[cursor] -= 321
+            memory[left] = 0
+        else:
+            memory[left] = -1
+        _draw_char(memory, symbols, 32)
+    else:
+        _draw_char(memory, symbols, c)
+        if ~memory[left]:
+            memory[column] += 1
+            memory[cursor] += 1
+        if memory[column] == 32:
+            _println(memory, column, cursor, left)
+        else:
+            memory[left] = ~memory[left]
+    return 0
+
+
+def _println(memory: Overlay, column: int, cursor: int, left: int) -> None:
+    memory[cursor] = memory[cursor] + 352 - memory[column]
+    memory[column] = 0
+    memory[left] = -1
+    if memory[cursor] == 8128:
+        memory[cursor] = 32
+
+
+def _draw_char(memory: Overlay, symbols: dict[str, int], c: int) -> None:
+    """Output.drawChar, which draws the character into the half of the word
+    at the cursor given by the left flag"""
+    left = memory[symbols["Output.2"]]
+    screen = memory[symbols["Output.4"]]
+    if c < 32 or c > 126:
+        c = 0
+    maps = memory[symbols["Output.5" if left else "Output.6"]]
+    bitmap = memory[c + maps]
+    address = memory[symbols["Output.1"]]
+    for row in range(11):
+        kept = memory[address + screen] & (-256 if left else 255)
+        memory[address + screen] = memory[row + bitmap] | kept
+        address = to_signed(address + 32)
+
+
+def draw_line(
+    memory: Overlay, symbols: dict[str, int], x1: int, y1: int, x2: int, y2: int
+) -> int:
+    # Lines off the screen are Sys.error(7) or (8)
+    if not (0 <= x1 <= 511 and 0 <= x2 <= 511 and 0 <= y1 <= 255 and 0 <= y2 <= 255):
+        raise Decline
+    dx, dy = abs(x2 - x1), abs(y2 - y1)
+    steep = dx < dy
+    if (steep and y2 < y1) or (not steep and x2 < x1):
+        x1, y1, x2, y2 = x2, y2, x1, y1
+    if steep:
+        dx, dy = dy, dx
+        along, across, end, backwards = y1, x1, y2, x1 > x2
+    else:
+        along, across, end, backwards = x1, y1, x2, y1 > y2
+
+    # Bresenham's algorithm, along x, or along y for steep lines
+    error = 2 * dy - dx
+    _draw_conditional(memory, symbols, along, across, steep)
+    while along < end:
+        if error < 0:
+            error += 2 * dy
+        else:
+            error += 2 * (dy - dx)
+            across += -1 if backwards else 1
+        along += 1
+        _draw_conditional(memory, symbols, along, across, steep)
+    return 0
+
+
+def _draw_conditional(
+    memory: Overlay, symbols: dict[str, int], along: int, across: int, steep: bool
+) -> None:
+    x, y = (across, along) if steep else (along, across)
+    # Screen.drawPixel, with its mask from the powers of two in Screen.0
+    address = memory[symbols["Screen.1"]] + y * 32 + x // 16
+    mask = memory[x % 16 + memory[symbols["Screen.0"]]]
+    if memory[symbols["Screen.2"]]:
+        memory[address] = memory[address] | mask
+    else:
+        memory[address] = memory[address] & ~mask
+
+
+HOOKS = {
+    "Math.multiply": Hook(multiply, 2),
+    "Math.divide": Hook(divide, 2),
+    "Memory.alloc": Hook(alloc, 1, ("Memory.0",)),
+    "Output.printChar": Hook(
+        print_char, 1, tuple(f"Output.{index}" for index in [0, 1, 2, 4, 5, 6])
+    ),
+    "Screen.drawLine": Hook(draw_line, 4, ("Screen.0", "Screen.1", "Screen.2")),
+}
+
+
+def load_symbols(path: str) -> dict[str, int]:
+    """The labels and variables of a .asm file, or the labels of the .map
+    file alongside a .hack file, which leaves out the static variables"""
+    if not path.endswith(".asm"):
+        return load_labels(path)
+    with open(path) as f:
+        _, symbol_table = assembler.assemble(f)
+    return {symbol: int(address) for symbol, address in symbol_table.items()}
+
+
+def with_hooks(cpu_class: type, hooks: Optional[dict[str, Hook]] = None) -> type:
+    """A subclass of cpu_class which runs the hooked OS functions as Python,
+    e.g., for the cpu_class of a TestScript"""
+    hooks = HOOKS if hooks is None else hooks
+
+    class HookedCPU(cpu_class):
+        # Whether the real code of the hooked functions runs
+        strict = False
+
+        def __init__(self, *args, symbols: Optional[dict[str, int]] = None, **kwargs) -> None:
+            self.symbols: dict[str, int] = {}
+            # The hooks, by the address of their function
+            self.hooked: dict[int, Hook] = {}
+            super().__init__(*args, **kwargs)
+            if symbols is not None:
+                self.set_symbols(symbols)
+
+        def load(self, path: str) -> None:
+            path = os.fspath(path)
+            super().load(path)
+            self.set_symbols(load_symbols(path))
+
+        def set_symbols(self, symbols: dict[str, int]) -> None:
+            self.symbols = symbols
+            self.hooked = {
+                symbols[name]: hook
+                for name, hook in hooks.items()
+                if name in symbols and all(static in symbols for static in hook.statics)
+            }
+            # Handlers are built knowing which addresses are hooked
+            self.handlers = [self.decode(address) for address in range(len(self.handlers))]
+            if isinstance(self, BlockCPU):
+                self.blocks = {}
+
+        def decode(self, address: int) -> Callable[[], int]:
+            handler = super().decode(address)
+            hook = self.hooked.get(address)
+            return handler if hook is None else self.hook(hook, handler)
+
+        def translate(self, start: int) -> tuple[Callable[[], int], int]:
+            function, length = super().translate(start)
+            hook = self.hooked.get(start)
+            if hook is None:
+                return function, length
+            block = self.blocks[start] = (self.hook(hook, function), length)
+            return block
+
+        def hook(self, hook: Hook, real: Callable[[], int]) -> Callable[[], int]:
+            """Wrap the handler or block at the start of a hooked function"""
+            ram = self.ram
+            registers = self.registers
+            function, arguments = hook.function, hook.arguments
+
+            def hooked():
+                if self.strict:
+                    return real()
+                memory = Overlay(ram)
+                try:
+                    arg = memory[ARG]
+                    value = function(
+                        memory, self.symbols, *(memory[arg + i] for i in range(arguments))
+                    )
+                    return_address = return_from(memory, value)
+                except Decline:
+                    return real()
+                memory.commit()
+                registers[0] = return_address
+                registers[1] = ram[LCL]
+                return return_address & 0xFFFF
+
+            return hooked
+
+    return HookedCPU
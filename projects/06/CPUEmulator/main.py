@@ -0,0 +1,61 @@
+"""Runs .tst test scripts with the CPU emulator, run from projects/06, e.g.,
+
+    python -m CPUEmulator.main ../04/mult/Mult.tst ../05/ComputerAdd.tst
+
+Each script writes its .out file alongside it, exactly as the Java CPU
+emulator would, and fails at the first line which differs from its compare-to
+file.
+
+With --hle, calls to some of the OS functions are run as Python rather than
+as their Hack code (see CPUEmulator.hle).
+"""
+
+import argparse
+import sys
+import time
+
+from CPUEmulator.hle import with_hooks
+from CPUEmulator.script import ScriptError, TestScript
+
+
+def main(path: str, translate: bool = False, hle: bool = False) -> None:
+    script = TestScript.from_file(path, translate)
+    if hle:
+        script.cpu_class = with_hooks(script.cpu_class)
+    script.run()
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Run .tst test scripts with the Hack CPU emulator"
+    )
+    argparser.add_argument("paths", type=str, nargs="+", help=".tst files to run")
+    argparser.add_argument(
+        "--translate",
+        action="store_true",
+        help="translate programs into Python basic blocks rather than running"
+        " them an instruction at a time",
+    )
+    argparser.add_argument(
+        "--hle",
+        action="store_true",
+        help="run calls to Math.multiply, Math.divide, Memory.alloc,"
+        " Output.printChar and Screen.drawLine as Python",
+    )
+    args = argparser.parse_args()
+
+    failures = 0
+    for path in args.paths:
+        start = time.perf_counter()
+        try:
+            main(path, args.translate, args.hle)
+        except Exception as e:
+            # Such as a malformed program, which mustn't stop the other scripts
+            failures += 1
+            message = str(e)
+            if not isinstance(e, (ScriptError, OSError)):
+                message = f"{type(e).__name__}: {e}"
+            print(f"FAIL {path} ({(time.perf_counter() - start) * 1000:.1f} ms): {message}")
+        else:
+            print(f"ok   {path} ({(time.perf_counter() - start) * 1000:.1f} ms)")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,249 @@
+"""Profiles Hack programs, counting the cycles spent at each ROM address and
+folding them into totals for each label or VM function, e.g., run from
+projects/06,
+
+    python -m CPUEmulator.profiler ../08/FunctionCalls/StaticsTest/StaticsTest.tst
+    python -m CPUEmulator.profiler pong/Pong.asm --cycles 5000000 --by-function \\
+        --collapsed pong.folded
+
+Labels come from assembling the .asm file, or from the .map source map
+alongside a .hack file (see HackAssembler.sourcemap).
+
+Calls are counted as the entries into each VM function, which is only ever
+jumped to by the call code that the VM translator writes. The call stack is
+followed in the same way: entering a function pushes it, and reaching one of
+the Foo.bar$ret.N labels after a call pops back to the caller of Foo.bar. The
+cycles spent in each stack are written as collapsed stacks, one
+"Sys.init;Main.main;Foo.bar 1234" line each, which flame graph tools read.
+
+Idle loops are run rather than skipped while profiling, so that the cycles
+always add up.
+"""
+
+import argparse
+import os
+from array import array
+from typing import Callable, Iterable, Optional
+
+from CPUEmulator.cpu import CPU, ROM_SIZE
+from CPUEmulator.script import TestScript
+from HackAssembler import assembler, sourcemap
+from HackAssembler.sourcemap import NO_LABEL, function_name
+
+DEFAULT_CYCLES = 1_000_000
+
+
+def load_labels(path: str) -> dict[str, int]:
+    """The labels of a .asm file, or of the .map file alongside a .hack file
+    if there is one, by address in the order they're defined"""
+    if path.endswith(".asm"):
+        labels: dict[str, int] = {}
+        with open(path) as f:
+            assembler.assemble(f, labels=labels)
+        return labels
+    map_path = f"{os.path.splitext(path)[0]}.map"
+    if not os.path.exists(map_path):
+        return {}
+    labels = {}
+    for entry in sourcemap.read(map_path):
+        if entry.label is not None and entry.label not in labels:
+            labels[entry.label] = entry.address
+    return labels
+
+
+class ProfilingCPU(CPU):
+    skip_idle_loops = False
+
+    def __init__(self, rom: Iterable[int] = (), labels: Optional[dict[str, int]] = None) -> None:
+        # The number of times each address has been executed
+        self.counts = array("Q", bytes(8 * ROM_SIZE))
+        # The total number executed, as a list so that the handlers can share it
+        self.clock = [0]
+        self.labels: dict[str, int] = {}
+        # The VM functions entered at an address, and those whose calls
+        # return to one
+        self.entries: dict[int, str] = {}
+        self.returns: dict[int, str] = {}
+        self.calls: dict[str, int] = {}
+        self.stack: list[str] = []
+        # The cycles spent with each call stack
+        self.stacks: dict[tuple[str, ...], int] = {}
+        # The clock at the last call or return
+        self.stack_clock = 0
+        super().__init__(rom)
+        if labels is not None:
+            self.set_labels(labels)
+
+    def load(self, path: str) -> None:
+        path = os.fspath(path)
+        super().load(path)
+        self.set_labels(load_labels(path))
+
+    def set_labels(self, labels: dict[str, int]) -> None:
+        self.labels = labels
+        self.entries = {}
+        self.returns = {}
+        for label, address in labels.items():
+            function = function_name(label)
+            if function == label:
+                self.entries[address] = function
+            elif function is not None and "$ret." in label:
+                self.returns[address] = function
+        # Handlers are built knowing which addresses are calls and returns
+        self.handlers = [self.decode(address) for address in range(len(self.handlers))]
+
+    def decode(self, address: int) -> Callable[[], int]:
+        handler = super().decode(address)
+        counts = self.counts
+        clock = self.clock
+        if address in self.entries:
+            function = self.entries[address]
+
+            def counted():
+                self.enter(function)
+                counts[address] += 1
+                clock[0] += 1
+                return handler()
+        elif address in self.returns:
+            function = self.returns[address]
+
+            def counted():
+                self.leave(function)
+                counts[address] += 1
+                clock[0] += 1
+                return handler()
+        else:
+            def counted():
+                counts[address] += 1
+                clock[0] += 1
+                return handler()
+        return counted
+
+    def enter(self, function: str) -> None:
+        self._count_stack()
+        self.stack.append(function)
+        self.calls[function] = self.calls.get(function, 0) + 1
+
+    def leave(self, function: str) -> None:
+        """Return from a call to function, along with anything it called which
+        hasn't returned"""
+        if function not in self.stack:
+            return
+        self._count_stack()
+        while self.stack.pop() != function:
+            pass
+
+    def collapsed_stacks(self) -> dict[tuple[str, ...], int]:
+        """The cycles spent with each call stack, outermost call first"""
+        self._count_stack()
+        return self.stacks
+
+    def _count_stack(self) -> None:
+        stack = tuple(self.stack) or (NO_LABEL,)
+        self.stacks[stack] = self.stacks.get(stack, 0) + self.clock[0] - self.stack_clock
+        self.stack_clock = self.clock[0]
+
+
+def flat_profile(
+    counts: array, labels: dict[str, int], by_function: bool = False
+) -> list[tuple[str, int]]:
+    """Total the cycles at the addresses following each label, up to the next
+    label, and return the totals largest first.
+
+    With by_function, only labels which start a VM function begin a new group,
+    as for HackAssembler.sourcemap.size_report."""
+    # Sorting is stable, so the last of the labels sharing an address takes it
+    starts = sorted(
+        (
+            (address, label) for label, address in labels.items()
+            if not by_function or label == function_name(label)
+        ),
+        key=lambda start: start[0],
+    )
+
+    totals: dict[str, int] = {}
+    group = NO_LABEL
+    group_start = 0
+    for address, label in starts + [(len(counts), None)]:
+        cycles = sum(counts[group_start:address])
+        totals[group] = totals.get(group, 0) + cycles
+        group = label
+        group_start = address
+
+    return sorted(
+        ((group, cycles) for group, cycles in totals.items() if cycles),
+        key=lambda group_cycles: (-group_cycles[1], group_cycles[0]),
+    )
+
+
+def format_flat_profile(profile: list[tuple[str, int]]) -> str:
+    total = sum(cycles for _, cycles in profile)
+    lines = [f"{'cycles':>12} {'%':>6}  label"]
+    for label, cycles in profile:
+        lines.append(f"{cycles:>12} {cycles / total:>6.1%}  {label}")
+    lines.append(f"{total:>12} {'':>6}  total")
+    return "\n".join(lines)
+
+
+def format_calls(calls: dict[str, int]) -> str:
+    lines = [f"{'calls':>12}  function"]
+    for function, count in sorted(calls.items(), key=lambda call: (-call[1], call[0])):
+        lines.append(f"{count:>12}  {function}")
+    return "\n".join(lines)
+
+
+def write_collapsed(path: str, stacks: dict[tuple[str, ...], int]) -> None:
+    with open(path, "w") as f:
+        f.writelines(
+            f"{';'.join(stack)} {cycles}\n" for stack, cycles in stacks.items() if cycles
+        )
+
+
+def main(
+    path: str,
+    cycles: int = DEFAULT_CYCLES,
+    by_function: bool = False,
+    collapsed: Optional[str] = None,
+) -> ProfilingCPU:
+    """Profile a test script, or a program run from reset for cycles, and
+    print its flat profile and call counts"""
+    if path.endswith(".tst"):
+        script = TestScript.from_file(path)
+        script.cpu_class = ProfilingCPU
+        script.run()
+        cpu = script.cpu
+    else:
+        cpu = ProfilingCPU()
+        cpu.load(path)
+        cpu.run(cycles)
+
+    print(format_flat_profile(flat_profile(cpu.counts, cpu.labels, by_function)))
+    if cpu.calls:
+        print()
+        print(format_calls(cpu.calls))
+    if collapsed is not None:
+        write_collapsed(collapsed, cpu.collapsed_stacks())
+    return cpu
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Profile a Hack program by label or VM function"
+    )
+    argparser.add_argument("path", type=str, help="a .tst script or .asm/.hack program")
+    argparser.add_argument(
+        "--cycles", type=int, default=DEFAULT_CYCLES,
+        help="cycles to run a program for; scripts run for as long as they run it",
+    )
+    argparser.add_argument(
+        "--by-function",
+        action="store_true",
+        help="total the cycles by VM function rather than by label",
+    )
+    argparser.add_argument(
+        "--collapsed", type=str, default=None,
+        help="write the cycles of each call stack to this file, for flame graphs",
+    )
+    args = argparser.parse_args()
+
+    main(args.path, args.cycles, args.by_function, args.collapsed)
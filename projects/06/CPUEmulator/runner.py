@@ -0,0 +1,194 @@
+"""Runs every .tst test script under the given paths across a pool of worker
+processes, run from projects/06, e.g.,
+
+    python -m CPUEmulator.runner .. --json results.json --junit results.xml
+
+Scripts which load a program or Computer.hdl are run with the CPU emulator,
+writing their .out files alongside them as main does. Those which need the
+hardware simulator or the VM emulator, and interactive scripts such as
+Fill.tst, are reported as skipped.
+
+Output is compared with the compare-to file as the nand2tetris tools do,
+where a * in the compare-to file matches any character.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Iterable, NamedTuple, Optional
+
+from CPUEmulator.hle import with_hooks
+from CPUEmulator.script import ComparisonError, TestScript, UnsupportedScript
+
+PASSED, FAILED, ERROR, SKIPPED = "passed", "failed", "error", "skipped"
+
+
+class Result(NamedTuple):
+    path: str
+    status: str
+    seconds: float
+    message: Optional[str] = None
+
+
+def collect_scripts(paths: Iterable[str]) -> list[str]:
+    """Expand the provided files and directories into the .tst files to run.
+    Directories are searched recursively."""
+    scripts: dict[str, None] = {}
+    for path in paths:
+        if os.path.isdir(path):
+            scripts.update(
+                dict.fromkeys(
+                    sorted(
+                        os.path.join(directory, filename)
+                        for directory, _, filenames in os.walk(path)
+                        for filename in filenames
+                        if filename.endswith(".tst")
+                    )
+                )
+            )
+        else:
+            scripts[path] = None
+    return list(scripts)
+
+
+def run_script(path: str, translate: bool = False, hle: bool = False) -> Result:
+    start = time.perf_counter()
+    try:
+        script = TestScript.from_file(path, translate)
+        if hle:
+            script.cpu_class = with_hooks(script.cpu_class)
+        script.run()
+    except UnsupportedScript as e:
+        return Result(path, SKIPPED, time.perf_counter() - start, str(e))
+    except ComparisonError as e:
+        return Result(path, FAILED, time.perf_counter() - start, str(e))
+    except Exception as e:
+        # Such as a malformed program, which mustn't stop the other scripts
+        return Result(path, ERROR, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+    return Result(path, PASSED, time.perf_counter() - start)
+
+
+def run_all(
+    paths: list[str],
+    workers: Optional[int] = None,
+    translate: bool = False,
+    hle: bool = False,
+) -> list[Result]:
+    """Run each of the scripts, in parallel across a pool of worker processes,
+    printing the result of each as it finishes"""
+    run = partial(run_script, translate=translate, hle=hle)
+    if workers == 1 or len(paths) <= 1:
+        return _report(map(run, paths))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return _report(executor.map(run, paths))
+
+
+def _report(results: Iterable[Result]) -> list[Result]:
+    reported = []
+    for result in results:
+        _print_result(result)
+        reported.append(result)
+    return reported
+
+
+def _print_result(result: Result) -> None:
+    label = {PASSED: "ok  ", FAILED: "FAIL", ERROR: "ERR ", SKIPPED: "skip"}[result.status]
+    line = f"{label} {result.path} ({result.seconds * 1000:.1f} ms)"
+    print(f"{line}: {result.message}" if result.message else line)
+
+
+def count(results: list[Result]) -> dict[str, int]:
+    counts = {status: 0 for status in (PASSED, FAILED, ERROR, SKIPPED)}
+    for result in results:
+        counts[result.status] += 1
+    return counts
+
+
+def write_json(path: str, results: list[Result], seconds: float) -> None:
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "python": sys.version,
+                "seconds": seconds,
+                "counts": count(results),
+                "results": [result._asdict() for result in results],
+            },
+            f,
+            indent=2,
+        )
+
+
+def write_junit(path: str, results: list[Result], seconds: float) -> None:
+    counts = count(results)
+    suite = ElementTree.Element(
+        "testsuite",
+        name="nand2tetris",
+        tests=str(len(results)),
+        failures=str(counts[FAILED]),
+        errors=str(counts[ERROR]),
+        skipped=str(counts[SKIPPED]),
+        time=f"{seconds:.3f}",
+    )
+    for result in results:
+        directory, filename = os.path.split(os.path.normpath(result.path))
+        case = ElementTree.SubElement(
+            suite,
+            "testcase",
+            classname=directory.replace(os.sep, ".").strip("."),
+            name=filename,
+            time=f"{result.seconds:.3f}",
+        )
+        if result.status != PASSED:
+            tag = {FAILED: "failure", ERROR: "error", SKIPPED: "skipped"}[result.status]
+            ElementTree.SubElement(case, tag, message=result.message or "")
+    ElementTree.ElementTree(suite).write(path, encoding="utf-8", xml_declaration=True)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Run every .tst test script under the given paths"
+    )
+    argparser.add_argument(
+        "paths", type=str, nargs="+", help=".tst files or directories to search for them"
+    )
+    argparser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes; defaults to the number of CPUs",
+    )
+    argparser.add_argument(
+        "--translate",
+        action="store_true",
+        help="run programs as Python basic blocks",
+    )
+    argparser.add_argument(
+        "--hle",
+        action="store_true",
+        help="run calls to some of the OS functions as Python",
+    )
+    argparser.add_argument("--json", type=str, default=None,
+                           help="write the results to this JSON file")
+    argparser.add_argument("--junit", type=str, default=None,
+                           help="write the results to this JUnit XML file")
+    args = argparser.parse_args()
+
+    start = time.perf_counter()
+    results = run_all(collect_scripts(args.paths), args.workers, args.translate, args.hle)
+    seconds = time.perf_counter() - start
+
+    counts = count(results)
+    print(
+        f"{counts[PASSED]} passed, {counts[FAILED]} failed, {counts[ERROR]} errors,"
+        f" {counts[SKIPPED]} skipped in {seconds:.2f} s"
+    )
+    if args.json:
+        write_json(args.json, results, seconds)
+    if args.junit:
+        write_junit(args.junit, results, seconds)
+    sys.exit(1 if counts[FAILED] or counts[ERROR] else 0)
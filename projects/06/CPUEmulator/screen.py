@@ -0,0 +1,267 @@
+"""The Hack screen, RAM[16384..24575]: 256 rows of 32 words, with the least
+significant bit of each word the leftmost of its 16 pixels and 1 black.
+
+The screen can be viewed without copying RAM, as a memoryview of its words or,
+with NumPy installed, as a 256x32 array which np.unpackbits turns into pixels,
+e.g.,
+
+    pixels = screen_pixels(cpu.ram)  # 256x512, 1 for black
+    print(pixels[:4, :16])
+
+Snapshots are written as PNG or PBM images, at chosen cycles or every so many
+frames, e.g., run from projects/06,
+
+    python -m CPUEmulator.screen ../05/ComputerRect.tst
+    python -m CPUEmulator.screen ../04/fill/FillAutomatic.tst --at 1000000 2000000
+    python -m CPUEmulator.screen pong/Pong.asm --cycles 5000000 --every 10
+
+The Hack computer has no frame rate, so a frame is taken to be FRAME_CYCLES
+cycles, or --frame-cycles. Taking a snapshot only copies the 16K bytes of the
+screen; the image is encoded and written by a background thread, so that the
+program carries on running.
+"""
+
+import argparse
+import os
+import struct
+import sys
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+
+from CPUEmulator.blocks import BlockCPU
+from CPUEmulator.cpu import CPU, KBD, SCREEN, load_program
+from CPUEmulator.script import TestScript
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SCREEN_WIDTH = 512
+SCREEN_HEIGHT = 256
+SCREEN_WORDS = KBD - SCREEN
+ROW_BYTES = SCREEN_WIDTH // 8
+FRAME_CYCLES = 100_000
+DEFAULT_CYCLES = 1_000_000
+FORMATS = ["png", "pbm"]
+
+# Reverses the bits of a byte, since images put the leftmost pixel in the most
+# significant bit. PNG greyscale has 0 for black, so it is also inverted.
+REVERSED_BITS = bytes(int(f"{byte:08b}"[::-1], 2) for byte in range(256))
+INVERTED_BITS = bytes(byte ^ 0xFF for byte in REVERSED_BITS)
+
+
+def screen_view(ram) -> memoryview:
+    """The screen words, sharing memory with RAM"""
+    return memoryview(ram)[SCREEN:KBD]
+
+
+def screen_array(ram):
+    """The screen words as a 256x32 NumPy array, sharing memory with RAM"""
+    if np is None:
+        raise ImportError("screen_array needs NumPy")
+    return np.frombuffer(
+        ram, dtype=np.int16, count=SCREEN_WORDS, offset=SCREEN * ram.itemsize
+    ).reshape(SCREEN_HEIGHT, SCREEN_WIDTH // 16)
+
+
+def screen_pixels(ram):
+    """The screen as a 256x512 NumPy array of pixels, 1 for black"""
+    words = screen_array(ram)
+    if sys.byteorder == "big":
+        words = words.byteswap()
+    return np.unpackbits(words.view(np.uint8), axis=1, bitorder="little")
+
+
+def screen_bytes(ram) -> bytes:
+    """A copy of the screen words, least significant byte first"""
+    view = screen_view(ram)
+    if sys.byteorder == "big":
+        words = view.obj[SCREEN:KBD]
+        words.byteswap()
+        return words.tobytes()
+    return view.tobytes()
+
+
+def pbm(data: bytes) -> bytes:
+    """Encode a copy of the screen from screen_bytes as a binary PBM image"""
+    return f"P4\n{SCREEN_WIDTH} {SCREEN_HEIGHT}\n".encode() + data.translate(REVERSED_BITS)
+
+
+def png(data: bytes) -> bytes:
+    """Encode a copy of the screen from screen_bytes as a 1-bit PNG image"""
+    pixels = data.translate(INVERTED_BITS)
+    # Each row starts with its filter type, 0 for none
+    rows = b"".join(
+        b"\0" + pixels[start:start + ROW_BYTES]
+        for start in range(0, len(pixels), ROW_BYTES)
+    )
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", SCREEN_WIDTH, SCREEN_HEIGHT, 1, 0, 0, 0, 0))
+        + _png_chunk(b"IDAT", zlib.compress(rows))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data))
+        + kind
+        + data
+        + struct.pack(">I", zlib.crc32(kind + data))
+    )
+
+
+ENCODERS = {"png": png, "pbm": pbm}
+
+
+class Snapshots:
+    """Takes snapshots of the screen into a directory, as name-TIME.png"""
+
+    def __init__(
+        self,
+        directory: str,
+        name: str = "screen",
+        format: str = "png",
+        at: Iterable[int] = (),
+        every: Optional[int] = None,
+        frame_cycles: int = FRAME_CYCLES,
+    ) -> None:
+        if format not in ENCODERS:
+            raise ValueError(f"Unknown image format: {format}")
+        self.directory = directory
+        self.name = name
+        self.format = format
+        # The cycles at which to take snapshots, and the number of cycles
+        # between snapshots if they're taken every so many frames
+        self.at = sorted(at)
+        self.interval = every * frame_cycles if every else None
+        # The time of the last snapshot
+        self.last = -1
+        self.paths: list[str] = []
+        self.writer = ThreadPoolExecutor(max_workers=1)
+        self.pending: list[Future] = []
+
+    def due(self, time: int) -> Optional[int]:
+        """The time of the next snapshot at or after time, if there is one"""
+        after = max(time, self.last + 1)
+        times = [at for at in self.at if at >= after]
+        if self.interval:
+            times.append(-(-max(after, 1) // self.interval) * self.interval)
+        return min(times, default=None)
+
+    def take(self, cpu: CPU) -> str:
+        """Copy the screen now and write it out in the background"""
+        path = os.path.join(self.directory, f"{self.name}-{cpu.time}.{self.format}")
+        self.pending.append(
+            self.writer.submit(_write, path, ENCODERS[self.format], screen_bytes(cpu.ram))
+        )
+        self.paths.append(path)
+        self.last = cpu.time
+        return path
+
+    def run(
+        self, cpu: CPU, cycles: int, run: Optional[Callable[[int], None]] = None
+    ) -> None:
+        """Run the CPU for cycles, taking the snapshots which fall due. run
+        replaces cpu.run, if given."""
+        run = run or cpu.run
+        end = cpu.time + cycles
+        due = self.due(cpu.time)
+        while due is not None and due <= end:
+            run(due - cpu.time)
+            self.take(cpu)
+            due = self.due(cpu.time)
+        run(end - cpu.time)
+
+    def close(self) -> None:
+        """Wait for every snapshot to be written"""
+        self.writer.shutdown(wait=True)
+        for future in self.pending:
+            future.result()
+
+
+def _write(path: str, encode, data: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(encode(data))
+
+
+def recording(cpu_class: type, snapshots: Snapshots) -> type:
+    """A subclass of cpu_class which takes snapshots as it runs, e.g., for the
+    cpu_class of a TestScript"""
+
+    class RecordingCPU(cpu_class):
+        def run(self, cycles: int) -> None:
+            snapshots.run(self, cycles, super().run)
+
+    return RecordingCPU
+
+
+def main(
+    path: str,
+    cycles: int = DEFAULT_CYCLES,
+    snapshots: Optional[Snapshots] = None,
+    translate: bool = False,
+) -> list[str]:
+    """Run a test script, or a program from reset for cycles, taking the
+    snapshots which fall due and one at the end. Returns their paths."""
+    if snapshots is None:
+        snapshots = Snapshots(os.path.dirname(os.path.abspath(path)))
+    cpu_class = BlockCPU if translate else CPU
+    try:
+        if path.endswith(".tst"):
+            script = TestScript.from_file(path, translate)
+            script.cpu_class = recording(cpu_class, snapshots)
+            script.run()
+            cpu = script.cpu
+        else:
+            cpu = cpu_class(load_program(path))
+            snapshots.run(cpu, cycles)
+        if snapshots.last != cpu.time:
+            snapshots.take(cpu)
+    finally:
+        snapshots.close()
+    return snapshots.paths
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Write snapshots of the Hack screen as a program runs"
+    )
+    argparser.add_argument("path", type=str, help="a .tst script or .asm/.hack program")
+    argparser.add_argument(
+        "--cycles", type=int, default=DEFAULT_CYCLES,
+        help="cycles to run a program for; scripts run for as long as they run it",
+    )
+    argparser.add_argument(
+        "--at", type=int, nargs="+", default=[],
+        help="cycles at which to take snapshots",
+    )
+    argparser.add_argument(
+        "--every", type=int, default=None, help="take a snapshot every N frames"
+    )
+    argparser.add_argument("--frame-cycles", type=int, default=FRAME_CYCLES)
+    argparser.add_argument("--format", choices=FORMATS, default="png")
+    argparser.add_argument(
+        "--output-dir", type=str, default=None,
+        help="where to write the snapshots; defaults to the program's directory",
+    )
+    argparser.add_argument(
+        "--translate",
+        action="store_true",
+        help="run programs as Python basic blocks",
+    )
+    args = argparser.parse_args()
+
+    name = os.path.splitext(os.path.basename(args.path))[0]
+    directory = args.output_dir or os.path.dirname(os.path.abspath(args.path))
+    paths = main(
+        args.path,
+        args.cycles,
+        Snapshots(directory, name, args.format, args.at, args.every, args.frame_cycles),
+        args.translate,
+    )
+    for path in paths:
+        print(path)
@@ -0,0 +1,358 @@
+"""Runs the .tst test scripts of the nand2tetris tools against the CPU
+emulator, writing the same .out files as the Java CPU emulator and hardware
+simulator, e.g.,
+
+    script = TestScript.from_file("mult/Mult.tst")
+    script.run()
+
+Scripts may load a program (load Mult.asm) or the Computer chip (load
+Computer.hdl followed by ROM32K load Add.hack), which is emulated by the CPU
+rather than simulated from its HDL. Other chips are not supported.
+
+The supported commands are load, output-file, compare-to, output-list, set,
+output, tick, tock, ticktock, echo, repeat n { ... } and while cond { ... }.
+"""
+
+import operator
+import os
+import re
+from typing import NamedTuple, Optional, TextIO, Union
+
+from CPUEmulator.blocks import BlockCPU
+from CPUEmulator.comparator import Comparison
+from CPUEmulator.cpu import CPU, to_signed
+
+# Used when an output-list entry has no %format
+DEFAULT_FORMAT = "B1.16.1"
+
+TOKEN_PATTERN = re.compile(r'"[^"]*"|[,;{}]|[^\s,;{}"]+')
+COMMENT_PATTERN = re.compile(r"//[^\n]*|/\*.*?\*/", re.DOTALL)
+FORMAT_PATTERN = re.compile(r"([BDSX])(\d+)\.(\d+)\.(\d+)$")
+VARIABLE_PATTERN = re.compile(r"(\w+)(?:\[(\d*)\])?$")
+
+# Names of the same register in the CPU emulator and the Computer chip
+REGISTER_ALIASES = {
+    "A": "A",
+    "ARegister": "A",
+    "D": "D",
+    "DRegister": "D",
+    "PC": "PC",
+    "RAM": "RAM",
+    "RAM16K": "RAM",
+    "ROM": "ROM",
+    "ROM32K": "ROM",
+    "time": "time",
+    "reset": "reset",
+}
+
+CONDITIONS = {
+    "=": operator.eq,
+    "<>": operator.ne,
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+}
+
+
+class ScriptError(Exception):
+    """A test script couldn't be run"""
+
+
+class ComparisonError(ScriptError):
+    """An output line didn't match the line in the compare-to file"""
+
+
+class UnsupportedScript(ScriptError):
+    """A test script needs the hardware simulator or VM emulator, or is
+    interactive"""
+
+
+class Repeat(NamedTuple):
+    # None repeats forever
+    count: Optional[int]
+    body: list
+
+
+class While(NamedTuple):
+    condition: list[str]
+    body: list
+
+
+Command = Union[list[str], Repeat, While]
+
+
+class OutputColumn(NamedTuple):
+    name: str
+    format: str
+    left: int
+    width: int
+    right: int
+
+    @classmethod
+    def parse(cls, entry: str) -> "OutputColumn":
+        """Parse an output-list entry such as RAM[0]%D2.6.2"""
+        name, _, spec = entry.partition("%")
+        match = FORMAT_PATTERN.match(spec or DEFAULT_FORMAT)
+        if match is None:
+            raise ScriptError(f"Invalid output format: {entry}")
+        format_, left, width, right = match.groups()
+        return cls(name, format_, int(left), int(width), int(right))
+
+    def header(self) -> str:
+        """The column name, centred and cut to the width of the column"""
+        total = self.left + self.width + self.right
+        name = self.name[:total]
+        left = (total - len(name)) // 2
+        return " " * left + name + " " * (total - len(name) - left)
+
+    def cell(self, value: Union[int, str]) -> str:
+        if self.format == "S":
+            text = str(value).ljust(self.width)
+        elif self.format == "D":
+            text = str(value).rjust(self.width)
+        elif self.format == "B":
+            text = format(int(value) & ((1 << self.width) - 1), f"0{self.width}b")
+        else:
+            text = format(int(value) & 0xFFFF, f"0{self.width}X")[-self.width:]
+        return " " * self.left + text + " " * self.right
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(COMMENT_PATTERN.sub(" ", text))
+
+
+def parse(tokens: list[str]) -> list[Command]:
+    """Group the tokens of a script into commands, with the bodies of repeat
+    and while loops as nested lists of commands"""
+    commands, position = _parse_block(tokens, 0)
+    if position < len(tokens):
+        raise ScriptError(f"Unexpected {tokens[position]!r}")
+    return commands
+
+
+def _parse_block(tokens: list[str], position: int) -> tuple[list[Command], int]:
+    commands: list[Command] = []
+    words: list[str] = []
+    while position < len(tokens):
+        token = tokens[position]
+        position += 1
+        if token in (",", ";"):
+            if words:
+                commands.append(words)
+                words = []
+        elif token == "}":
+            position -= 1
+            break
+        elif token == "{":
+            if not words or words[0] not in ("repeat", "while"):
+                raise ScriptError("A block must follow repeat or while")
+            body, position = _parse_block(tokens, position)
+            if position >= len(tokens):
+                raise ScriptError("Missing }")
+            position += 1
+            if words[0] == "repeat":
+                count = int(words[1]) if len(words) > 1 else None
+                commands.append(Repeat(count, body))
+            else:
+                commands.append(While(words[1:], body))
+            words = []
+        else:
+            words.append(token)
+    if words:
+        commands.append(words)
+    return commands, position
+
+
+def parse_value(text: str) -> int:
+    """Parse a set value, which may be given as %B, %X or %D"""
+    base = {"%B": 2, "%X": 16, "%D": 10}.get(text[:2].upper())
+    if base:
+        text = text[2:]
+    return to_signed(int(text, base or 10))
+
+
+class TestScript:
+    __test__ = False
+
+    def __init__(
+        self, commands: list[Command], directory: str = ".", translate: bool = False
+    ) -> None:
+        self.commands = commands
+        # Files named by the script are relative to its directory
+        self.directory = directory
+        # Whether programs are translated into Python blocks rather than run
+        # an instruction at a time
+        self.cpu_class = BlockCPU if translate else CPU
+        self.cpu = self.cpu_class()
+        self.reset = 0
+        # Whether the clock is between a tick and a tock
+        self.half_cycle = False
+        self.columns: list[OutputColumn] = []
+        self.output: Optional[TextIO] = None
+        self.compare: Optional[TextIO] = None
+        self.comparison: Optional[Comparison] = None
+
+    @classmethod
+    def from_file(cls, path: str, translate: bool = False) -> "TestScript":
+        with open(path) as f:
+            commands = parse(tokenize(f.read()))
+        return cls(commands, os.path.dirname(os.path.abspath(path)), translate)
+
+    def run(self) -> None:
+        try:
+            self.execute(self.commands)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        for f in (self.output, self.compare):
+            if f is not None:
+                f.close()
+        self.output = self.compare = None
+        self.comparison = None
+
+    def execute(self, commands: list[Command]) -> None:
+        for command in commands:
+            if isinstance(command, Repeat):
+                self._repeat(command)
+            elif isinstance(command, While):
+                while self._condition(command.condition):
+                    self.execute(command.body)
+            else:
+                self._command(command)
+
+    def get(self, name: str) -> Union[int, str]:
+        register, index = self._variable(name)
+        if register == "A":
+            return self.cpu.a
+        if register == "D":
+            return self.cpu.d
+        if register == "PC":
+            return self.cpu.pc
+        if register == "RAM":
+            return self.cpu.ram[index]
+        if register == "ROM":
+            return self.cpu.rom[index]
+        if register == "reset":
+            return self.reset
+        return f"{self.cpu.time}{'+' if self.half_cycle else ''}"
+
+    def set(self, name: str, value: int) -> None:
+        register, index = self._variable(name)
+        if register == "A":
+            self.cpu.a = value
+        elif register == "D":
+            self.cpu.d = value
+        elif register == "PC":
+            self.cpu.pc = value & 0xFFFF
+        elif register == "RAM":
+            self.cpu.ram[index] = value
+        elif register == "ROM":
+            self.cpu.write_rom(index, value & 0xFFFF)
+        elif register == "reset":
+            self.reset = value
+        else:
+            raise ScriptError(f"{name} cannot be set")
+
+    def tick(self) -> None:
+        self.half_cycle = True
+
+    def tock(self) -> None:
+        self.half_cycle = False
+        self.cpu.step()
+        if self.reset:
+            self.cpu.pc = 0
+
+    def write_output(self) -> None:
+        self._write_line(
+            "|" + "|".join(column.cell(self.get(column.name)) for column in self.columns) + "|"
+        )
+
+    def _command(self, words: list[str]) -> None:
+        name, arguments = words[0], words[1:]
+        if name == "ticktock":
+            self.tick()
+            self.tock()
+        elif name == "tick":
+            self.tick()
+        elif name == "tock":
+            self.tock()
+        elif name == "output":
+            self.write_output()
+        elif name == "set":
+            self.set(arguments[0], parse_value(arguments[1]))
+        elif name == "load":
+            self._load(arguments[0] if arguments else None)
+        elif name == "output-file":
+            self.output = open(self._path(arguments[0]), "w")
+        elif name == "compare-to":
+            self.compare = open(self._path(arguments[0]))
+            self.comparison = Comparison(self.compare)
+        elif name == "output-list":
+            self.columns = [OutputColumn.parse(entry) for entry in arguments]
+            self._write_line(
+                "|" + "|".join(column.header() for column in self.columns) + "|"
+            )
+        elif name in ("echo", "clear-echo"):
+            pass
+        elif arguments[:1] == ["load"] and REGISTER_ALIASES.get(name) == "ROM":
+            # e.g., ROM32K load Add.hack
+            self.cpu.load(self._path(arguments[1]))
+        else:
+            raise ScriptError(f"Unknown command: {' '.join(words)}")
+
+    def _load(self, filename: Optional[str]) -> None:
+        if filename is None or filename.endswith(".vm"):
+            raise UnsupportedScript("VM programs need the VM emulator")
+        self.cpu = self.cpu_class()
+        self.reset = 0
+        self.half_cycle = False
+        if filename.endswith(".hdl"):
+            if filename != "Computer.hdl":
+                raise UnsupportedScript(
+                    f"Only Computer.hdl can be emulated, not {filename}"
+                )
+            return
+        self.cpu.load(self._path(filename))
+
+    def _repeat(self, repeat: Repeat) -> None:
+        if repeat.count is None:
+            raise UnsupportedScript("repeat without a count never ends")
+        if repeat.body == [["ticktock"]] and not self.reset:
+            # The common case of running the program for a number of cycles
+            self.cpu.run(repeat.count)
+            self.half_cycle = False
+            return
+        for _ in range(repeat.count):
+            self.execute(repeat.body)
+
+    def _condition(self, words: list[str]) -> bool:
+        if len(words) != 3 or words[1] not in CONDITIONS:
+            raise ScriptError(f"Invalid condition: {' '.join(words)}")
+        value = self.get(words[0])
+        return CONDITIONS[words[1]](int(str(value).rstrip("+")), parse_value(words[2]))
+
+    def _variable(self, name: str) -> tuple[str, int]:
+        match = VARIABLE_PATTERN.match(name)
+        register = REGISTER_ALIASES.get(match.group(1)) if match else None
+        if register is None:
+            raise ScriptError(f"Unknown variable: {name}")
+        index = match.group(2)
+        if register in ("RAM", "ROM"):
+            if not index:
+                raise ScriptError(f"{name} needs an address")
+            return register, int(index)
+        return register, 0
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def _write_line(self, line: str) -> None:
+        if self.output is None:
+            raise ScriptError("output-file must come before output")
+        self.output.write(line + "\n")
+        if self.comparison is not None:
+            mismatch = self.comparison.check(line)
+            if mismatch is not None:
+                raise ComparisonError(mismatch.describe())
@@ -0,0 +1,168 @@
+"""Saves and restores the state of the Hack computer, so that tests can start
+from a program which has already been run through its set up, e.g.,
+
+    cpu.run(500_000)                # Sys.init, Memory.init, Output.init, ...
+    warm = capture(cpu)
+    for test in tests:
+        restore(cpu, warm)          # copies RAM back; no need to run again
+        ...
+
+or across processes through a .hackstate file, written from projects/06 with
+
+    python -m CPUEmulator.state pong/Pong.asm --cycles 500000 pong.hackstate
+
+A state refers to its ROM by the SHA-256 of its words, and can include the
+ROM itself so that it can be restored into a CPU which hasn't loaded the
+program. All values are little-endian. The file is laid out as:
+
+    offset 0   magic, b"HKST"
+    offset 4   int16 A, int16 D, uint16 PC, uint16 1 if the ROM is included
+    offset 12  uint64 time
+    offset 20  the SHA-256 of the ROM words
+    offset 52  uint32 length of the compressed RAM, then of the compressed ROM
+    offset 60  the RAM, then the ROM if included, as zlib-compressed uint16
+               words
+"""
+
+import argparse
+import hashlib
+import struct
+import sys
+import zlib
+from array import array
+from typing import NamedTuple, Optional, TypeVar
+
+from CPUEmulator.cpu import CPU, load_program
+
+MAGIC = b"HKST"
+HEADER = struct.Struct("<4shhHHQ32sII")
+
+CPUType = TypeVar("CPUType", bound=CPU)
+
+
+class State(NamedTuple):
+    rom_digest: bytes
+    # The ROM, if it is kept with the state
+    rom: Optional[array]
+    ram: array
+    a: int
+    d: int
+    pc: int
+    time: int
+
+
+def rom_digest(rom: array) -> bytes:
+    return hashlib.sha256(_little_endian(rom)).digest()
+
+
+def program(rom: array) -> array:
+    """The words of ROM up to the last which isn't zero"""
+    length = (len(rom.tobytes().rstrip(b"\0")) + 1) // 2
+    return rom[:length]
+
+
+def capture(cpu: CPU, include_rom: bool = False) -> State:
+    """Copy the state of the CPU"""
+    return State(
+        rom_digest(cpu.rom),
+        program(cpu.rom) if include_rom else None,
+        array("h", cpu.ram),
+        cpu.a,
+        cpu.d,
+        cpu.pc,
+        cpu.time,
+    )
+
+
+def restore(cpu: CPU, state: State) -> None:
+    """Put the CPU back into the state. Its ROM is replaced by the state's if
+    they differ, which needs the state to include its ROM."""
+    if rom_digest(cpu.rom) != state.rom_digest:
+        if state.rom is None:
+            raise ValueError("The state is of a different program, and doesn't include its ROM")
+        cpu.load_rom(state.rom)
+    cpu.ram[:] = state.ram
+    cpu.registers[:] = [state.a, state.d]
+    cpu.pc = state.pc
+    cpu.time = state.time
+
+
+def fork(cpu: CPUType) -> CPUType:
+    """A new CPU of the same class, with the same program and state. The new
+    CPU decodes the program again, so where the same CPU can be used,
+    restoring a captured state is cheaper."""
+    forked = type(cpu)(program(cpu.rom))
+    restore(forked, capture(cpu))
+    return forked
+
+
+def write(path: str, state: State) -> None:
+    ram = zlib.compress(_little_endian(state.ram))
+    rom = zlib.compress(_little_endian(state.rom)) if state.rom is not None else b""
+    with open(path, "wb") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC,
+                state.a,
+                state.d,
+                state.pc,
+                state.rom is not None,
+                state.time,
+                state.rom_digest,
+                len(ram),
+                len(rom),
+            )
+        )
+        f.write(ram)
+        f.write(rom)
+
+
+def read(path: str) -> State:
+    with open(path, "rb") as f:
+        data = f.read()
+
+    magic, a, d, pc, has_rom, time, digest, ram_length, rom_length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"Not a .hackstate file, magic was {magic!r}")
+    offset = HEADER.size
+    ram = _words("h", zlib.decompress(data[offset:offset + ram_length]))
+    offset += ram_length
+    rom = None
+    if has_rom:
+        rom = _words("H", zlib.decompress(data[offset:offset + rom_length]))
+    return State(digest, rom, ram, a, d, pc, time)
+
+
+def _little_endian(words: array) -> bytes:
+    if sys.byteorder != "little":
+        words = array(words.typecode, words)
+        words.byteswap()
+    return words.tobytes()
+
+
+def _words(typecode: str, data: bytes) -> array:
+    words = array(typecode)
+    words.frombytes(data)
+    if sys.byteorder != "little":
+        words.byteswap()
+    return words
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Run a program from reset and save its state"
+    )
+    argparser.add_argument("program", type=str, help="a .asm or .hack program")
+    argparser.add_argument("output", type=str, help="the .hackstate file to write")
+    argparser.add_argument("--cycles", type=int, required=True)
+    argparser.add_argument(
+        "--without-rom",
+        action="store_true",
+        help="only refer to the ROM, so that the state can only be restored"
+        " into a CPU which has loaded the same program",
+    )
+    args = argparser.parse_args()
+
+    cpu = CPU(load_program(args.program))
+    cpu.run(args.cycles)
+    write(args.output, capture(cpu, include_rom=not args.without_rom))
@@ -0,0 +1,172 @@
+import os
+
+import pytest
+
+from CPUEmulator import blocks
+from CPUEmulator.blocks import BlockCPU, block_length, block_source
+from CPUEmulator.cpu import CPU, load_program
+from HackAssembler.assembler import assemble
+
+PROJECTS_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Sums 1..R0 into R1, then stops in an infinite loop
+SUM = """
+@R1
+M=0
+(LOOP)
+@R0
+D=M
+@END
+D;JEQ
+@R1
+M=M+D
+@R0
+M=M-1
+@LOOP
+0;JMP
+(END)
+@END
+0;JMP
+"""
+
+
+def _state(cpu: CPU) -> tuple:
+    return cpu.pc, cpu.a, cpu.d, cpu.time, bytes(cpu.ram)
+
+
+def test_block_length():
+    rom, _ = assemble(SUM)
+
+    assert block_length(rom, 0) == 6
+    assert block_length(rom, 2) == 4
+    assert block_length(rom, 6) == 6
+
+
+def test_block_source_propagates_constants():
+    rom, _ = assemble("@5\nD=M\n@7\nM=D+A\n@R0\nD;JGT\n")
+
+    source = block_source(rom, 0)
+
+    assert "ram[5]" in source
+    assert "ram[7] = ((d + 7) + 32768 & 65535) - 32768" in source
+    assert "return 0" in source
+    assert "registers[0] = 0" in source
+    # A is never read before the block sets it
+    assert "= registers[0]" not in source
+
+
+def test_run_sum():
+    rom, _ = assemble(SUM)
+    cpu = BlockCPU(rom)
+    cpu.ram[0] = 100
+
+    cpu.run(1000)
+
+    assert cpu.ram[1] == 5050
+    assert cpu.time == 1000
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 1000])
+def test_matches_interpreter(chunk: int):
+    # Cycle counts stay exact even when a run ends part way through a block
+    rom = load_program(os.path.join(PROJECTS_DIR, "06", "pong", "Pong.asm"))
+    interpreter = CPU(rom)
+    translated = BlockCPU(rom)
+
+    for _ in range(50):
+        interpreter.run(chunk)
+        translated.run(chunk)
+        assert _state(translated) == _state(interpreter)
+    interpreter.run(200_000)
+    translated.run(200_000)
+    assert _state(translated) == _state(interpreter)
+
+
+@pytest.mark.parametrize("cycles", [999, 1000, 10**12])
+def test_idle_loop_is_skipped(cycles: int):
+    rom, _ = assemble(SUM)
+    cpu = BlockCPU(rom)
+    cpu.ram[0] = 10
+
+    cpu.run(cycles)
+
+    assert cpu.ram[1] == 55
+    assert cpu.time == cycles
+    if cycles < 10**12:
+        interpreter = CPU(rom)
+        interpreter.ram[0] = 10
+        for _ in range(cycles):
+            interpreter.step()
+        assert _state(cpu) == _state(interpreter)
+
+
+@pytest.mark.parametrize("inner", [2, 3])
+@pytest.mark.parametrize("cycles", [100, 1000, 5000])
+def test_loop_entered_again_is_run(cycles: int, inner: int):
+    # The inner loop flags with the same A and D each time the outer loop
+    # enters it, but the outer loop counts R0 down in between
+    rom, _ = assemble(
+        "@100\nD=A\n@R0\nM=D\n(OUTER)\n"
+        f"@{inner}\nD=A\n(INNER)\nD=D-1\n@INNER\nD;JGT\n"
+        "@R0\nMD=M-1\n@OUTER\nD;JGT\n(END)\n@END\n0;JMP\n"
+    )
+    cpu = BlockCPU(rom)
+    interpreter = CPU(rom)
+
+    cpu.run(cycles)
+    for _ in range(cycles):
+        interpreter.step()
+
+    assert _state(cpu) == _state(interpreter)
+
+
+def test_blocks_are_cached():
+    rom, _ = assemble(SUM)
+    BlockCPU(rom).run(100)
+    compiled = len(blocks._factories)
+
+    cpu = BlockCPU(rom)
+    cpu.run(100)
+
+    assert len(blocks._factories) == compiled
+    assert cpu.blocks
+
+
+def test_factories_are_bounded(monkeypatch):
+    monkeypatch.setattr(blocks, "_factories", {})
+    monkeypatch.setattr(blocks, "MAX_FACTORIES", 4)
+    rom, _ = assemble(SUM)
+    cpu = BlockCPU(rom)
+    cpu.run(100)
+    used = list(blocks._factories)
+
+    # Programs of one block each, which push out the least recently used
+    for value in range(3):
+        BlockCPU(assemble(f"@{value}\nD=A\n@0\n0;JMP\n")[0]).run(4)
+
+    assert len(blocks._factories) == 4
+    assert used[0] not in blocks._factories
+    assert list(blocks._factories)[0] == used[-1]
+
+
+def test_write_rom_invalidates_blocks():
+    rom, _ = assemble("@7\nD=A\n@0\n0;JMP\n")
+    cpu = BlockCPU(rom)
+    cpu.run(4)
+
+    cpu.write_rom(1, 0b1110111010010000)
+    cpu.run(4)
+
+    assert cpu.d == -1
+
+
+def test_address_outside_ram():
+    rom, _ = assemble("@32767\nD=A\n@0\n0;JMP\n(FAULT)\nA=-1\nM=D\n")
+    cpu = BlockCPU(rom)
+    cpu.run(4)
+    cpu.pc = 4
+
+    with pytest.raises(IndexError):
+        cpu.run(1000)
+    # The registers are left as they were at the start of the block
+    assert (cpu.pc, cpu.a, cpu.d, cpu.time) == (4, 0, 32767, 4)
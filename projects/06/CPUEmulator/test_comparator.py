@@ -0,0 +1,105 @@
+import pytest
+
+from CPUEmulator.comparator import (
+    Comparison,
+    Mismatch,
+    compare,
+    compare_files,
+    lines_match,
+    split_columns,
+)
+
+EXPECTED = [
+    "|  a   |  b   |  out  |\r\n",
+    "|  0   |  1   |   1   |\r\n",
+    "|  1   |  1   |   *   |\r\n",
+    "|  1   |  0   |   1   |",
+]
+
+
+@pytest.mark.parametrize(
+    "line,expected,match",
+    [
+        ("|  12 |", "|  12 |", True),
+        ("|  12 |", "|  ** |", True),
+        ("|  12 |", "|  13 |", False),
+        ("|  12 |", "|  12  |", False),
+    ],
+)
+def test_lines_match(line: str, expected: str, match: bool):
+    assert lines_match(line, expected) == match
+
+
+def test_split_columns():
+    assert split_columns("|  1 |  2 |") == ["  1 ", "  2 "]
+    assert split_columns("no columns") == ["no columns"]
+
+
+def test_compare_matching():
+    lines = ["|  a   |  b   |  out  |\n", "|  0   |  1   |   1   |\n",
+             "|  1   |  1   |   0   |\n", "|  1   |  0   |   1   |\n"]
+
+    assert list(compare(lines, EXPECTED)) == []
+
+
+def test_compare_reports_every_mismatch():
+    lines = ["|  a   |  b   |  out  |", "|  0   |  0   |   0   |",
+             "|  1   |  1   |   0   |", "|  0   |  1   |   0   |"]
+
+    assert list(compare(lines, EXPECTED)) == [
+        Mismatch(2, ["b", "out"], "|  0   |  1   |   1   |", "|  0   |  0   |   0   |"),
+        Mismatch(4, ["a", "b", "out"], "|  1   |  0   |   1   |", "|  0   |  1   |   0   |"),
+    ]
+
+
+def test_compare_different_lengths():
+    mismatches = list(compare(EXPECTED[:2], EXPECTED))
+
+    assert [mismatch.line_number for mismatch in mismatches] == [3, 4]
+    assert mismatches[0].actual is None
+    assert "missing" in mismatches[0].describe()
+
+    extra = list(compare(EXPECTED + ["|  1   |  1   |   1   |"], EXPECTED))
+    assert extra == [Mismatch(5, [], None, "|  1   |  1   |   1   |")]
+
+
+def test_columns_which_dont_line_up():
+    (mismatch,) = compare(["|  a   |  b   |  out  |", "| 0 | 1 | 1 | 1 |"], EXPECTED[:2])
+
+    assert mismatch.columns == []
+    assert mismatch.describe().startswith("Comparison failure at line 2:")
+
+
+def test_ignore_whitespace():
+    lines = ["|a|b|out|", "|0|1|1|", "| 1 | 1 | 0 |", "|1|0|1|"]
+
+    assert list(compare(lines, EXPECTED)) != []
+    assert list(compare(lines, EXPECTED, ignore_whitespace=True)) == []
+
+
+def test_describe():
+    comparison = Comparison(EXPECTED)
+    comparison.check(EXPECTED[0])
+
+    mismatch = comparison.check("|  0   |  1   |   0   |")
+
+    assert mismatch.describe() == (
+        "Comparison failure at line 2, column out:"
+        " expected '|  0   |  1   |   1   |', got '|  0   |  1   |   0   |'"
+    )
+
+
+def test_compare_files_streams(tmp_path):
+    # A long output is read a line at a time rather than all at once
+    rows = 200_000
+    out = tmp_path / "Long.out"
+    cmp = tmp_path / "Long.cmp"
+    with open(out, "w") as f:
+        f.writelines(f"| {row:6} |\n" for row in range(rows))
+    with open(cmp, "w") as f:
+        f.writelines(f"| {row if row != 1234 else 0:6} |\r\n" for row in range(rows))
+
+    mismatches = compare_files(str(out), str(cmp))
+
+    assert next(mismatches).line_number == 1235
+    assert list(mismatches) == []
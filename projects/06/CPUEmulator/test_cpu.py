@@ -0,0 +1,273 @@
+import pytest
+
+from CPUEmulator.cpu import (
+    CPU,
+    KBD,
+    ROM_SIZE,
+    alu,
+    idle_loop_start,
+    load_program,
+    to_signed,
+)
+from HackAssembler.assembler import assemble
+
+# Multiplies R0 by R1 into R2
+MULT = """
+@R2
+M=0
+(LOOP)
+@R1
+D=M
+@END
+D;JLE
+@R0
+D=M
+@R2
+M=M+D
+@R1
+M=M-1
+@LOOP
+0;JMP
+(END)
+@END
+0;JMP
+"""
+
+
+def _cpu(source: str) -> CPU:
+    rom, _ = assemble(source)
+    return CPU(rom)
+
+
+@pytest.mark.parametrize(
+    "comp,x,y,expected",
+    [
+        (0b101010, 5, 9, 0),
+        (0b111111, 5, 9, 1),
+        (0b111010, 5, 9, -1),
+        (0b001100, 5, 9, 5),
+        (0b110000, 5, 9, 9),
+        (0b001101, 5, 9, -6),
+        (0b001111, 5, 9, -5),
+        (0b011111, 5, 9, 6),
+        (0b110111, 5, 9, 10),
+        (0b001110, 5, 9, 4),
+        (0b000010, 5, 9, 14),
+        (0b010011, 5, 9, -4),
+        (0b000111, 5, 9, 4),
+        (0b000000, 5, 9, 1),
+        (0b010101, 5, 9, 13),
+        (0b000010, 32767, 1, -32768),
+    ],
+)
+def test_alu(comp: int, x: int, y: int, expected: int):
+    assert alu(x, y, comp << 6) == expected
+
+
+def test_to_signed():
+    assert to_signed(65535) == -1
+    assert to_signed(32768) == -32768
+    assert to_signed(-32769) == 32767
+
+
+def test_run_mult():
+    cpu = _cpu(MULT)
+    cpu.ram[0], cpu.ram[1] = 6, 7
+
+    cpu.run(200)
+
+    assert cpu.ram[2] == 42
+    assert cpu.time == 200
+
+
+def test_step_writes_memory_before_a():
+    # AM=M+1 stores through the old value of A
+    cpu = _cpu("@5\nAM=M+1\nM=-1\n")
+    cpu.ram[5] = 9
+
+    cpu.run(3)
+
+    assert cpu.ram[5] == 10
+    assert cpu.ram[10] == -1
+    assert cpu.a == 10
+
+
+def test_step_jumps_to_old_a():
+    cpu = _cpu("@4\nA=-1;JMP\n")
+
+    cpu.run(2)
+
+    assert cpu.pc == 4
+    assert cpu.a == -1
+
+
+def test_rom_past_program_is_zero():
+    cpu = _cpu("@7\nD=A\n")
+
+    cpu.run(3)
+
+    assert (cpu.a, cpu.d, cpu.pc) == (0, 7, 3)
+
+
+def test_pc_wraps_at_end_of_rom():
+    cpu = _cpu("@7\n")
+    cpu.pc = ROM_SIZE - 1
+
+    cpu.run(2)
+
+    assert (cpu.a, cpu.pc, cpu.time) == (7, 1, 2)
+
+
+def test_address_outside_ram():
+    cpu = _cpu("@32767\nD=A\nA=D+1\nM=1\n")
+
+    with pytest.raises(IndexError):
+        cpu.run(10)
+    assert (cpu.a, cpu.pc, cpu.time) == (-32768, 3, 3)
+
+
+def test_write_rom():
+    cpu = _cpu("@7\nD=A\n")
+    cpu.write_rom(1, 0b1110111010010000)
+
+    cpu.run(2)
+
+    assert cpu.d == -1
+
+
+def test_idle_loop_start():
+    rom, _ = assemble(MULT)
+
+    # (END) @END 0;JMP
+    assert idle_loop_start(rom, 15) == 14
+    # The main loop writes memory
+    assert idle_loop_start(rom, 13) is None
+    # Jumps forward don't close a loop
+    assert idle_loop_start(rom, 5) is None
+    assert idle_loop_start(rom, 4) is None
+
+
+@pytest.mark.parametrize("cycles", [1001, 1002])
+def test_idle_loop_is_skipped(cycles: int):
+    cpu = _cpu(MULT)
+    stepped = _cpu(MULT)
+    for c in (cpu, stepped):
+        c.ram[0], c.ram[1] = 6, 7
+
+    cpu.run(cycles)
+    for _ in range(cycles):
+        stepped.step()
+
+    assert (cpu.pc, cpu.a, cpu.d, cpu.time) == (
+        stepped.pc, stepped.a, stepped.d, stepped.time
+    )
+    assert cpu.ram[2] == 42
+
+
+def test_halted_program_finishes_at_once():
+    cpu = _cpu(MULT)
+    cpu.ram[0], cpu.ram[1] = 6, 7
+
+    cpu.run(10**12)
+
+    assert cpu.ram[2] == 42
+    assert cpu.time == 10**12
+    assert cpu.pc in (14, 15)
+
+
+def test_waiting_for_key():
+    cpu = _cpu("(WAIT)\n@KBD\nD=M\n@WAIT\nD;JEQ\n@R0\nM=D\n(END)\n@END\n0;JMP\n")
+
+    cpu.run(10**12)
+    cpu.ram[KBD] = 65
+    cpu.run(10)
+
+    assert cpu.ram[0] == 65
+
+
+def test_loop_changing_registers_is_run():
+    # The loop writes no memory, but D changes each time round
+    cpu = _cpu("@100\nD=A\n(LOOP)\nD=D-1\n@LOOP\nD;JGT\n@R0\nM=D+1\n")
+
+    cpu.run(302)
+
+    assert (cpu.d, cpu.ram[0], cpu.time) == (0, 0, 302)
+    cpu.run(2)
+    assert cpu.ram[0] == 1
+
+
+@pytest.mark.parametrize("inner", [2, 3])
+@pytest.mark.parametrize("cycles", [100, 1000, 5000])
+def test_loop_entered_again_is_run(cycles: int, inner: int):
+    # The inner loop flags with the same A and D each time the outer loop
+    # enters it, but the outer loop counts R0 down in between
+    source = (
+        "@100\nD=A\n@R0\nM=D\n(OUTER)\n"
+        f"@{inner}\nD=A\n(INNER)\nD=D-1\n@INNER\nD;JGT\n"
+        "@R0\nMD=M-1\n@OUTER\nD;JGT\n(END)\n@END\n0;JMP\n"
+    )
+    cpu = _cpu(source)
+    stepped = _cpu(source)
+
+    cpu.run(cycles)
+    for _ in range(cycles):
+        stepped.step()
+
+    assert (cpu.pc, cpu.a, cpu.d, cpu.time) == (
+        stepped.pc, stepped.a, stepped.d, stepped.time
+    )
+    assert cpu.ram == stepped.ram
+
+
+def test_write_rom_into_idle_loop():
+    cpu = _cpu("(LOOP)\nD=0\n@LOOP\n0;JMP\n")
+    cpu.run(10)
+
+    # M=M+1, so that the loop now writes memory
+    cpu.write_rom(0, 0b1111110111001000)
+    cpu.pc = 0
+    cpu.run(30)
+
+    assert cpu.ram[0] == 10
+
+
+def test_load_program(tmp_path):
+    (tmp_path / "Add.asm").write_text("@2\nD=A\n")
+    (tmp_path / "Add.hack").write_text("0000000000000010\n1110110000010000\n")
+
+    assert load_program(str(tmp_path / "Add.asm")).tolist() == [2, 0b1110110000010000]
+    assert load_program(str(tmp_path / "Add.hack")).tolist() == [2, 0b1110110000010000]
+
+
+
+def _reference_step(a: int, d: int, m: int, instruction: int) -> tuple:
+    """The A, D, PC and M after executing a C-instruction, computed with the
+    ALU; M is the word at the address A held before it"""
+    out = alu(d, m if instruction & 0x1000 else a, instruction)
+    jump = (
+        (instruction & 0x4 and out < 0)
+        or (instruction & 0x2 and out == 0)
+        or (instruction & 0x1 and out > 0)
+    )
+    return (
+        out if instruction & 0x20 else a,
+        out if instruction & 0x10 else d,
+        a if jump else 1,
+        out if instruction & 0x8 else m,
+    )
+
+
+@pytest.mark.parametrize("a,d,m", [(3, 7, -2), (5, -32768, 32767), (4, 0, 0)])
+def test_handlers_match_alu(a: int, d: int, m: int):
+    cpu = CPU()
+    # Every C-instruction, including computations without a mnemonic
+    for instruction in range(0xE000, 0x10000):
+        cpu.write_rom(0, instruction)
+        cpu.a, cpu.d, cpu.pc = a, d, 0
+        cpu.ram[a] = m
+
+        cpu.step()
+
+        assert (cpu.a, cpu.d, cpu.pc, cpu.ram[a]) == _reference_step(
+            a, d, m, instruction
+        ), bin(instruction)
@@ -0,0 +1,396 @@
+import os
+import re
+import subprocess
+import sys
+from array import array
+
+import pytest
+
+from CPUEmulator import hle
+from CPUEmulator.blocks import BlockCPU
+from CPUEmulator.cpu import CPU
+from CPUEmulator.hle import Decline, Overlay, return_from, with_hooks
+
+PROJECTS_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+OS_DIR = os.path.join(os.path.dirname(PROJECTS_DIR), "tools", "OS")
+TRANSLATOR_DIR = os.path.join(PROJECTS_DIR, "08", "VMTranslator", "src")
+
+# Sys.init, without the parts of the OS a test doesn't need
+SYS = """
+function Sys.init 0
+{inits}
+call Main.main 0
+pop temp 0
+label HALT
+goto HALT
+function Sys.error 0
+label ERROR
+goto ERROR
+"""
+
+# Stores a * b and c / d in RAM[16000..16079], as a, b, c and d step through
+# their ranges, then multiplies and divides -32768, which the hooks leave to
+# the real code. Then allocates blocks of 0, 2, 4, ... words, disposing of
+# every fourth, and stores them in RAM[16100..16114].
+ARITHMETIC = """
+function Main.main 5
+push constant 250
+neg
+pop local 1
+push constant 180
+pop local 2
+push constant 12345
+pop local 3
+label ARITHMETIC
+push local 0
+push constant 40
+lt
+if-goto STORE
+goto ALLOCATE
+label STORE
+push constant 16000
+push local 0
+add
+push local 0
+add
+pop pointer 1
+push local 1
+push local 2
+call Math.multiply 2
+pop that 0
+push constant 16001
+push local 0
+add
+push local 0
+add
+pop pointer 1
+push local 3
+push local 0
+push local 0
+add
+push constant 39
+sub
+call Math.divide 2
+pop that 0
+push local 1
+push constant 13
+add
+pop local 1
+push local 2
+push constant 9
+sub
+pop local 2
+push local 3
+push constant 2311
+add
+pop local 3
+push local 0
+push constant 1
+add
+pop local 0
+goto ARITHMETIC
+label ALLOCATE
+push constant 32767
+neg
+push constant 1
+sub
+push constant 3
+call Math.multiply 2
+pop static 0
+push constant 32767
+neg
+push constant 1
+sub
+push constant 7
+call Math.divide 2
+pop static 1
+push constant 0
+pop local 0
+label ALLOCATE_LOOP
+push local 0
+push constant 15
+lt
+not
+if-goto DONE
+push local 0
+push local 0
+add
+call Memory.alloc 1
+pop local 4
+push constant 16100
+push local 0
+add
+pop pointer 1
+push local 4
+pop that 0
+push local 0
+push constant 3
+and
+if-goto ALLOCATE_NEXT
+push local 4
+call Memory.deAlloc 1
+pop temp 0
+label ALLOCATE_NEXT
+push local 0
+push constant 1
+add
+pop local 0
+goto ALLOCATE_LOOP
+label DONE
+push constant 0
+return
+"""
+
+# Prints the characters 37i & 255 for i up to 90, which include unprintable
+# characters and run onto a second line, then a newline and two backspaces.
+# Output.init alone takes over ten million cycles.
+OUTPUT = """
+function Main.main 1
+label PRINT
+push local 0
+push constant 90
+lt
+not
+if-goto DONE
+push local 0
+push constant 37
+call Math.multiply 2
+push constant 255
+and
+call Output.printChar 1
+pop temp 0
+push local 0
+push constant 1
+add
+pop local 0
+goto PRINT
+label DONE
+push constant 128
+call Output.printChar 1
+pop temp 0
+push constant 129
+call Output.printChar 1
+pop temp 0
+push constant 129
+call Output.printChar 1
+pop temp 0
+push constant 0
+return
+"""
+
+# Draws lines between points spread over a 64x32 corner of the screen,
+# alternately in black and white. Each pixel takes thousands of cycles.
+SCREEN = """
+function Main.main 1
+label LINES
+push local 0
+push constant 10
+lt
+not
+if-goto DONE
+push local 0
+push constant 1
+and
+push constant 0
+eq
+call Screen.setColor 1
+pop temp 0
+push local 0
+push constant 53
+call Math.multiply 2
+push constant 63
+and
+push local 0
+push constant 97
+call Math.multiply 2
+push constant 31
+and
+push local 0
+push constant 211
+call Math.multiply 2
+push constant 7
+add
+push constant 63
+and
+push local 0
+push constant 13
+call Math.multiply 2
+push constant 17
+add
+push constant 31
+and
+call Screen.drawLine 4
+pop temp 0
+push local 0
+push constant 1
+add
+pop local 0
+goto LINES
+label DONE
+push constant 0
+return
+"""
+
+# The functions of each OS class a program uses, in the order they're
+# initialised. Math.init needs Array.new.
+MATH = {
+    "Memory": ["init", "alloc"],
+    "Array": ["new"],
+    "Math": ["init", "abs", "multiply", "divide"],
+}
+PROGRAMS = {
+    "Arithmetic": (
+        ARITHMETIC,
+        {**MATH, "Memory": ["init", "alloc", "deAlloc"]},
+    ),
+    "Output": (
+        OUTPUT,
+        {
+            **MATH,
+            "String": ["new", "newLine", "backSpace"],
+            "Output": [
+                "init", "initMap", "create", "createShiftedMap", "getMap",
+                "drawChar", "printChar", "println", "backSpace",
+            ],
+        },
+    ),
+    "Screen": (
+        SCREEN,
+        {
+            **MATH,
+            "Screen": [
+                "init", "setColor", "drawLine", "drawConditional", "drawPixel",
+                "updateLocation",
+            ],
+        },
+    ),
+}
+
+
+def _os_functions(name: str, functions: list[str]) -> str:
+    with open(os.path.join(OS_DIR, f"{name}.vm")) as f:
+        definitions = re.split(r"(?m)^(?=function )", f.read())
+    return "".join(
+        definition for definition in definitions
+        if definition.split()[1:2] and definition.split()[1].split(".")[1] in functions
+    )
+
+
+def _build(directory, name: str) -> str:
+    """Translate the program, with the parts of the OS it uses, into
+    directory/name/name.asm"""
+    main, classes = PROGRAMS[name]
+    program = directory / name
+    program.mkdir()
+    (program / "Main.vm").write_text(main)
+    for class_name, functions in classes.items():
+        (program / f"{class_name}.vm").write_text(_os_functions(class_name, functions))
+    inits = [f"call {class_name}.init 0\npop temp 0" for class_name in classes
+             if "init" in classes[class_name]]
+    (program / "Sys.vm").write_text(SYS.format(inits="\n".join(inits)))
+    subprocess.run(
+        [sys.executable, "main.py", str(program)], cwd=TRANSLATOR_DIR, check=True
+    )
+    return str(program / f"{name}.asm")
+
+
+@pytest.fixture(scope="module")
+def programs(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("hle")
+    return {name: _build(directory, name) for name in PROGRAMS}
+
+
+def _run_until_halted(cpu: CPU) -> int:
+    """Run until Sys.init reaches its HALT loop, returning the cycles taken"""
+    halt = cpu.symbols["Sys.init$HALT"] if hasattr(cpu, "symbols") else None
+    cycles = 0
+    while cycles < 20_000_000:
+        cpu.run(10_000)
+        cycles += 10_000
+        if halt is not None and halt <= cpu.pc <= halt + 1:
+            return cycles
+    raise AssertionError("The program didn't halt")
+
+
+def _memory(cpu: CPU, symbols: dict[str, int]) -> list[int]:
+    """RAM, leaving out what the hooks don't write: the stack above SP and
+    Math.divide's table"""
+    ram = list(cpu.ram)
+    ram[ram[0]:2048] = [0] * (2048 - ram[0])
+    if "Math.1" in symbols:
+        table = ram[symbols["Math.1"]]
+        ram[table:table + 16] = [0] * 16
+    return ram
+
+
+@pytest.mark.parametrize("name", PROGRAMS)
+@pytest.mark.parametrize("cpu_class", [CPU, BlockCPU])
+def test_hooks_match_real_code(programs, name, cpu_class):
+    if cpu_class is BlockCPU and name != "Arithmetic":
+        pytest.skip("translating the whole OS into blocks is slow")
+    strict = with_hooks(cpu_class)()
+    strict.strict = True
+    strict.load(programs[name])
+    hooked = with_hooks(cpu_class)()
+    hooked.load(programs[name])
+
+    strict_cycles = _run_until_halted(strict)
+    hooked_cycles = _run_until_halted(hooked)
+
+    assert set(hooked.hooked.values()) <= set(hle.HOOKS.values())
+    assert len(hooked.hooked) == sum(name in hooked.symbols for name in hle.HOOKS)
+    assert _memory(hooked, hooked.symbols) == _memory(strict, strict.symbols)
+    assert hooked.registers == strict.registers
+    assert hooked_cycles * 2 < strict_cycles
+
+
+def test_results(programs):
+    cpu = with_hooks(CPU)()
+    cpu.load(programs["Arithmetic"])
+    _run_until_halted(cpu)
+
+    a, b, c = -250, 180, 12345
+    for i in range(40):
+        d = 2 * i - 39
+        assert cpu.ram[16000 + 2 * i] == (a * b + 32768) % 65536 - 32768
+        assert cpu.ram[16001 + 2 * i] == int(c / d)
+        a, b, c = a + 13, b - 9, (c + 2311 + 32768) % 65536 - 32768
+    # After Math.init's two tables, at 2050 and 2068. Blocks 4n are disposed
+    # of, and reused by the next allocation.
+    assert cpu.ram[16100:16103].tolist() == [2086, 2086, 2090]
+
+
+def test_strict_runs_real_code(programs):
+    cpu = with_hooks(CPU)()
+    cpu.strict = True
+    cpu.load(programs["Arithmetic"])
+    real = CPU()
+    real.load(programs["Arithmetic"])
+
+    cpu.run(20_000)
+    real.run(20_000)
+
+    assert cpu.pc == real.pc
+    assert cpu.ram == real.ram
+
+
+def test_return_from():
+    ram = array("h", bytes(2 * 32768))
+    # A call with two arguments at 300 and 301, whose frame is 302 to 306
+    ram[0:5] = array("h", [307, 307, 300, 3000, 4000])
+    ram[302:307] = array("h", [1234, 260, 290, 3001, 4001])
+    memory = Overlay(ram)
+
+    assert return_from(memory, -5) == 1234
+    assert ram[0] == 307
+    memory.commit()
+
+    assert ram[0:5].tolist() == [301, 260, 290, 3001, 4001]
+    assert ram[300] == -5
+    assert (ram[5], ram[6], ram[13]) == (307, 1234, 300)
+
+
+@pytest.mark.parametrize("x, y", [(1, 0), (-32768, 1), (7, -32768)])
+def test_divide_declines(x, y):
+    with pytest.raises(Decline):
+        hle.divide(Overlay(array("h", bytes(64))), {}, x, y)
@@ -0,0 +1,105 @@
+import os
+import shutil
+from array import array
+
+from CPUEmulator import profiler
+from CPUEmulator.profiler import ProfilingCPU, flat_profile, load_labels
+from HackAssembler import sourcemap
+from HackAssembler.assembler import assemble
+
+PROJECTS_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Calls Foo.bar twice, in the way the VM translator writes calls
+SOURCE = """
+@Foo.bar$ret.0
+D=A
+@R15
+M=D
+@Foo.bar
+0;JMP
+(Foo.bar$ret.0)
+@Foo.bar$ret.1
+D=A
+@R15
+M=D
+@Foo.bar
+0;JMP
+(Foo.bar$ret.1)
+(END)
+@END
+0;JMP
+(Foo.bar)
+@R0
+M=M+1
+@R15
+A=M
+0;JMP
+"""
+
+
+def test_load_labels(tmp_path):
+    (tmp_path / "Foo.asm").write_text(SOURCE)
+    lines = []
+    labels = {}
+    assemble(SOURCE, source_map=lines, labels=labels)
+    sourcemap.write(str(tmp_path / "Foo.map"), sourcemap.build(lines, labels))
+
+    assert load_labels(str(tmp_path / "Foo.asm")) == labels
+    # Labels sharing an address with a later one can't be read from a map
+    assert load_labels(str(tmp_path / "Foo.hack")) == {
+        "Foo.bar$ret.0": 6,
+        "END": 12,
+        "Foo.bar": 14,
+    }
+    assert load_labels(str(tmp_path / "Bar.hack")) == {}
+
+
+def test_flat_profile():
+    counts = array("Q", [1, 1, 5, 5, 2, 0])
+    labels = {"Foo.bar": 2, "Foo.bar$LOOP": 3, "Foo.baz": 4}
+
+    assert flat_profile(counts, labels) == [
+        ("Foo.bar", 5),
+        ("Foo.bar$LOOP", 5),
+        ("(start)", 2),
+        ("Foo.baz", 2),
+    ]
+    assert flat_profile(counts, labels, by_function=True) == [
+        ("Foo.bar", 10),
+        ("(start)", 2),
+        ("Foo.baz", 2),
+    ]
+
+
+def test_profile_calls():
+    labels = {}
+    rom, _ = assemble(SOURCE, labels=labels)
+    cpu = ProfilingCPU(rom, labels)
+
+    cpu.run(100)
+
+    assert cpu.ram[0] == 2
+    assert cpu.calls == {"Foo.bar": 2}
+    # Idle loops are run rather than skipped
+    assert sum(cpu.counts) == cpu.time == 100
+    assert cpu.collapsed_stacks() == {("(start)",): 90, ("Foo.bar",): 10}
+
+
+def test_profile_script(tmp_path, capsys):
+    shutil.copytree(
+        os.path.join(PROJECTS_DIR, "08", "FunctionCalls", "FibonacciElement"),
+        tmp_path / "suite",
+    )
+
+    cpu = profiler.main(
+        str(tmp_path / "suite" / "FibonacciElement.tst"),
+        by_function=True,
+        collapsed=str(tmp_path / "fib.folded"),
+    )
+
+    # Sys.init calls Main.fibonacci(4)
+    assert cpu.calls == {"Sys.init": 1, "Main.fibonacci": 9}
+    lines = (tmp_path / "fib.folded").read_text().splitlines()
+    assert "Sys.init;Main.fibonacci;Main.fibonacci;Main.fibonacci;Main.fibonacci 210" in lines
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == cpu.time
+    assert "Main.fibonacci" in capsys.readouterr().out
@@ -0,0 +1,105 @@
+import json
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+
+from CPUEmulator import runner
+from CPUEmulator.runner import Result, collect_scripts, run_all, run_script
+
+ADD = "@2\nD=A\n@R0\nM=D\n"
+SCRIPT = (
+    "load Add.asm, output-file Add.out, compare-to Add.cmp,"
+    "output-list RAM[0]%D1.6.1;"
+    "repeat 4 { ticktock; } output;"
+)
+
+
+@pytest.fixture
+def suite(tmp_path):
+    """A passing script, one which fails its comparison and one which needs
+    the hardware simulator"""
+    for name, expected in [("pass", "      2"), ("wildcard", "      *"), ("fail", "      3")]:
+        directory = tmp_path / name
+        directory.mkdir()
+        (directory / "Add.asm").write_text(ADD)
+        (directory / "Add.cmp").write_text(f"| RAM[0] |\r\n|{expected} |\r\n")
+        (directory / "Add.tst").write_text(SCRIPT)
+    (tmp_path / "chip").mkdir()
+    (tmp_path / "chip" / "And.tst").write_text("load And.hdl, output-file And.out;")
+    return tmp_path
+
+
+def test_collect_scripts(suite):
+    scripts = collect_scripts([str(suite), str(suite / "pass" / "Add.tst")])
+
+    assert scripts == [
+        str(suite / "chip" / "And.tst"),
+        str(suite / "fail" / "Add.tst"),
+        str(suite / "pass" / "Add.tst"),
+        str(suite / "wildcard" / "Add.tst"),
+    ]
+
+
+def test_run_script(suite):
+    assert run_script(str(suite / "pass" / "Add.tst")).status == runner.PASSED
+    assert run_script(str(suite / "wildcard" / "Add.tst")).status == runner.PASSED
+    failed = run_script(str(suite / "fail" / "Add.tst"))
+    assert failed.status == runner.FAILED
+    assert "line 2" in failed.message
+    skipped = run_script(str(suite / "chip" / "And.tst"))
+    assert skipped.status == runner.SKIPPED
+    assert "And.hdl" in skipped.message
+
+
+def test_run_script_error(tmp_path):
+    (tmp_path / "Bad.tst").write_text("load Missing.asm;")
+
+    result = run_script(str(tmp_path / "Bad.tst"))
+
+    assert result.status == runner.ERROR
+    assert result.message.startswith("FileNotFoundError")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_all_continues_after_error(suite, workers: int):
+    (suite / "pass" / "Bad.asm").write_text("@2\nD=Q\n")
+    (suite / "pass" / "Bad.tst").write_text(SCRIPT.replace("Add", "Bad"))
+
+    results = run_all(collect_scripts([str(suite)]), workers)
+
+    assert [result.status for result in results] == [
+        runner.SKIPPED, runner.FAILED, runner.PASSED, runner.ERROR, runner.PASSED,
+    ]
+    assert results[3].message.startswith("ValueError")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_all(suite, workers: int, capsys):
+    results = run_all(collect_scripts([str(suite)]), workers)
+
+    assert [result.status for result in results] == [
+        runner.SKIPPED, runner.FAILED, runner.PASSED, runner.PASSED,
+    ]
+    assert "FAIL" in capsys.readouterr().out
+
+
+def test_summaries(tmp_path):
+    results = [
+        Result("projects/04/mult/Mult.tst", runner.PASSED, 0.01),
+        Result("projects/01/And.tst", runner.SKIPPED, 0.0, "needs And.hdl"),
+        Result("projects/08/NestedCall.tst", runner.FAILED, 0.02, "line 2"),
+    ]
+
+    runner.write_json(str(tmp_path / "results.json"), results, 0.5)
+    runner.write_junit(str(tmp_path / "results.xml"), results, 0.5)
+
+    summary = json.loads((tmp_path / "results.json").read_text())
+    assert summary["counts"] == {"passed": 1, "failed": 1, "error": 0, "skipped": 1}
+    assert summary["results"][2]["message"] == "line 2"
+    suite = ElementTree.parse(str(tmp_path / "results.xml")).getroot()
+    assert suite.get("tests") == "3"
+    assert suite.get("failures") == "1"
+    cases = suite.findall("testcase")
+    assert (cases[0].get("classname"), cases[0].get("name")) == ("projects.04.mult", "Mult.tst")
+    assert cases[1].find("skipped") is not None
+    assert cases[2].find("failure").get("message") == "line 2"
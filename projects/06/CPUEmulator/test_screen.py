@@ -0,0 +1,129 @@
+import os
+import shutil
+import struct
+import zlib
+
+import pytest
+
+from CPUEmulator import screen
+from CPUEmulator.cpu import CPU, SCREEN
+from CPUEmulator.screen import Snapshots, pbm, png, screen_bytes, screen_view
+from HackAssembler.assembler import assemble
+
+PROJECTS_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Blackens one more word of the screen each time round
+DRAW = """
+@SCREEN
+D=A
+@R0
+M=D
+(LOOP)
+@R0
+A=M
+M=-1
+@R0
+M=M+1
+@LOOP
+0;JMP
+"""
+
+
+def _pbm_pixels(image: bytes) -> list[list[int]]:
+    header = b"P4\n512 256\n"
+    assert image.startswith(header)
+    data = image[len(header):]
+    return [
+        [data[row * 64 + column // 8] >> (7 - column % 8) & 1 for column in range(512)]
+        for row in range(256)
+    ]
+
+
+def test_screen_view_shares_ram():
+    cpu = CPU()
+    view = screen_view(cpu.ram)
+
+    cpu.ram[SCREEN + 1] = 5
+
+    assert len(view) == 8192
+    assert view[1] == 5
+
+
+def test_pbm_pixel_order():
+    cpu = CPU()
+    # The least significant bit is the leftmost pixel
+    cpu.ram[SCREEN] = 0b1
+    cpu.ram[SCREEN + 33] = -32768
+
+    pixels = _pbm_pixels(pbm(screen_bytes(cpu.ram)))
+
+    assert pixels[0][:2] == [1, 0]
+    assert pixels[1][16:32] == [0] * 15 + [1]
+    assert sum(map(sum, pixels)) == 2
+
+
+def test_png():
+    cpu = CPU()
+    cpu.ram[SCREEN] = 0b11
+
+    image = png(screen_bytes(cpu.ram))
+
+    assert image.startswith(b"\x89PNG\r\n\x1a\n")
+    assert struct.unpack(">II", image[16:24]) == (512, 256)
+    idat = image.index(b"IDAT")
+    length = struct.unpack(">I", image[idat - 4:idat])[0]
+    rows = zlib.decompress(image[idat + 4:idat + 4 + length])
+    # A filter byte, then 1 for white
+    assert len(rows) == 256 * 65
+    assert rows[:3] == b"\x00\x3f\xff"
+
+
+def test_snapshots_at_cycles_and_frames(tmp_path):
+    rom, _ = assemble(DRAW)
+    cpu = CPU(rom)
+    snapshots = Snapshots(str(tmp_path), "draw", "pbm", at=[4, 10], every=2, frame_cycles=8)
+
+    snapshots.run(cpu, 40)
+    snapshots.close()
+
+    assert [os.path.basename(path) for path in snapshots.paths] == [
+        "draw-4.pbm", "draw-10.pbm", "draw-16.pbm", "draw-32.pbm",
+    ]
+    assert cpu.time == 40
+    # Two words are drawn by cycle 16, three by 24 and so on
+    pixels = _pbm_pixels((tmp_path / "draw-16.pbm").read_bytes())
+    assert sum(pixels[0]) == 32
+    assert sum(map(sum, _pbm_pixels((tmp_path / "draw-4.pbm").read_bytes()))) == 0
+
+
+def test_script_snapshot(tmp_path):
+    for name in ["ComputerRect.tst", "ComputerRect.cmp", "Rect.hack"]:
+        shutil.copy(os.path.join(PROJECTS_DIR, "05", name), tmp_path)
+
+    paths = screen.main(
+        str(tmp_path / "ComputerRect.tst"),
+        snapshots=Snapshots(str(tmp_path), "rect", "pbm", at=[30]),
+    )
+
+    assert [os.path.basename(path) for path in paths] == ["rect-30.pbm", "rect-63.pbm"]
+    # A rectangle 16 pixels wide and RAM[0] = 4 rows long
+    pixels = _pbm_pixels((tmp_path / "rect-63.pbm").read_bytes())
+    assert [sum(row) for row in pixels[:5]] == [16, 16, 16, 16, 0]
+    assert pixels[3][:16] == [1] * 16
+
+
+def test_screen_pixels():
+    np = pytest.importorskip("numpy")
+    cpu = CPU()
+    cpu.ram[SCREEN] = 0b101
+    cpu.ram[SCREEN + 32] = -1
+
+    pixels = screen.screen_pixels(cpu.ram)
+
+    assert pixels.shape == (256, 512)
+    assert pixels[0, :4].tolist() == [1, 0, 1, 0]
+    assert pixels[1, :16].tolist() == [1] * 16
+    assert int(np.sum(pixels)) == 18
+    # The words are a view of RAM
+    screen.screen_array(cpu.ram)[2, 0] = 1
+    assert cpu.ram[SCREEN + 64] == 1
@@ -0,0 +1,139 @@
+import os
+import shutil
+
+import pytest
+
+from CPUEmulator.script import (
+    ComparisonError,
+    OutputColumn,
+    Repeat,
+    ScriptError,
+    TestScript,
+    UnsupportedScript,
+    While,
+    parse,
+    parse_value,
+    tokenize,
+)
+
+PROJECTS_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _run_suite_script(tmp_path, directory: str, name: str, translate: bool = False) -> None:
+    """Run a copy of a script from the projects, so that the .out files in the
+    repository are untouched, and check its output against its .cmp file"""
+    shutil.copytree(os.path.join(PROJECTS_DIR, directory), tmp_path / "suite")
+    TestScript.from_file(str(tmp_path / "suite" / f"{name}.tst"), translate).run()
+
+    with open(tmp_path / "suite" / f"{name}.cmp") as f:
+        expected = f.read().splitlines()
+    assert (tmp_path / "suite" / f"{name}.out").read_text().splitlines() == expected
+
+
+@pytest.mark.parametrize(
+    "entry,header,value,cell",
+    [
+        ("RAM[0]%D2.6.2", "  RAM[0]  ", 266, "     266  "),
+        ("RAM[11]%D1.6.1", "RAM[11] ", -1, "     -1 "),
+        ("RAM[3006]%D1.6.1", "RAM[3006", 42, "     42 "),
+        ("time%S1.4.1", " time ", "12+", " 12+  "),
+        ("reset%B2.1.2", "reset", 1, "  1  "),
+        ("instruction%B0.16.0", "  instruction   ", -1, "1" * 16),
+        ("PC[]%D0.4.0", "PC[]", 5, "   5"),
+        ("A%X1.4.1", "  A   ", -1, " FFFF "),
+    ],
+)
+def test_output_column(entry: str, header: str, value, cell: str):
+    column = OutputColumn.parse(entry)
+
+    assert column.header() == header
+    assert column.cell(value) == cell
+
+
+def test_output_column_default_format():
+    assert OutputColumn.parse("D") == OutputColumn("D", "B", 1, 16, 1)
+
+
+def test_parse():
+    script = """// A comment
+    load Mult.asm, /* another
+    comment */ echo "Wait, then look; carefully";
+    repeat 3 { ticktock; }
+    while RAM[0] <> 0 { ticktock, output; }
+    output
+    """
+
+    assert parse(tokenize(script)) == [
+        ["load", "Mult.asm"],
+        ["echo", '"Wait, then look; carefully"'],
+        Repeat(3, [["ticktock"]]),
+        While(["RAM[0]", "<>", "0"], [["ticktock"], ["output"]]),
+        ["output"],
+    ]
+
+
+def test_parse_unbalanced_block():
+    with pytest.raises(ScriptError):
+        parse(tokenize("repeat 3 { ticktock;"))
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [("12", 12), ("-1", -1), ("%B0101", 5), ("%XFFFF", -1), ("%D300", 300)],
+)
+def test_parse_value(text: str, expected: int):
+    assert parse_value(text) == expected
+
+
+def test_while_loop(tmp_path):
+    (tmp_path / "Count.asm").write_text("@R0\nM=M-1\n@0\n0;JMP\n")
+    (tmp_path / "Count.tst").write_text(
+        "load Count.asm, output-file Count.out, output-list RAM[0]%D1.3.1 time%S1.3.1;"
+        "set RAM[0] 3;"
+        "while RAM[0] > 0 { ticktock; }"
+        "output;"
+    )
+
+    TestScript.from_file(str(tmp_path / "Count.tst")).run()
+
+    assert (tmp_path / "Count.out").read_text() == "|RAM[0|time |\n|   0 | 10  |\n"
+
+
+def test_comparison_failure(tmp_path):
+    (tmp_path / "Add.asm").write_text("@2\nD=A\n@R0\nM=D\n")
+    (tmp_path / "Add.cmp").write_text("| RAM[0] |\r\n|      3 |\r\n")
+    (tmp_path / "Add.tst").write_text(
+        "load Add.asm, output-file Add.out, compare-to Add.cmp,"
+        "output-list RAM[0]%D1.6.1;"
+        "repeat 4 { ticktock; } output;"
+    )
+
+    with pytest.raises(ComparisonError, match="line 2"):
+        TestScript.from_file(str(tmp_path / "Add.tst")).run()
+    # As with the Java tools, the failing line is still written
+    assert (tmp_path / "Add.out").read_text() == "| RAM[0] |\n|      2 |\n"
+
+
+def test_unsupported_chip(tmp_path):
+    (tmp_path / "CPU.tst").write_text("load CPU.hdl;")
+
+    with pytest.raises(UnsupportedScript, match="Computer.hdl"):
+        TestScript.from_file(str(tmp_path / "CPU.tst")).run()
+
+
+@pytest.mark.parametrize(
+    "directory,name",
+    [
+        ("04/mult", "Mult"),
+        ("07/StackArithmetic/StackTest", "StackTest"),
+        ("08/FunctionCalls/FibonacciElement", "FibonacciElement"),
+    ],
+)
+@pytest.mark.parametrize("translate", [False, True])
+def test_program_scripts(tmp_path, directory: str, name: str, translate: bool):
+    _run_suite_script(tmp_path, directory, name, translate)
+
+
+@pytest.mark.parametrize("name", ["ComputerAdd", "ComputerMax-external"])
+def test_computer_scripts(tmp_path, name: str):
+    _run_suite_script(tmp_path, "05", name)
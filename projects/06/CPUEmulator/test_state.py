@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from CPUEmulator import state
+from CPUEmulator.blocks import BlockCPU
+from CPUEmulator.cpu import CPU, load_program
+from CPUEmulator.state import capture, fork, restore
+
+PONG = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pong", "Pong.asm"
+)
+
+
+def _state(cpu: CPU) -> tuple:
+    return cpu.pc, cpu.a, cpu.d, cpu.time, bytes(cpu.ram)
+
+
+@pytest.fixture(scope="module")
+def pong():
+    return load_program(PONG)
+
+
+@pytest.mark.parametrize("cpu_class", [CPU, BlockCPU])
+def test_restore_runs_the_same(pong, cpu_class):
+    cpu = cpu_class(pong)
+    cpu.run(100_000)
+    warm = capture(cpu)
+    cpu.run(50_000)
+    expected = _state(cpu)
+
+    restore(cpu, warm)
+    assert cpu.time == 100_000
+    cpu.run(50_000)
+
+    assert _state(cpu) == expected
+
+
+def test_write_and_read(tmp_path, pong):
+    cpu = CPU(pong)
+    cpu.run(100_000)
+    path = str(tmp_path / "pong.hackstate")
+
+    state.write(path, capture(cpu, include_rom=True))
+    restored = CPU()
+    restore(restored, state.read(path))
+
+    assert restored.rom == cpu.rom
+    assert _state(restored) == _state(cpu)
+    # RAM and ROM are compressed
+    assert os.path.getsize(path) < 20_000
+
+
+def test_read_without_rom(tmp_path, pong):
+    cpu = CPU(pong)
+    cpu.run(1000)
+    path = str(tmp_path / "pong.hackstate")
+    state.write(path, capture(cpu))
+    saved = state.read(path)
+
+    assert saved.rom is None
+    restore(CPU(pong), saved)
+    with pytest.raises(ValueError):
+        restore(CPU(), saved)
+
+
+def test_read_other_file(tmp_path):
+    path = tmp_path / "Prog.hackbin"
+    path.write_bytes(b"HKBN" + bytes(100))
+
+    with pytest.raises(ValueError):
+        state.read(str(path))
+
+
+def test_fork(pong):
+    cpu = BlockCPU(pong)
+    cpu.run(10_000)
+
+    forked = fork(cpu)
+    forked.run(10_000)
+
+    assert isinstance(forked, BlockCPU)
+    assert cpu.time == 10_000
+    cpu.run(10_000)
+    assert _state(forked) == _state(cpu)
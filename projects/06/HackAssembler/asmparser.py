@@ -1,5 +1,7 @@
 
 from enum import Enum
+from io import StringIO
+from typing import Iterable, Iterator, NamedTuple, Optional, TextIO, Union
 
 
 class InstructionTypeEnum(str, Enum):
@@ -8,72 +10,105 @@ class InstructionTypeEnum(str, Enum):
     L_INSTRUCTION = "L_INSTRUCTION"
 
 
+class Instruction(NamedTuple):
+    instruction_type: InstructionTypeEnum
+    symbol: Optional[str]
+    dest: Optional[str]
+    comp: Optional[str]
+    jump: Optional[str]
+    # 1-indexed line of the instruction in the source file
+    line_number: int
+
+
+def parse(source: Union[str, TextIO, Iterable[str]]) -> Iterator[Instruction]:
+    """Yield the instructions in the source one at a time, skipping blank lines
+    and comments. The source can be a string of assembly or anything that
+    iterates over lines, such as an open file; files are streamed rather than
+    read into memory up front."""
+    if isinstance(source, str):
+        source = StringIO(source)
+
+    for line_number, line in enumerate(source, start=1):
+        if "//" in line:
+            line = line.split("//", 1)[0]
+        line = "".join(line.split())
+        if not line:
+            continue
+
+        if line[0] == "@":
+            yield Instruction(
+                InstructionTypeEnum.A_INSTRUCTION,
+                line[1:], None, None, None, line_number,
+            )
+        elif line[0] == "(":
+            yield Instruction(
+                InstructionTypeEnum.L_INSTRUCTION,
+                line.strip("()"), None, None, None, line_number,
+            )
+        else:
+            dest = None
+            jump = None
+            if "=" in line:
+                dest, line = line.split("=", 1)
+            if ";" in line:
+                line, jump = line.split(";", 1)
+            yield Instruction(
+                InstructionTypeEnum.C_INSTRUCTION,
+                None, dest, line, jump, line_number,
+            )
+
+
 class Parser:
+    """Wraps parse() to step through a file one instruction at a time, exposing
+    the current instruction's fields as attributes. The file is closed once
+    the last instruction is loaded; use the parser as a context manager, or
+    call close, to close it when stopping early."""
+
     def __init__(self, path: str):
-        with open(path) as f:
-            self.lines: list[str] = f.readlines()
-        
-        self.num_lines = len(self.lines)
-        self.current_line = 0
+        self._file = open(path)
+        self._instructions = parse(self._file)
+        # Look one instruction ahead so that has_more_lines is accurate even
+        # when the file ends in blank lines or comments
+        self._next_instruction = self._load_next()
+
+        self.instruction_type: Optional[InstructionTypeEnum] = None
+        self.symbol: Optional[str] = None
+        self.dest: Optional[str] = None
+        self.comp: Optional[str] = None
+        self.jump: Optional[str] = None
+        self.line_number: Optional[int] = None
+
+    def __enter__(self) -> "Parser":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
 
     def advance(self):
         
         if not self.has_more_lines:
             raise ValueError("No more lines to parse")
 
-        self.current_line += 1
-        loaded_line = self.lines[self.current_line]
-
-        if not self._is_valid_line(loaded_line):
-            if not self.has_more_lines:
-                return
-            else:
-                self.advance()
-        else:
-            if "//" in loaded_line:
-                loaded_line = loaded_line.split("//")[0]
-            loaded_line = loaded_line.strip().replace(" ", "")
-            if loaded_line.startswith("@"):
-                self.instruction_type = InstructionTypeEnum.A_INSTRUCTION
-                self.symbol = loaded_line[1:]
-                self.dest = None
-                self.comp = None
-                self.jump = None
-            elif loaded_line.startswith("("):
-                self.instruction_type = InstructionTypeEnum.L_INSTRUCTION
-                self.symbol = loaded_line.replace("(", "").replace(")","").replace(" ", "")
-                self.dest = None
-                self.comp = None
-                self.jump = None
-            else:
-                self.instruction_type = InstructionTypeEnum.C_INSTRUCTION
-                self.symbol = None
-                
-                dest = None
-                jump = None
-                if "=" in loaded_line:
-                    dest = loaded_line.split("=")[0]
-                if ";" in loaded_line:
-                    jump = loaded_line.split(";")[-1]
-                
-                self.dest = dest
-                self.comp = loaded_line.split("=")[-1].split(";")[0]
-                self.jump = jump
-                
-
-    def _is_valid_line(self, line: str) -> bool:
-        line = line.strip()
-        if (
-            not line
-            or line.startswith("//")
-        ):
-            return False
-
-        return True
+        (
+            self.instruction_type,
+            self.symbol,
+            self.dest,
+            self.comp,
+            self.jump,
+            self.line_number,
+        ) = self._next_instruction
+        self._next_instruction = self._load_next()
 
+    def _load_next(self) -> Optional[Instruction]:
+        instruction = next(self._instructions, None)
+        if instruction is None:
+            self.close()
+        return instruction
 
     @property
     def has_more_lines(self):
-        return len(self.lines) > self.current_line + 1
-
+        return self._next_instruction is not None
 
@@ -0,0 +1,131 @@
+"""The in-memory assembler: converts Hack assembly into ROM words without 
+touching the filesystem, so that other tools (e.g., the VM translator or a
+test harness) can chain it in the same process, e.g.,
+
+    from HackAssembler.assembler import assemble
+
+    rom, symbol_table = assemble("@2\\nD=A\\n")
+"""
+
+from array import array
+from typing import Iterable, Optional, TextIO, Union
+
+from HackAssembler import asmparser
+from HackAssembler import code
+from HackAssembler.asmparser import Instruction
+
+PREDEFINED_SYMBOLS = {
+    "R0": "0",
+    "R1": "1",
+    "R2": "2",
+    "R3": "3",
+    "R4": "4",
+    "R5": "5",
+    "R6": "6",
+    "R7": "7",
+    "R8": "8",
+    "R9": "9",
+    "R10": "10",
+    "R11": "11",
+    "R12": "12",
+    "R13": "13",
+    "R14": "14",
+    "R15": "15",
+    "SP": "0",
+    "LCL": "1",
+    "ARG": "2",
+    "THIS": "3",
+    "THAT": "4",
+    "SCREEN": "16384",
+    "KBD": "24576",
+}
+# Variables are allocated RAM addresses from here upwards
+VARIABLE_BASE_ADDRESS = 16
+
+
+def assemble(
+    source: Union[str, TextIO, Iterable[str]],
+    symbol_table: Optional[dict[str, str]] = None,
+    source_map: Optional[list[int]] = None,
+    labels: Optional[dict[str, int]] = None,
+) -> tuple[array, dict[str, str]]:
+    """Assemble the source in a single pass over the parsed instructions. The
+    source can be a string of assembly, an iterable of lines or an open file.
+
+    A-instructions which reference a symbol that has not been defined yet are
+    left as placeholders and patched when the matching (LABEL) is reached; any
+    symbols still unresolved at the end of the source are variables and are
+    allocated RAM addresses in order of first use. 
+    
+    The symbol table starts from the predefined symbols unless one is
+    provided, in which case it is updated in place with every label and
+    variable found. If a source map is provided, the source line number of each
+    word is appended to it, and if a labels dict is provided each label is
+    added to it with its address, in the order they are defined. Returns the
+    16-bit ROM words and the symbol table.
+    """
+    return assemble_instructions(
+        asmparser.parse(source), symbol_table, source_map, labels
+    )
+
+
+def assemble_instructions(
+    instructions: Iterable[Instruction],
+    symbol_table: Optional[dict[str, str]] = None,
+    source_map: Optional[list[int]] = None,
+    labels: Optional[dict[str, int]] = None,
+) -> tuple[array, dict[str, str]]:
+    """Assemble instructions which have already been parsed, e.g., to run
+    them through the peephole optimiser first; see assemble"""
+    if symbol_table is None:
+        symbol_table = dict(PREDEFINED_SYMBOLS)
+
+    rom = array("H")
+    # Maps symbols that have been referenced before being defined to the
+    # indices of the words waiting on their address
+    unresolved: dict[str, list[int]] = {}
+    for instruction in instructions:
+        if (
+            source_map is not None
+            and instruction.instruction_type != asmparser.InstructionTypeEnum.L_INSTRUCTION
+        ):
+            source_map.append(instruction.line_number)
+
+        if instruction.instruction_type == asmparser.InstructionTypeEnum.A_INSTRUCTION:
+            symbol = instruction.symbol
+
+            if not symbol.isnumeric():
+                symbol_location = symbol_table.get(symbol, None)
+
+                if symbol_location is None:
+                    unresolved.setdefault(symbol, []).append(len(rom))
+                    rom.append(0)
+                    continue
+                symbol = symbol_location
+
+            rom.append(int(symbol))
+
+        elif instruction.instruction_type == asmparser.InstructionTypeEnum.L_INSTRUCTION:
+            address = len(rom)
+            symbol_table[instruction.symbol] = str(address)
+            if labels is not None:
+                labels[instruction.symbol] = address
+            for index in unresolved.pop(instruction.symbol, []):
+                rom[index] = address
+        else:
+            rom.append(
+                code.c_instruction(
+                    instruction.dest, instruction.comp, instruction.jump
+                )
+            )
+
+    # Whatever is still unresolved was never declared as a label, so it must
+    # be a variable
+    for symbol_ram_address, (symbol, indices) in enumerate(
+        unresolved.items(), start=VARIABLE_BASE_ADDRESS
+    ):
+        symbol_table[symbol] = str(symbol_ram_address)
+        for index in indices:
+            rom[index] = symbol_ram_address
+
+    return rom, symbol_table
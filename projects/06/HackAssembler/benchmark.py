@@ -0,0 +1,258 @@
+"""Benchmarks the throughput of the assemblers, run from projects/06, e.g.,
+
+    python -m HackAssembler.benchmark --sizes 10000 100000 1000000 5000000 \\
+        --output results.json
+
+Times both HackAssembler and HackAssemblerBasic on the example programs from
+this project and on synthetic programs with a controlled size, label density,
+variable count and comment ratio. HackAssemblerBasic cannot handle symbols, so
+it is given the symbol-free version of each program (e.g., PongL.asm).
+
+Every measurement runs in a fresh interpreter so that its peak resident memory
+(RSS) is its own. Results are printed as a table and optionally written as
+JSON so they can be compared over time.
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASIC_DIR = os.path.join(PROJECT_DIR, "HackAssemblerBasic")
+
+# Each example program, and its symbol-free version for HackAssemblerBasic
+EXAMPLE_PROGRAMS = {
+    "Max": ("max/Max.asm", "max/MaxL.asm"),
+    "Rect": ("rect/Rect.asm", "rect/RectL.asm"),
+    "Pong": ("pong/Pong.asm", "pong/PongL.asm"),
+}
+ASSEMBLERS = ["HackAssembler", "HackAssemblerBasic"]
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+# Hack A-instructions are 15 bits, so labels are only referenced if they will
+# be declared within this many words of the start of the program
+ADDRESSABLE_WORDS = 32768
+
+C_INSTRUCTIONS = [
+    "D=A", "D=M", "M=D", "AM=M-1", "M=M+1", "D=D+A", "D=D-M", "A=M",
+    "MD=M-1", "D;JGT", "D;JEQ", "0;JMP", "M=-1", "D=!D",
+]
+
+
+def generate_program(
+    path: str,
+    num_lines: int,
+    label_density: float = 0.02,
+    num_variables: int = 100,
+    comment_ratio: float = 0.1,
+    seed: int = 0,
+) -> None:
+    """Write a synthetic program of num_lines lines to path. label_density and
+    comment_ratio are the fractions of lines which are (LABEL) declarations
+    and comments, and A-instructions refer to num_variables variables as well
+    as labels, both before and after their declaration. Programs may be far
+    larger than the 32K-word ROM, but only labels expected to be declared
+    within its first 32K words are referenced so that every address fits.
+
+    With no labels or variables the program is symbol-free and can also be
+    assembled by HackAssemblerBasic."""
+    rng = random.Random(seed)
+    num_labels = 0
+    instruction_ratio = 1 - comment_ratio - label_density
+    # Leave a margin so that random variation in where labels fall doesn't
+    # push a referenced label past the addressable words
+    referenced_labels = max(
+        int(
+            0.9 * label_density
+            * min(num_lines, ADDRESSABLE_WORDS / max(instruction_ratio, 1e-9))
+        ),
+        1,
+    )
+
+    with open(path, "w") as f:
+        # HackAssemblerBasic skips the first line of the file
+        f.write("// Synthetic benchmark program\n")
+        for _ in range(num_lines - 1):
+            kind = rng.random()
+            if kind < comment_ratio:
+                f.write("// Lorem ipsum dolor sit amet\n")
+            elif kind < comment_ratio + label_density:
+                f.write(f"(L{num_labels})\n")
+                num_labels += 1
+            elif rng.random() < 0.5:
+                f.write(f"{rng.choice(C_INSTRUCTIONS)}\n")
+            else:
+                f.write(f"@{_a_operand(rng, label_density, num_variables, referenced_labels)}\n")
+
+
+def _a_operand(
+    rng: random.Random, label_density: float, num_variables: int, num_labels: int
+) -> str:
+    choice = rng.random()
+    if label_density and choice < 0.4:
+        return f"L{rng.randrange(num_labels)}"
+    if num_variables and choice < 0.7:
+        return f"v{rng.randrange(num_variables)}"
+    return str(rng.randrange(32768))
+
+
+def measure(assembler: str, path: str) -> dict[str, float]:
+    """Assemble the file in a fresh interpreter, returning the time taken to
+    assemble and the peak RSS of the process in KiB"""
+    completed = subprocess.run(
+        [sys.executable, "-m", "HackAssembler.benchmark", "--child", assembler, path],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode:
+        raise RuntimeError(
+            f"{assembler} failed to assemble {path}:\n{completed.stderr}"
+        )
+    return json.loads(completed.stdout)
+
+
+def _child(assembler: str, path: str) -> None:
+    """Entry point of the measuring interpreter"""
+    if assembler == "HackAssemblerBasic":
+        # The basic assembler imports its modules as top-level scripts
+        sys.path.insert(0, BASIC_DIR)
+        import main as assembler_main
+    else:
+        from HackAssembler import main as assembler_main
+
+    start = time.perf_counter()
+    assembler_main.main(path)
+    seconds = time.perf_counter() - start
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        # macOS reports bytes rather than KiB
+        peak_rss //= 1024
+    print(json.dumps({"seconds": seconds, "peak_rss_kib": peak_rss}))
+
+
+def run(
+    sizes: list[int],
+    label_density: float,
+    num_variables: int,
+    comment_ratio: float,
+    repeat: int,
+    assemblers: list[str],
+) -> list[dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        # Work on copies so the .hack files in the repository are untouched
+        programs = []
+        for name, (program, symbol_free) in EXAMPLE_PROGRAMS.items():
+            for source, copy in [(program, f"{name}.asm"), (symbol_free, f"{name}L.asm")]:
+                shutil.copyfile(
+                    os.path.join(PROJECT_DIR, source), os.path.join(directory, copy)
+                )
+            programs.append((name, f"{name}.asm", f"{name}L.asm"))
+
+        for size in sizes:
+            name = f"synthetic-{size}"
+            generate_program(
+                os.path.join(directory, f"{name}.asm"),
+                size,
+                label_density,
+                num_variables,
+                comment_ratio,
+            )
+            generate_program(
+                os.path.join(directory, f"{name}L.asm"),
+                size,
+                label_density=0,
+                num_variables=0,
+                comment_ratio=comment_ratio,
+            )
+            programs.append((name, f"{name}.asm", f"{name}L.asm"))
+
+        for name, program, symbol_free in programs:
+            for assembler in assemblers:
+                filename = program if assembler == "HackAssembler" else symbol_free
+                path = os.path.join(directory, filename)
+                with open(path) as f:
+                    num_lines = sum(1 for _ in f)
+
+                measurements = [measure(assembler, path) for _ in range(repeat)]
+                seconds = min(m["seconds"] for m in measurements)
+                results.append(
+                    {
+                        "program": name,
+                        "file": filename,
+                        "assembler": assembler,
+                        "lines": num_lines,
+                        "seconds": seconds,
+                        "lines_per_second": num_lines / seconds,
+                        "peak_rss_kib": max(m["peak_rss_kib"] for m in measurements),
+                    }
+                )
+                _print_result(results[-1])
+    return results
+
+
+def _print_result(result: dict) -> None:
+    print(
+        f"{result['program']:<22}{result['assembler']:<20}"
+        f"{result['lines']:>10,} lines"
+        f"{result['seconds'] * 1000:>12.1f} ms"
+        f"{result['lines_per_second']:>14,.0f} lines/s"
+        f"{result['peak_rss_kib'] / 1024:>10.1f} MiB"
+    )
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Benchmark the assemblers on example and synthetic programs"
+    )
+    argparser.add_argument("--sizes", type=int, nargs="*", default=DEFAULT_SIZES)
+    argparser.add_argument("--label-density", type=float, default=0.02)
+    argparser.add_argument("--variables", type=int, default=100)
+    argparser.add_argument("--comment-ratio", type=float, default=0.1)
+    argparser.add_argument("--repeat", type=int, default=3)
+    argparser.add_argument(
+        "--assembler", choices=ASSEMBLERS, action="append", default=None,
+        help="only benchmark this assembler; may be repeated",
+    )
+    argparser.add_argument("--output", type=str, default=None,
+                           help="write the results to this JSON file")
+    argparser.add_argument("--child", nargs=2, default=None, help=argparse.SUPPRESS)
+
+    args = argparser.parse_args()
+    if args.child:
+        _child(*args.child)
+        sys.exit(0)
+
+    results = run(
+        args.sizes,
+        args.label_density,
+        args.variables,
+        args.comment_ratio,
+        args.repeat,
+        args.assembler or ASSEMBLERS,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "python": sys.version,
+                    "parameters": {
+                        "label_density": args.label_density,
+                        "variables": args.variables,
+                        "comment_ratio": args.comment_ratio,
+                        "repeat": args.repeat,
+                    },
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
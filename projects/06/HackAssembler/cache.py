@@ -0,0 +1,145 @@
+"""A content-addressed cache of assembled programs, so that re-running the
+assembler on an unchanged .asm file copies the previous output instead of
+assembling it again.
+
+Entries are keyed by a hash of the source bytes, the options it was assembled
+with (e.g., the output format) and the assembler itself (the source of its
+modules), so editing the assembler invalidates every entry. Each entry is a
+directory holding the output file, the resolved symbol table and the source
+map. The cache is kept under a total size by evicting the least recently used
+entries.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "HACK_ASSEMBLER_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "hack-assembler"),
+)
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+OUTPUT_FILENAME = "output"
+SYMBOLS_FILENAME = "symbols.json"
+SOURCE_MAP_FILENAME = "sourcemap.json"
+
+# The modules whose behaviour determines the output
+ASSEMBLER_MODULES = [
+    "asmparser.py", "assembler.py", "code.py", "hackbin.py", "main.py",
+    "peephole.py",
+]
+
+
+def _assembler_version() -> str:
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for module in ASSEMBLER_MODULES:
+        with open(os.path.join(directory, module), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+ASSEMBLER_VERSION = _assembler_version()
+
+
+class AssemblyCache:
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_size: int = DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, source: bytes, *options: str) -> str:
+        """Return the key of the entry for this source assembled with these
+        options, e.g., the output format"""
+        digest = hashlib.sha256()
+        digest.update(ASSEMBLER_VERSION.encode())
+        for option in options:
+            digest.update(option.encode())
+            digest.update(b"\0")
+        digest.update(source)
+        return digest.hexdigest()
+
+    def fetch(self, key: str, output_path: str) -> bool:
+        """Copy the cached output for the key to output_path. Returns False if
+        there is no such entry."""
+        entry = os.path.join(self.directory, key)
+        try:
+            shutil.copyfile(os.path.join(entry, OUTPUT_FILENAME), output_path)
+            # Mark the entry as recently used for eviction
+            os.utime(entry)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def load(self, key: str) -> Optional[tuple[dict[str, str], dict]]:
+        """Return the symbol table and source map of the entry, or None if
+        there is no such entry"""
+        entry = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(entry, SYMBOLS_FILENAME)) as f:
+                symbol_table = json.load(f)
+            with open(os.path.join(entry, SOURCE_MAP_FILENAME)) as f:
+                source_map = json.load(f)
+        except FileNotFoundError:
+            return None
+        return symbol_table, source_map
+
+    def store(
+        self,
+        key: str,
+        output_path: str,
+        symbol_table: dict[str, str],
+        source_map: dict,
+    ) -> None:
+        """Add the output file, symbol table and source map as the entry for
+        the key, then evict old entries if the cache has grown too large"""
+        entry = os.path.join(self.directory, key)
+        if os.path.isdir(entry):
+            return
+
+        # Build the entry to the side and rename it into place, so that other
+        # processes never see a partially written entry
+        staging = tempfile.mkdtemp(dir=self.directory, prefix=".staging-")
+        shutil.copyfile(output_path, os.path.join(staging, OUTPUT_FILENAME))
+        with open(os.path.join(staging, SYMBOLS_FILENAME), "w") as f:
+            json.dump(symbol_table, f)
+        with open(os.path.join(staging, SOURCE_MAP_FILENAME), "w") as f:
+            json.dump(source_map, f)
+
+        try:
+            os.rename(staging, entry)
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete the least recently used entries until the cache fits in
+        max_size bytes"""
+        entries = []
+        total_size = 0
+        for name in os.listdir(self.directory):
+            entry = os.path.join(self.directory, name)
+            if name.startswith(".") or not os.path.isdir(entry):
+                continue
+            try:
+                size = sum(
+                    os.path.getsize(os.path.join(entry, filename))
+                    for filename in os.listdir(entry)
+                )
+                entries.append((os.path.getmtime(entry), size, entry))
+            except FileNotFoundError:
+                # Evicted by another process while we were looking
+                continue
+            total_size += size
+
+        for _, size, entry in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total_size -= size
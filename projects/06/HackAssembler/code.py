@@ -1,65 +1,111 @@
 """This file contains the functions which convert Hack mnemonics into binary 
-codes"""
+codes. 
+
+Every legal dest=comp;jump combination is encoded once, at import, into
+C_INSTRUCTIONS so that assembling a C-instruction is a single lookup which
+returns the 16-bit word as an int."""
+
+from itertools import permutations
+from typing import Optional
+
+COMP_TO_BINARY: dict[str, int] = {
+    "0": 0b0101010,
+    "1": 0b0111111,
+    "-1": 0b0111010,
+    "D": 0b0001100,
+    "A": 0b0110000,
+    "!D": 0b0001101,
+    "!A": 0b0110001,
+    "-D": 0b0001111,
+    "-A": 0b0110011,
+    "D+1": 0b0011111,
+    "A+1": 0b0110111,
+    "D-1": 0b0001110,
+    "A-1": 0b0110010,
+    "D+A": 0b0000010,
+    "D-A": 0b0010011,
+    "A-D": 0b0000111,
+    "D&A": 0b0000000,
+    "D|A": 0b0010101,
+    "M": 0b1110000,
+    "!M": 0b1110001,
+    "-M": 0b1110011,
+    "M+1": 0b1110111,
+    "M-1": 0b1110010,
+    "D+M": 0b1000010,
+    "D-M": 0b1010011,
+    "M-D": 0b1000111,
+    "D&M": 0b1000000,
+    "D|M": 0b1010101,
+}
+# The operands of commutative computations may be written either way round
+COMP_TO_BINARY.update(
+    {
+        f"{mnemonic[2]}{mnemonic[1]}{mnemonic[0]}": COMP_TO_BINARY[mnemonic]
+        for mnemonic in ["D+A", "D&A", "D|A", "D+M", "D&M", "D|M"]
+    }
+)
+
+JUMP_TO_BINARY: dict[Optional[str], int] = {
+    None: 0b000,
+    "JGT": 0b001,
+    "JEQ": 0b010,
+    "JGE": 0b011,
+    "JLT": 0b100,
+    "JNE": 0b101,
+    "JLE": 0b110,
+    "JMP": 0b111,
+}
+
+
+def _build_dest_table() -> dict[Optional[str], int]:
+    """Map every ordering of the destination registers (e.g., MD and DM) to
+    its bits"""
+    register_bits = {"A": 0b100, "D": 0b010, "M": 0b001}
+    dest_to_binary: dict[Optional[str], int] = {None: 0b000}
+    for length in range(1, len(register_bits) + 1):
+        for registers in permutations(register_bits, length):
+            dest_to_binary["".join(registers)] = sum(
+                register_bits[register] for register in registers
+            )
+    return dest_to_binary
+
+
+DEST_TO_BINARY = _build_dest_table()
+
+C_INSTRUCTIONS: dict[tuple[Optional[str], str, Optional[str]], int] = {
+    (dest_mnemonic, comp_mnemonic, jump_mnemonic): (
+        0b111 << 13 | comp_bits << 6 | dest_bits << 3 | jump_bits
+    )
+    for dest_mnemonic, dest_bits in DEST_TO_BINARY.items()
+    for comp_mnemonic, comp_bits in COMP_TO_BINARY.items()
+    for jump_mnemonic, jump_bits in JUMP_TO_BINARY.items()
+}
+
+
+def c_instruction(
+    dest_mnemonic: Optional[str], comp_mnemonic: str, jump_mnemonic: Optional[str]
+) -> int:
+    """Convert a full dest=comp;jump instruction into its 16-bit word"""
+    try:
+        return C_INSTRUCTIONS[(dest_mnemonic, comp_mnemonic, jump_mnemonic)]
+    except KeyError:
+        raise ValueError(
+            f"Invalid C-instruction: dest={dest_mnemonic}, comp={comp_mnemonic},"
+            f" jump={jump_mnemonic}"
+        ) from None
 
 
 def comp(mnemonic: str) -> str:
     """Convert the Hack mnemonic into the binary code"""
-    mnemonic_to_binary = {
-        "0": "0101010",
-        "1": "0111111",
-        "-1": "0111010",
-        "D": "0001100",
-        "A": "0110000",
-        "!D": "0001101",
-        "!A": "0110001",
-        "-D": "0001111",
-        "-A": "0110011",
-        "D+1": "0011111",
-        "A+1": "0110111",
-        "D-1": "0001110",
-        "A-1": "0110010",
-        "D+A": "0000010",
-        "D-A": "0010011",
-        "A-D": "0000111",
-        "D&A": "0000000",
-        "D|A": "0010101",
-        "M": "1110000",
-        "!M": "1110001",
-        "M+1": "1110111",
-        "M-1": "1110010",
-        "D+M": "1000010",
-        "D-M": "1010011",
-        "M-D": "1000111",
-        "D&M": "1000000",
-        "D|M": "1010101",
-    } 
-
-    return mnemonic_to_binary[mnemonic]
+    return f"{COMP_TO_BINARY[mnemonic]:07b}"
 
 
 def dest(mnemonic: str) -> str:
     """Convert the destination mnemonic into binary code"""
-    
-    if not mnemonic:
-        return "000"
-
-    a = "1" if "A" in mnemonic else "0"
-    d = "1" if "D" in mnemonic else "0"
-    m = "1" if "M" in mnemonic else "0"
-
-    return f"{a}{d}{m}"
+    return f"{DEST_TO_BINARY[mnemonic or None]:03b}"
 
 
 def jump(mnemonic: str) -> str:
     """Convert the jump mnemonic into binary code"""
-    mnemonic_to_binary = {
-        None: "000",
-        "JGT": "001",
-        "JEQ": "010",
-        "JGE": "011",
-        "JLT": "100",
-        "JNE": "101",
-        "JLE": "110",
-        "JMP": "111",
-    }
-    return mnemonic_to_binary[mnemonic]
+    return f"{JUMP_TO_BINARY[mnemonic]:03b}"
@@ -0,0 +1,160 @@
+"""Reads and writes .hackbin files: a packed binary alternative to the .hack 
+text format that can be memory-mapped and viewed as 16-bit words without
+copying, e.g.,
+
+    python hackbin.py Pong.hack        # writes Pong.hackbin
+    python hackbin.py Pong.hackbin     # writes Pong.hack
+
+All values are little-endian. The file is laid out as:
+
+    offset 0   magic, b"HKBN"
+    offset 4   uint32 number of ROM words
+    offset 8   uint32 offset of the symbol table, 0 if there isn't one
+    offset 12  the ROM as uint16 words
+    ...        optional symbol table: a uint32 entry count, then per entry
+               a uint16 value, a uint16 name length and the UTF-8 name
+"""
+
+import argparse
+import mmap
+import struct
+import sys
+from array import array
+from typing import Iterable, Optional
+
+MAGIC = b"HKBN"
+HEADER = struct.Struct("<4sII")
+SYMBOL_COUNT = struct.Struct("<I")
+SYMBOL_ENTRY = struct.Struct("<HH")
+
+
+def write(
+    path: str, words: Iterable[int], symbol_table: Optional[dict[str, str]] = None
+) -> None:
+    """Write the ROM words, and the symbol table if given, to a .hackbin file"""
+    rom = array("H", words)
+    if sys.byteorder != "little":
+        rom.byteswap()
+
+    symbol_table_offset = 0
+    symbol_bytes = b""
+    if symbol_table is not None:
+        symbol_table_offset = HEADER.size + len(rom) * rom.itemsize
+        symbol_bytes = _pack_symbols(symbol_table)
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(rom), symbol_table_offset))
+        f.write(rom.tobytes())
+        f.write(symbol_bytes)
+
+
+def read(path: str) -> tuple[array, Optional[dict[str, str]]]:
+    """Read a .hackbin file into an array of ROM words and its symbol table,
+    which is None if the file doesn't have one"""
+    with open(path, "rb") as f:
+        data = f.read()
+
+    num_words, symbol_table_offset = _unpack_header(data)
+    rom = array("H")
+    rom.frombytes(data[HEADER.size:HEADER.size + num_words * rom.itemsize])
+    if sys.byteorder != "little":
+        rom.byteswap()
+
+    symbol_table = None
+    if symbol_table_offset:
+        symbol_table = _unpack_symbols(data, symbol_table_offset)
+    return rom, symbol_table
+
+
+class RomImage:
+    """A memory-mapped .hackbin file. words is a zero-copy memoryview of the
+    ROM with format "H"; with NumPy installed, numpy.asarray(image.words)
+    gives an array over the same memory. Use as a context manager, or call
+    close(), to release the mapping."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        num_words, symbol_table_offset = _unpack_header(self._mmap)
+        self._view = memoryview(self._mmap)
+        self.words = self._view[HEADER.size:HEADER.size + num_words * 2].cast("H")
+        if sys.byteorder != "little":
+            # The file is little-endian, so native words need a swapped copy
+            swapped = array("H", self.words)
+            swapped.byteswap()
+            self.words.release()
+            self.words = memoryview(swapped)
+
+        self.symbol_table: Optional[dict[str, str]] = None
+        if symbol_table_offset:
+            self.symbol_table = _unpack_symbols(self._mmap, symbol_table_offset)
+
+    def close(self) -> None:
+        self.words.release()
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self) -> "RomImage":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def hack_to_hackbin(hack_path: str, hackbin_path: str) -> None:
+    """Convert a .hack text file into a .hackbin file"""
+    with open(hack_path) as f:
+        write(hackbin_path, (int(line, 2) for line in f if line.strip()))
+
+
+def hackbin_to_hack(hackbin_path: str, hack_path: str) -> None:
+    """Convert a .hackbin file back into a .hack text file"""
+    rom, _ = read(hackbin_path)
+    with open(hack_path, "w") as f:
+        f.writelines(f"{word:016b}\n" for word in rom)
+
+
+def _unpack_header(data) -> tuple[int, int]:
+    magic, num_words, symbol_table_offset = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"Not a .hackbin file, magic was {magic!r}")
+    return num_words, symbol_table_offset
+
+
+def _pack_symbols(symbol_table: dict[str, str]) -> bytes:
+    parts = [SYMBOL_COUNT.pack(len(symbol_table))]
+    for symbol, value in symbol_table.items():
+        name = symbol.encode()
+        parts.append(SYMBOL_ENTRY.pack(int(value), len(name)))
+        parts.append(name)
+    return b"".join(parts)
+
+
+def _unpack_symbols(data, offset: int) -> dict[str, str]:
+    (count,) = SYMBOL_COUNT.unpack_from(data, offset)
+    offset += SYMBOL_COUNT.size
+
+    symbol_table = {}
+    for _ in range(count):
+        value, name_length = SYMBOL_ENTRY.unpack_from(data, offset)
+        offset += SYMBOL_ENTRY.size
+        name = bytes(data[offset:offset + name_length]).decode()
+        offset += name_length
+        symbol_table[name] = str(value)
+    return symbol_table
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Convert between .hack and .hackbin files"
+    )
+    argparser.add_argument("path", type=str)
+
+    args = argparser.parse_args()
+    if args.path.endswith(".hackbin"):
+        hackbin_to_hack(args.path, args.path.removesuffix(".hackbin") + ".hack")
+    elif args.path.endswith(".hack"):
+        hack_to_hackbin(args.path, args.path.removesuffix(".hack") + ".hackbin")
+    else:
+        raise ValueError("Expected a .hack or .hackbin file")
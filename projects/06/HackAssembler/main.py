@@ -3,106 +3,239 @@ and uses the parser and code modules to generate the correct .hack output file
 """
 
 import argparse
+import glob
+import os
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Optional
+
+from HackAssembler import assembler
+from HackAssembler import cache
+from HackAssembler import asmparser
+from HackAssembler import hackbin
+from HackAssembler import peephole
+from HackAssembler import sourcemap
+from HackAssembler.assembler import PREDEFINED_SYMBOLS
+
+OUTPUT_EXTENSIONS = {
+    "hack": "hack",
+    "bin": "hackbin",
+}
+
+
+def main(
+    path: str,
+    output_format: str = "hack",
+    cache_dir: Optional[str] = None,
+    write_source_map: bool = False,
+    size_report: Optional[str] = None,
+    optimize: bool = False,
+):
+    """Assemble the file at path into a .hack or .hackbin file alongside it.
+    If cache_dir is provided, unchanged files are copied from the cache rather
+    than assembled again. 
+    
+    Optionally also writes a .map source map alongside the output, prints a
+    report of the ROM words under each label ("labels") or VM function
+    ("functions"), and runs the peephole optimiser before encoding."""
+    if output_format not in OUTPUT_EXTENSIONS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    file_path = path.removesuffix(".asm")
+    output_path = f"{file_path}.{OUTPUT_EXTENSIONS[output_format]}"
+
+    assembly_cache = None
+    cached = None
+    if cache_dir is not None:
+        assembly_cache = cache.AssemblyCache(cache_dir)
+        with open(path, "rb") as f:
+            options = [output_format, "optimize"] if optimize else [output_format]
+            key = assembly_cache.key(f.read(), *options)
+        if assembly_cache.fetch(key, output_path):
+            cached = assembly_cache.load(key)
+
+    if cached is not None:
+        _, source_map = cached
+        lines, labels = source_map["lines"], source_map["labels"]
+    else:
+        symbol_table = dict(PREDEFINED_SYMBOLS)
+        lines: list[int] = []
+        labels: dict[str, int] = {}
+        rom = assemble(path, symbol_table, lines, labels, optimize)
+
+        if output_format == "bin":
+            hackbin.write(output_path, rom, symbol_table)
+        else:
+            with open(output_path, "w") as f:
+                f.writelines(f"{word:016b}\n" for word in rom)
 
-import code
-import asmparser
-
-
-def main(path: str):
-
-    symbol_table = {
-        "R0": "0",
-        "R1": "1",
-        "R2": "2",
-        "R3": "3",
-        "R4": "4",
-        "R5": "5",
-        "R6": "6",
-        "R7": "7",
-        "R8": "8",
-        "R9": "9",
-        "R10": "10",
-        "R11": "11",
-        "R12": "12",
-        "R13": "13",
-        "R14": "14",
-        "R15": "15",
-        "SP": "0",
-        "LCL": "1",
-        "ARG": "2",
-        "THIS": "3",
-        "THAT": "4",
-        "SCREEN": "16384",
-        "KBD": "24576",
-    }
-
-    # This is bad design; we should really just load the file once
-    symbol_table: dict[str, str] = first_pass(path, symbol_table)
-
-    # Generate the code using the symbol table
-    second_pass(path, symbol_table)
-
-
-def first_pass(path: str, symbol_table: dict[str, str]) -> dict[str, str]:
-
-    parser = asmparser.Parser(path)
-    line_count = -1
-    while parser.has_more_lines:
-        parser.advance()
-        
-        if parser.instruction_type in (
-            asmparser.InstructionTypeEnum.A_INSTRUCTION,
-            asmparser.InstructionTypeEnum.C_INSTRUCTION
-        ):
-            line_count += 1
+        if assembly_cache is not None:
+            assembly_cache.store(
+                key, output_path, symbol_table, {"lines": lines, "labels": labels}
+            )
+
+    if write_source_map:
+        sourcemap.write(f"{file_path}.map", sourcemap.build(lines, labels))
+    if size_report is not None:
+        report = sourcemap.size_report(
+            labels, len(lines), by_function=size_report == "functions"
+        )
+        print(f"{path}\n{sourcemap.format_size_report(report, len(lines))}")
+
+
+def assemble(
+    path: str,
+    symbol_table: dict[str, str],
+    source_map: Optional[list[int]] = None,
+    labels: Optional[dict[str, int]] = None,
+    optimize: bool = False,
+) -> array:
+    """Assemble the file at path, optionally running the peephole optimiser
+    over it first and printing how many words it saved; see
+    assembler.assemble"""
+    with open(path) as f:
+        if not optimize:
+            rom, _ = assembler.assemble(f, symbol_table, source_map, labels)
+            return rom
+        instructions = list(asmparser.parse(f))
+
+    original_size = sum(
+        instruction.instruction_type != asmparser.InstructionTypeEnum.L_INSTRUCTION
+        for instruction in instructions
+    )
+    instructions, report = peephole.optimize(instructions)
+    print(f"{path}\n{peephole.format_report(report, original_size)}")
+    rom, _ = assembler.assemble_instructions(
+        instructions, symbol_table, source_map, labels
+    )
+    return rom
+
+
+def collect_paths(patterns: list[str]) -> list[str]:
+    """Expand the provided files, directories and glob patterns into the list
+    of .asm files to assemble. Directories are searched recursively."""
+    paths: dict[str, None] = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(
+                os.path.join(directory, filename)
+                for directory, _, filenames in os.walk(pattern)
+                for filename in filenames
+                if filename.endswith(".asm")
+            )
+        elif glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
         else:
-            symbol_table[parser.symbol] = str(line_count + 1)
-
-    return symbol_table
-
-
-def second_pass(path: str, symbol_table: dict[str, str]):
-    parser = asmparser.Parser(path)
-
-    symbol_ram_address = 16
-
-    output_lines = []
-    while parser.has_more_lines:
-        parser.advance()
-        if parser.instruction_type == asmparser.InstructionTypeEnum.A_INSTRUCTION:
-            symbol = parser.symbol
-            
-            if not symbol.isnumeric():
-                symbol_location = symbol_table.get(symbol, None)
-                
-                if not symbol_location:
-                    symbol_table[symbol] = str(symbol_ram_address)
-                    symbol = symbol_ram_address
-                    
-                    symbol_ram_address += 1
-                else:
-                    symbol = symbol_location
-
-            binary_symbol = bin(int(symbol)).removeprefix("0b").zfill(16)
-            output_lines.append(f"{binary_symbol}\n")
-                
-        elif parser.instruction_type == asmparser.InstructionTypeEnum.L_INSTRUCTION:
-            continue 
+            matches = [pattern]
+
+        paths.update(dict.fromkeys(matches))
+    return list(paths)
+
+
+def assemble_all(paths: list[str], workers: Optional[int] = None, **options) -> int:
+    """Assemble each of the files, in parallel across a pool of worker
+    processes, printing how long each took. The options are passed on to
+    main. Returns the number of files which failed to assemble."""
+    assemble_file = partial(_timed_main, **options)
+    failures = 0
+    if workers == 1 or len(paths) <= 1:
+        failures = _report(map(assemble_file, paths))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            failures = _report(executor.map(assemble_file, paths))
+
+    print(f"Assembled {len(paths) - failures}/{len(paths)} files")
+    return failures
+
+
+def _timed_main(path: str, **options) -> tuple[str, float, Optional[str]]:
+    """Run main on one file, returning the path, the time taken and the error
+    message if it failed"""
+    start = time.perf_counter()
+    try:
+        main(path, **options)
+    except Exception as e:
+        return path, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+    return path, time.perf_counter() - start, None
+
+
+def _report(results) -> int:
+    failures = 0
+    for path, seconds, error in results:
+        if error:
+            failures += 1
+            print(f"FAIL {path} ({seconds * 1000:.1f} ms): {error}")
         else:
-            output_lines.append(
-                f"111{code.comp(parser.comp)}{code.dest(parser.dest)}{code.jump(parser.jump)}\n"
-            )
+            print(f"ok   {path} ({seconds * 1000:.1f} ms)")
+    return failures
 
-    file_path = path.removesuffix(".asm")
-    with open(f"{file_path}.hack", "w") as f:
-        f.writelines(output_lines)
-    
 
 if __name__ == "__main__":
     argparser = argparse.ArgumentParser(
         description="Convert .asm files into .hack binary files"
     )
-    argparser.add_argument("path", type=str)
+    argparser.add_argument(
+        "paths",
+        type=str,
+        nargs="+",
+        help=".asm files, directories to search for them, or glob patterns",
+    )
+    argparser.add_argument(
+        "--format",
+        choices=["hack", "bin"],
+        default="hack",
+        help="write a .hack text file or a packed .hackbin image",
+    )
+
+    argparser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes; defaults to the number of CPUs",
+    )
+
+    argparser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=cache.DEFAULT_CACHE_DIR,
+        help="where to cache assembled programs",
+    )
+    argparser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="always assemble, without reading or writing the cache",
+    )
+    argparser.add_argument(
+        "--source-map",
+        action="store_true",
+        help="write a .map file giving the source line and label of each word",
+    )
+    argparser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="shorten the program with the peephole optimiser before encoding",
+    )
+    argparser.add_argument(
+        "--size-report",
+        choices=["labels", "functions"],
+        default=None,
+        help="print the ROM words under each label or VM function",
+    )
 
     args = argparser.parse_args()
-    main(args.path)
+    paths = collect_paths(args.paths)
+    if not paths:
+        argparser.error("no .asm files found")
+    cache_dir = None if args.no_cache else args.cache_dir
+    failures = assemble_all(
+        paths,
+        args.workers,
+        output_format=args.format,
+        cache_dir=cache_dir,
+        write_source_map=args.source_map,
+        size_report=args.size_report,
+        optimize=args.optimize,
+    )
+    sys.exit(1 if failures else 0)
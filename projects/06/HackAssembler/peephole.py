@@ -0,0 +1,302 @@
+"""A peephole optimiser for Hack assembly, run on the parsed instructions
+before they are encoded, e.g.,
+
+    python -m HackAssembler.main --optimize FibonacciElement.asm
+
+Each rule rewrites a short window of instructions into a shorter sequence
+which leaves A, D, RAM and the flow of control exactly as they were. The rules
+are aimed at the code generated by the VM translator, e.g.,
+
+    @SP          @SP
+    M=M-1   ->   AM=M-1
+    A=M
+
+Rewrites never span a (LABEL), since code after a label may be reached from
+elsewhere. Removing instructions moves everything after them to a lower ROM
+address, which is only safe if every jump goes through a label, so programs
+which jump to a numeric address are left untouched.
+"""
+
+from collections import Counter
+from typing import Callable, Optional
+
+from HackAssembler.asmparser import Instruction, InstructionTypeEnum
+
+A_INSTRUCTION = InstructionTypeEnum.A_INSTRUCTION
+C_INSTRUCTION = InstructionTypeEnum.C_INSTRUCTION
+L_INSTRUCTION = InstructionTypeEnum.L_INSTRUCTION
+
+PUSH_D = ["@SP", "A=M", "M=D", "@SP", "M=M+1"]
+# A push of D immediately followed by a pop into D, as written by the VM
+# translator both before and after the other rules have been applied to it
+PUSH_POP_PATTERNS = [
+    ["@SP", "A=M", "M=D", "@SP", "M=M+1", "@SP", "M=M-1", "A=M", "D=M"],
+    ["@SP", "A=M", "M=D", "@SP", "M=M+1", "@SP", "AM=M-1", "D=M"],
+    ["@SP", "A=M", "M=D", "@SP", "M=M+1", "AM=M-1", "D=M"],
+]
+
+
+def optimize(instructions: list[Instruction]) -> tuple[list[Instruction], dict[str, int]]:
+    """Apply the rules until none of them can shorten the program any further.
+    Returns the optimised instructions and the number of words each rule
+    saved."""
+    report: Counter = Counter()
+    if _jumps_to_numeric_address(instructions):
+        return list(instructions), dict(report)
+
+    changed = True
+    while changed:
+        changed = False
+        for rule in RULES:
+            instructions, saved = rule(instructions)
+            if saved:
+                report[rule.__name__] += saved
+                changed = True
+
+    return instructions, dict(report)
+
+
+def eliminate_push_pop(instructions: list[Instruction]) -> tuple[list[Instruction], int]:
+    """A push of D followed by a pop into D leaves D where it was, so only the
+    store to the top of the stack needs to be kept"""
+    optimized = []
+    saved = 0
+    texts = [_text(instruction) for instruction in instructions]
+    i = 0
+    while i < len(instructions):
+        for pattern in PUSH_POP_PATTERNS:
+            if texts[i:i + len(pattern)] == pattern:
+                # After the pop, A holds the address of the popped slot, which
+                # is where the store leaves it too
+                optimized.extend(instructions[i:i + 3])
+                saved += len(pattern) - 3
+                i += len(pattern)
+                break
+        else:
+            optimized.append(instructions[i])
+            i += 1
+    return optimized, saved
+
+
+def compact_push(instructions: list[Instruction]) -> tuple[list[Instruction], int]:
+    """Push D by incrementing SP first and storing below it, which is a word
+    shorter. This leaves A pointing at the stored value rather than at SP, so
+    it is only done when the next instruction loads A anyway."""
+    optimized = []
+    saved = 0
+    texts = [_text(instruction) for instruction in instructions]
+    i = 0
+    while i < len(instructions):
+        end = i + len(PUSH_D)
+        if (
+            texts[i:end] == PUSH_D
+            and end < len(instructions)
+            and instructions[end].instruction_type == A_INSTRUCTION
+        ):
+            optimized.extend(
+                [
+                    instructions[i],
+                    instructions[i + 1]._replace(dest="AM", comp="M+1"),
+                    instructions[i + 2]._replace(dest="A", comp="A-1"),
+                    instructions[i + 2],
+                ]
+            )
+            saved += 1
+            i = end
+        else:
+            optimized.append(instructions[i])
+            i += 1
+    return optimized, saved
+
+
+def remove_zero_offsets(instructions: list[Instruction]) -> tuple[list[Instruction], int]:
+    """Adding or subtracting @0 from D changes nothing but A, so it can be
+    dropped when the next instruction loads A anyway"""
+    optimized = []
+    saved = 0
+    i = 0
+    while i < len(instructions):
+        if (
+            i + 2 < len(instructions)
+            and _text(instructions[i]) == "@0"
+            and _text(instructions[i + 1]) in ("D=D+A", "D=D-A")
+            and instructions[i + 2].instruction_type == A_INSTRUCTION
+        ):
+            saved += 2
+            i += 2
+        else:
+            optimized.append(instructions[i])
+            i += 1
+    return optimized, saved
+
+
+def fold_small_offsets(instructions: list[Instruction]) -> tuple[list[Instruction], int]:
+    """Reading a segment at offset 0 or 1 doesn't need the offset loaded into
+    D first, as the ALU can add 1 itself; D is overwritten by the read"""
+    optimized = []
+    saved = 0
+    i = 0
+    while i < len(instructions):
+        window = [_text(instruction) for instruction in instructions[i:i + 5]]
+        if (
+            len(window) == 5
+            and window[0] in ("@0", "@1")
+            and window[1] == "D=A"
+            and instructions[i + 2].instruction_type == A_INSTRUCTION
+            and window[3] in ("A=M+D", "A=D+M")
+            and window[4] == "D=M"
+        ):
+            comp = "M" if window[0] == "@0" else "M+1"
+            optimized.extend(
+                [
+                    instructions[i + 2],
+                    instructions[i + 3]._replace(comp=comp),
+                    instructions[i + 4],
+                ]
+            )
+            saved += 2
+            i += 5
+        else:
+            optimized.append(instructions[i])
+            i += 1
+    return optimized, saved
+
+
+def fold_store_and_load(instructions: list[Instruction]) -> tuple[list[Instruction], int]:
+    """M=x followed by A=M loads the value just stored, so it can be written to
+    both registers at once as AM=x"""
+    optimized = []
+    saved = 0
+    i = 0
+    while i < len(instructions):
+        instruction = instructions[i]
+        following = instructions[i + 1] if i + 1 < len(instructions) else None
+        if (
+            _is_c(instruction, dest="M")
+            and following is not None
+            and _is_c(following, dest="A", comp="M")
+        ):
+            optimized.append(instruction._replace(dest="AM"))
+            saved += 1
+            i += 2
+        else:
+            optimized.append(instruction)
+            i += 1
+    return optimized, saved
+
+
+def remove_redundant_a_loads(instructions: list[Instruction]) -> tuple[list[Instruction], int]:
+    """Drop A-instructions which load the value A already holds, and those
+    whose value is replaced by another A-instruction before it is used"""
+    optimized: list[Instruction] = []
+    saved = 0
+    # The symbol A is known to hold, if any
+    a_value: Optional[str] = None
+    for instruction in instructions:
+        if instruction.instruction_type == A_INSTRUCTION:
+            if instruction.symbol == a_value:
+                saved += 1
+                continue
+            if optimized and optimized[-1].instruction_type == A_INSTRUCTION:
+                optimized.pop()
+                saved += 1
+            a_value = instruction.symbol
+        elif instruction.instruction_type == L_INSTRUCTION:
+            a_value = None
+        elif "A" in (instruction.dest or ""):
+            a_value = None
+        optimized.append(instruction)
+    return optimized, saved
+
+
+def remove_jumps_to_next(instructions: list[Instruction]) -> tuple[list[Instruction], int]:
+    """A jump to the label directly after it, whether taken or not, continues
+    at the same instruction. It can be dropped along with the A-instruction
+    that loads its target, provided the code after the label loads A before
+    using it."""
+    optimized = []
+    saved = 0
+    i = 0
+    while i < len(instructions):
+        instruction = instructions[i]
+        following = instructions[i + 1] if i + 1 < len(instructions) else None
+        if (
+            instruction.instruction_type == A_INSTRUCTION
+            and following is not None
+            and following.instruction_type == C_INSTRUCTION
+            and following.dest is None
+            and following.jump is not None
+        ):
+            j = i + 2
+            labels = set()
+            while j < len(instructions) and instructions[j].instruction_type == L_INSTRUCTION:
+                labels.add(instructions[j].symbol)
+                j += 1
+            if instruction.symbol in labels and (
+                j == len(instructions)
+                or instructions[j].instruction_type == A_INSTRUCTION
+            ):
+                saved += 2
+                i += 2
+                continue
+        optimized.append(instruction)
+        i += 1
+    return optimized, saved
+
+
+RULES: list[Callable[[list[Instruction]], tuple[list[Instruction], int]]] = [
+    eliminate_push_pop,
+    fold_store_and_load,
+    remove_jumps_to_next,
+    remove_zero_offsets,
+    fold_small_offsets,
+    remove_redundant_a_loads,
+    compact_push,
+]
+
+
+def format_report(report: dict[str, int], original_size: int) -> str:
+    total = sum(report.values())
+    lines = [
+        f"peephole: saved {total} of {original_size} words"
+        f" ({total / max(original_size, 1):.1%})"
+    ]
+    for rule, saved in sorted(report.items(), key=lambda item: -item[1]):
+        lines.append(f"{saved:>9}  {rule}")
+    return "\n".join(lines)
+
+
+def _jumps_to_numeric_address(instructions: list[Instruction]) -> bool:
+    for instruction, following in zip(instructions, instructions[1:]):
+        if (
+            instruction.instruction_type == A_INSTRUCTION
+            and instruction.symbol.isnumeric()
+            and following.instruction_type == C_INSTRUCTION
+            and following.jump is not None
+        ):
+            return True
+    return False
+
+
+def _is_c(
+    instruction: Instruction, dest: Optional[str] = None, comp: Optional[str] = None
+) -> bool:
+    return (
+        instruction.instruction_type == C_INSTRUCTION
+        and instruction.jump is None
+        and (dest is None or instruction.dest == dest)
+        and (comp is None or instruction.comp == comp)
+    )
+
+
+def _text(instruction: Instruction) -> str:
+    if instruction.instruction_type == A_INSTRUCTION:
+        return f"@{instruction.symbol}"
+    if instruction.instruction_type == L_INSTRUCTION:
+        return f"({instruction.symbol})"
+    text = instruction.comp
+    if instruction.dest:
+        text = f"{instruction.dest}={text}"
+    if instruction.jump:
+        text = f"{text};{instruction.jump}"
+    return text
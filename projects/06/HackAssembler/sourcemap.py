@@ -0,0 +1,105 @@
+"""Source maps and ROM size reports for assembled programs.
+
+A source map records, for every ROM address, the .asm line the instruction
+came from and the most recent (LABEL) before it. It is written as a .map text
+file with one tab-separated line per address:
+
+    address    line    label
+
+The size report groups the ROM by label, to show which routines take up the
+most space.
+"""
+
+from typing import NamedTuple, Optional
+
+# Instructions before the first label are grouped under this name
+NO_LABEL = "(start)"
+
+
+class SourceMapEntry(NamedTuple):
+    address: int
+    line_number: int
+    label: Optional[str]
+
+
+def build(lines: list[int], labels: dict[str, int]) -> list[SourceMapEntry]:
+    """Combine the source line of each ROM word with the labels, in the order
+    they were defined, into one entry per ROM address"""
+    # Several labels can share an address; the last one defined encloses it
+    starts = {address: label for label, address in labels.items()}
+
+    entries = []
+    label = None
+    for address, line_number in enumerate(lines):
+        label = starts.get(address, label)
+        entries.append(SourceMapEntry(address, line_number, label))
+    return entries
+
+
+def write(path: str, entries: list[SourceMapEntry]) -> None:
+    with open(path, "w") as f:
+        f.writelines(
+            f"{entry.address}\t{entry.line_number}\t{entry.label or ''}\n"
+            for entry in entries
+        )
+
+
+def read(path: str) -> list[SourceMapEntry]:
+    entries = []
+    with open(path) as f:
+        for line in f:
+            address, line_number, label = line.rstrip("\n").split("\t")
+            entries.append(
+                SourceMapEntry(int(address), int(line_number), label or None)
+            )
+    return entries
+
+
+def function_name(label: str) -> Optional[str]:
+    """Return the VM function a label belongs to, or None if it isn't part of
+    one. VM functions are labelled Class.function and labels within them are
+    written Class.function$label."""
+    function = label.split("$", 1)[0]
+    return function if "." in function else None
+
+
+def size_report(
+    labels: dict[str, int], rom_size: int, by_function: bool = False
+) -> list[tuple[str, int]]:
+    """Count the ROM words following each label, up to the next label, and
+    return the counts largest first.
+
+    With by_function, only labels which start a VM function begin a new group,
+    so that the return addresses, branches and other labels inside a function
+    are counted towards it."""
+    # Sorting is stable, so labels sharing an address stay in the order they
+    # were defined and the last one defined takes the words
+    starts = sorted(
+        (
+            (address, label) for label, address in labels.items()
+            if not by_function or label == function_name(label)
+        ),
+        key=lambda start: start[0],
+    )
+
+    sizes: dict[str, int] = {}
+    group = NO_LABEL
+    group_start = 0
+    for address, label in starts:
+        sizes[group] = sizes.get(group, 0) + address - group_start
+        group = label
+        group_start = address
+    sizes[group] = sizes.get(group, 0) + rom_size - group_start
+
+    return sorted(
+        ((group, size) for group, size in sizes.items() if size),
+        key=lambda group_size: (-group_size[1], group_size[0]),
+    )
+
+
+def format_size_report(report: list[tuple[str, int]], rom_size: int) -> str:
+    lines = [f"{'words':>7} {'%':>6}  label"]
+    for label, size in report:
+        lines.append(f"{size:>7} {size / rom_size:>6.1%}  {label}")
+    lines.append(f"{rom_size:>7} {'':>6}  total")
+    return "\n".join(lines)
@@ -0,0 +1,67 @@
+from array import array
+from io import StringIO
+
+import pytest
+
+from HackAssembler.assembler import assemble
+
+SOURCE = """// Count down from R0
+(LOOP)
+@R0
+M=M-1
+D=M
+@LOOP
+D;JGT
+@count
+M=D
+"""
+
+EXPECTED_ROM = array(
+    "H",
+    [
+        0b0000000000000000,
+        0b1111110010001000,
+        0b1111110000010000,
+        0b0000000000000000,
+        0b1110001100000001,
+        0b0000000000010000,
+        0b1110001100001000,
+    ]
+)
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        SOURCE,
+        SOURCE.splitlines(keepends=True),
+        StringIO(SOURCE),
+    ]
+)
+def test_assemble_sources(source):
+    """Strings, iterables of lines and file objects all assemble the same"""
+    rom, symbol_table = assemble(source)
+
+    assert rom == EXPECTED_ROM
+    assert symbol_table["LOOP"] == "0"
+    assert symbol_table["count"] == "16"
+    assert symbol_table["SCREEN"] == "16384"
+
+
+def test_assemble_source_map():
+    source_map = []
+    rom, _ = assemble(SOURCE, source_map=source_map)
+
+    assert len(source_map) == len(rom)
+    assert source_map == [3, 4, 5, 6, 7, 8, 9]
+
+
+def test_assemble_provided_symbol_table():
+    """A provided symbol table replaces the predefined symbols and is updated
+    in place"""
+    symbol_table = {"R0": "5"}
+    rom, returned_table = assemble(SOURCE, symbol_table)
+
+    assert returned_table is symbol_table
+    assert rom[0] == 5
+    assert symbol_table == {"R0": "5", "LOOP": "0", "count": "16"}
@@ -0,0 +1,30 @@
+from HackAssembler import asmparser
+from HackAssembler.assembler import assemble
+from HackAssembler.benchmark import generate_program
+
+
+def test_generate_program(tmp_path):
+    """Generated programs have the requested size and assemble even when they
+    are larger than the ROM"""
+    path = tmp_path / "synthetic.asm"
+    generate_program(str(path), 50_000, label_density=0.05, comment_ratio=0.1)
+
+    with open(path) as f:
+        assert sum(1 for _ in f) == 50_000
+    with open(path) as f:
+        rom, symbol_table = assemble(f)
+
+    assert len(rom) > 32768
+    assert "L0" in symbol_table
+    assert "v0" in symbol_table
+
+
+def test_generate_symbol_free_program(tmp_path):
+    path = tmp_path / "synthetic.asm"
+    generate_program(str(path), 1000, label_density=0, num_variables=0)
+
+    with open(path) as f:
+        for instruction in asmparser.parse(f):
+            assert instruction.instruction_type != asmparser.InstructionTypeEnum.L_INSTRUCTION
+            if instruction.instruction_type == asmparser.InstructionTypeEnum.A_INSTRUCTION:
+                assert instruction.symbol.isnumeric()
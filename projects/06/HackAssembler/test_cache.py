@@ -0,0 +1,73 @@
+import os
+
+from . import cache
+from . import main
+
+
+def test_key_depends_on_source_and_format(tmp_path):
+    assembly_cache = cache.AssemblyCache(str(tmp_path / "cache"))
+
+    key = assembly_cache.key(b"@0\n", "hack")
+    assert key == assembly_cache.key(b"@0\n", "hack")
+    assert key != assembly_cache.key(b"@1\n", "hack")
+    assert key != assembly_cache.key(b"@0\n", "bin")
+
+
+def test_store_fetch_load(tmp_path):
+    assembly_cache = cache.AssemblyCache(str(tmp_path / "cache"))
+    output_path = tmp_path / "Prog.hack"
+    output_path.write_text("0000000000000000\n")
+
+    key = assembly_cache.key(b"@0\n", "hack")
+    assert not assembly_cache.fetch(key, str(tmp_path / "Copy.hack"))
+    assert assembly_cache.load(key) is None
+
+    source_map = {"lines": [1], "labels": {"LOOP": 0}}
+    assembly_cache.store(key, str(output_path), {"LOOP": "0"}, source_map)
+
+    assert assembly_cache.fetch(key, str(tmp_path / "Copy.hack"))
+    assert (tmp_path / "Copy.hack").read_text() == "0000000000000000\n"
+    assert assembly_cache.load(key) == ({"LOOP": "0"}, source_map)
+
+
+def test_evict_least_recently_used(tmp_path):
+    output_path = tmp_path / "Prog.hack"
+    output_path.write_text("0" * 1000)
+    assembly_cache = cache.AssemblyCache(str(tmp_path / "cache"), max_size=10_000)
+
+    keys = [assembly_cache.key(bytes([index]), "hack") for index in range(3)]
+    for age, key in enumerate(keys):
+        assembly_cache.store(key, str(output_path), {}, {})
+        entry = os.path.join(assembly_cache.directory, key)
+        os.utime(entry, (age, age))
+
+    # Using the oldest entry makes it the most recently used
+    assert assembly_cache.fetch(keys[0], str(tmp_path / "Copy.hack"))
+
+    assembly_cache.max_size = 2500
+    assembly_cache.evict()
+
+    remaining = set(os.listdir(assembly_cache.directory))
+    assert remaining == {keys[0], keys[2]}
+
+
+def test_main_uses_cache(tmp_path):
+    """A second run copies the cached output instead of assembling"""
+    cache_dir = str(tmp_path / "cache")
+    asm_path = tmp_path / "Prog.asm"
+    asm_path.write_text("(LOOP)\n@LOOP\n0;JMP\n")
+    hack_path = tmp_path / "Prog.hack"
+
+    main.main(str(asm_path), cache_dir=cache_dir)
+    expected = hack_path.read_text()
+    assert expected == "0000000000000000\n1110101010000111\n"
+
+    hack_path.write_text("stale\n")
+    main.main(str(asm_path), cache_dir=cache_dir)
+    assert hack_path.read_text() == expected
+
+    assembly_cache = cache.AssemblyCache(cache_dir)
+    key = assembly_cache.key(asm_path.read_bytes(), "hack")
+    symbol_table, source_map = assembly_cache.load(key)
+    assert symbol_table["LOOP"] == "0"
+    assert source_map == {"lines": [2, 3], "labels": {"LOOP": 0}}
@@ -5,6 +5,8 @@ from HackAssemblerBasic.code import comp
 from HackAssemblerBasic.code import dest
 from HackAssemblerBasic.code import jump
 
+from . import code
+
 @pytest.mark.parametrize(
     "mnemonic,binary_code", [
         ("0", "0101010"),
@@ -79,3 +81,45 @@ def test_dest(mnemonic: str, binary_code: str):
 )
 def test_jump(mnemonic: str, binary_code: str):
     assert binary_code == jump(mnemonic)
+
+
+@pytest.mark.parametrize(
+    "mnemonic,binary_code",
+    [
+        ("MD", "011"),
+        ("DM", "011"),
+        ("AM", "101"),
+        ("MA", "101"),
+        ("AMD", "111"),
+        ("ADM", "111"),
+        ("MDA", "111"),
+    ]
+)
+def test_dest_permutations(mnemonic: str, binary_code: str):
+    """Any ordering of the destination registers is accepted"""
+    assert binary_code == code.dest(mnemonic)
+
+
+@pytest.mark.parametrize(
+    "dest_mnemonic,comp_mnemonic,jump_mnemonic,word",
+    [
+        ("D", "A", None, 0b1110110000010000),
+        ("AM", "M-1", None, 0b1111110010101000),
+        ("MA", "M-1", None, 0b1111110010101000),
+        (None, "0", "JMP", 0b1110101010000111),
+        (None, "D", "JNE", 0b1110001100000101),
+        ("AMD", "D|M", "JLE", 0b1111010101111110),
+        ("M", "M+D", None, 0b1111000010001000),
+        ("D", "A&D", None, 0b1110000000010000),
+    ]
+)
+def test_c_instruction(
+    dest_mnemonic: str, comp_mnemonic: str, jump_mnemonic: str, word: int
+):
+    """c_instruction returns the whole 16-bit word from the lookup table"""
+    assert word == code.c_instruction(dest_mnemonic, comp_mnemonic, jump_mnemonic)
+
+
+def test_c_instruction_invalid():
+    with pytest.raises(ValueError):
+        code.c_instruction("D", "D+D", None)
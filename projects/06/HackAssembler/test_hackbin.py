@@ -0,0 +1,57 @@
+from array import array
+
+import pytest
+
+from . import hackbin
+
+WORDS = [0b0000000000010000, 0b1110111111001000, 0b1110101010000111, 24576]
+SYMBOL_TABLE = {"LOOP": "2", "i": "16", "KBD": "24576"}
+
+
+def test_write_read_round_trip(tmp_path):
+    path = str(tmp_path / "Prog.hackbin")
+    hackbin.write(path, WORDS, SYMBOL_TABLE)
+
+    rom, symbol_table = hackbin.read(path)
+    assert rom == array("H", WORDS)
+    assert symbol_table == SYMBOL_TABLE
+
+
+def test_write_without_symbol_table(tmp_path):
+    path = str(tmp_path / "Prog.hackbin")
+    hackbin.write(path, WORDS)
+
+    rom, symbol_table = hackbin.read(path)
+    assert rom == array("H", WORDS)
+    assert symbol_table is None
+
+
+def test_rom_image_is_memory_mapped(tmp_path):
+    path = str(tmp_path / "Prog.hackbin")
+    hackbin.write(path, WORDS, SYMBOL_TABLE)
+
+    with hackbin.RomImage(path) as image:
+        assert image.words.format == "H"
+        assert image.words.tolist() == WORDS
+        assert image.symbol_table == SYMBOL_TABLE
+
+
+def test_hack_conversions(tmp_path):
+    hack_text = "".join(f"{word:016b}\n" for word in WORDS)
+    (tmp_path / "Prog.hack").write_text(hack_text)
+
+    hackbin.hack_to_hackbin(
+        str(tmp_path / "Prog.hack"), str(tmp_path / "Prog.hackbin")
+    )
+    hackbin.hackbin_to_hack(
+        str(tmp_path / "Prog.hackbin"), str(tmp_path / "Copy.hack")
+    )
+    assert (tmp_path / "Copy.hack").read_text() == hack_text
+
+
+def test_read_rejects_other_files(tmp_path):
+    path = tmp_path / "Prog.hack"
+    path.write_text("0000000000000000\n")
+
+    with pytest.raises(ValueError):
+        hackbin.read(str(path))
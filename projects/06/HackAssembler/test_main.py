@@ -1,25 +1,106 @@
 from . import main
 
-def test_first_pass():
+ASSEMBLY = [
+    "// Load 0\n",
+    "@0\n",
+    "D=A\n",
+    "(LOOP)\n",
+    "@1\n",
+    "D=D+A\n"
+    "@LOOP\n",
+    "0;JMP\n",
+    "(END)\n",
+    "@END\n",
+    "0;JMP\n",
+]
+
+
+def test_assemble_symbol_table():
+    with open("test.asm", mode="w") as f:
+        f.writelines(ASSEMBLY)
+
+    symbol_table = {}
+    main.assemble("test.asm", symbol_table)
+    assert symbol_table == {
+        "END": "6",
+        "LOOP": "2",
+    }
+
+
+def test_assemble_forward_references():
+    """Labels used before they are defined are patched once the label is
+    reached, and undefined symbols become variables in order of first use"""
     assembly = [
-        "// Load 0\n",
-        "@0\n",
-        "D=A\n",
-        "(LOOP)\n",
-        "@1\n",
-        "D=D+A\n"
-        "@LOOP\n",
+        "// Jump forwards\n",
+        "@i\n",
+        "M=1\n",
+        "@END\n",
         "0;JMP\n",
+        "@j\n",
+        "M=0\n",
+        "@i\n",
+        "M=0\n",
         "(END)\n",
         "@END\n",
         "0;JMP\n",
     ]
-
     with open("test.asm", mode="w") as f:
         f.writelines(assembly)
 
-    symbol_table = main.first_pass("test.asm", {})
-    assert symbol_table == {
-        "END": "6",
-        "LOOP": "2",
-    }
+    symbol_table = dict(main.PREDEFINED_SYMBOLS)
+    words = main.assemble("test.asm", symbol_table)
+
+    assert symbol_table["END"] == "8"
+    assert symbol_table["i"] == "16"
+    assert symbol_table["j"] == "17"
+    assert words.tolist() == [
+        0b0000000000010000,
+        0b1110111111001000,
+        0b0000000000001000,
+        0b1110101010000111,
+        0b0000000000010001,
+        0b1110101010001000,
+        0b0000000000010000,
+        0b1110101010001000,
+        0b0000000000001000,
+        0b1110101010000111,
+    ]
+
+
+def test_collect_paths(tmp_path):
+    """Directories are searched recursively and globs are expanded, without
+    listing any file twice"""
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "b").mkdir()
+    for name in ["a/One.asm", "a/b/Two.asm", "a/b/Two.hack", "Three.asm"]:
+        (tmp_path / name).write_text("@0\n")
+
+    paths = main.collect_paths(
+        [str(tmp_path / "a"), str(tmp_path / "*.asm"), str(tmp_path / "a/One.asm")]
+    )
+    assert paths == [
+        str(tmp_path / "a" / "One.asm"),
+        str(tmp_path / "a" / "b" / "Two.asm"),
+        str(tmp_path / "Three.asm"),
+    ]
+
+
+def test_assemble_all(tmp_path, capsys):
+    """Files are assembled by a pool of workers, and failures are counted
+    rather than stopping the run"""
+    paths = []
+    for index in range(3):
+        path = tmp_path / f"Prog{index}.asm"
+        path.write_text(f"@{index}\nD=A\n")
+        paths.append(str(path))
+    bad_path = tmp_path / "Bad.asm"
+    bad_path.write_text("D=D+D\n")
+    paths.append(str(bad_path))
+
+    failures = main.assemble_all(paths, workers=2)
+
+    assert failures == 1
+    assert (tmp_path / "Prog2.hack").read_text() == (
+        "0000000000000010\n1110110000010000\n"
+    )
+    assert "FAIL" in capsys.readouterr().out
@@ -1,6 +1,8 @@
 
 from HackAssemblerBasic.asmparser import InstructionTypeEnum, Parser
 
+from . import asmparser
+
 def test_parser_flow():
     """Use the parser to load the file and go through all the lines"""
 
@@ -69,3 +71,57 @@ def test_parser_flow():
     assert parser.dest == None
     assert parser.comp == "0"
     assert parser.jump == "JMP"
+
+
+def test_parse_records():
+    """parse() yields one record per instruction, keeping the source line"""
+    assembly = "@1\n// comment\n\n(LOOP)\nD=D+A // add\nAM=M-1;JNE\n  0 ; JMP\n"
+
+    assert list(asmparser.parse(assembly)) == [
+        (asmparser.InstructionTypeEnum.A_INSTRUCTION, "1", None, None, None, 1),
+        (asmparser.InstructionTypeEnum.L_INSTRUCTION, "LOOP", None, None, None, 4),
+        (asmparser.InstructionTypeEnum.C_INSTRUCTION, None, "D", "D+A", None, 5),
+        (asmparser.InstructionTypeEnum.C_INSTRUCTION, None, "AM", "M-1", "JNE", 6),
+        (asmparser.InstructionTypeEnum.C_INSTRUCTION, None, None, "0", "JMP", 7),
+    ]
+
+
+def test_parse_long_comment_runs():
+    """Long runs of blank and comment lines are skipped without recursion"""
+    assembly = "// header\n" * 5000 + "\n" * 5000 + "@2\n" + "\n" * 5000
+
+    instructions = list(asmparser.parse(assembly))
+    assert len(instructions) == 1
+    assert instructions[0].symbol == "2"
+    assert instructions[0].line_number == 10001
+
+
+def test_parser_wrapper(tmp_path):
+    """Parser steps through the same records, including an instruction on the
+    first line and nothing after trailing blank lines"""
+    path = tmp_path / "test.asm"
+    path.write_text("@1\nD=A\n\n// end\n\n")
+
+    parser = asmparser.Parser(str(path))
+    parser.advance()
+    assert parser.instruction_type == asmparser.InstructionTypeEnum.A_INSTRUCTION
+    assert parser.symbol == "1"
+    assert parser.line_number == 1
+    assert parser.has_more_lines
+
+    parser.advance()
+    assert parser.instruction_type == asmparser.InstructionTypeEnum.C_INSTRUCTION
+    assert parser.dest == "D"
+    assert parser.comp == "A"
+    assert not parser.has_more_lines
+
+
+def test_parser_closes_file_when_stopped_early(tmp_path):
+    path = tmp_path / "test.asm"
+    path.write_text("@1\nD=A\n@2\n")
+
+    with asmparser.Parser(str(path)) as parser:
+        parser.advance()
+        assert parser.has_more_lines
+
+    assert parser._file.closed
@@ -0,0 +1,131 @@
+from HackAssembler import asmparser, peephole
+from HackAssembler.peephole import _text
+
+
+def _optimize(source: str, rule=None):
+    instructions = list(asmparser.parse(source))
+    if rule is None:
+        optimized, report = peephole.optimize(instructions)
+    else:
+        optimized, saved = rule(instructions)
+        report = {rule.__name__: saved}
+    return [_text(instruction) for instruction in optimized], report
+
+
+def test_eliminate_push_pop():
+    source = "@SP\nA=M\nM=D\n@SP\nM=M+1\n@SP\nM=M-1\nA=M\nD=M\n@R13\nM=D\n"
+
+    optimized, report = _optimize(source, peephole.eliminate_push_pop)
+
+    assert optimized == ["@SP", "A=M", "M=D", "@R13", "M=D"]
+    assert report == {"eliminate_push_pop": 6}
+
+
+def test_fold_store_and_load():
+    optimized, _ = _optimize("@SP\nM=M-1\nA=M\nD=M\n", peephole.fold_store_and_load)
+
+    assert optimized == ["@SP", "AM=M-1", "D=M"]
+
+
+def test_fold_store_and_load_keeps_jumps():
+    optimized, _ = _optimize("@SP\nM=M-1;JMP\nA=M\n", peephole.fold_store_and_load)
+
+    assert optimized == ["@SP", "M=M-1;JMP", "A=M"]
+
+
+def test_remove_jumps_to_next():
+    source = "D=M\n@SKIP\nD;JEQ\n(SKIP)\n@R0\nM=D\n"
+
+    optimized, _ = _optimize(source, peephole.remove_jumps_to_next)
+
+    assert optimized == ["D=M", "(SKIP)", "@R0", "M=D"]
+
+
+def test_remove_jumps_to_next_needs_a_load():
+    # The code after the label uses A, which the jump set to SKIP
+    source = "@SKIP\n0;JMP\n(SKIP)\nD=A\n"
+
+    optimized, _ = _optimize(source, peephole.remove_jumps_to_next)
+
+    assert optimized == ["@SKIP", "0;JMP", "(SKIP)", "D=A"]
+
+
+def test_remove_zero_offsets():
+    optimized, _ = _optimize("@LCL\nD=M\n@0\nD=D+A\n@R13\nM=D\n", peephole.remove_zero_offsets)
+
+    assert optimized == ["@LCL", "D=M", "@R13", "M=D"]
+
+
+def test_fold_small_offsets():
+    source = "@0\nD=A\n@LCL\nA=M+D\nD=M\n@1\nD=A\n@ARG\nA=D+M\nD=M\n"
+
+    optimized, _ = _optimize(source, peephole.fold_small_offsets)
+
+    assert optimized == ["@LCL", "A=M", "D=M", "@ARG", "A=M+1", "D=M"]
+
+
+def test_remove_redundant_a_loads():
+    source = "@R0\nD=M\n@R0\nM=D+1\n@R1\n@R2\nM=0\n(LOOP)\n@R2\nA=M\n@R2\n"
+
+    optimized, report = _optimize(source, peephole.remove_redundant_a_loads)
+
+    assert optimized == ["@R0", "D=M", "M=D+1", "@R2", "M=0", "(LOOP)", "@R2", "A=M", "@R2"]
+    assert report == {"remove_redundant_a_loads": 2}
+
+
+def test_compact_push():
+    optimized, _ = _optimize("@SP\nA=M\nM=D\n@SP\nM=M+1\n@LCL\n", peephole.compact_push)
+
+    assert optimized == ["@SP", "AM=M+1", "A=A-1", "M=D", "@LCL"]
+
+
+def test_compact_push_needs_a_load():
+    # The C-instruction after the push relies on A holding SP
+    source = "@SP\nA=M\nM=D\n@SP\nM=M+1\nD=M\n"
+
+    optimized, _ = _optimize(source, peephole.compact_push)
+
+    assert optimized == ["@SP", "A=M", "M=D", "@SP", "M=M+1", "D=M"]
+
+
+def test_optimize_push_pop():
+    # push constant 7, pop temp 0
+    source = (
+        "@7\nD=A\n@SP\nA=M\nM=D\n@SP\nM=M+1\n"
+        "@SP\nM=M-1\nA=M\nD=M\n@5\nM=D\n"
+    )
+
+    optimized, report = _optimize(source)
+
+    # The value is still stored above the stack, as the original code left it
+    assert optimized == ["@7", "D=A", "@SP", "A=M", "M=D", "@5", "M=D"]
+    assert report == {"eliminate_push_pop": 6}
+
+
+def test_optimize_keeps_needed_a_loads():
+    # Folding the pop leaves A pointing into the stack, so SP must be reloaded
+    source = "@SP\nM=M-1\nA=M\nD=M\n@SP\nA=M\nM=D\n@R0\n"
+
+    optimized, report = _optimize(source)
+
+    assert optimized == ["@SP", "AM=M-1", "D=M", "@SP", "A=M", "M=D", "@R0"]
+    assert report == {"fold_store_and_load": 1}
+
+
+def test_optimize_skips_numeric_jumps():
+    source = "@SP\nM=M-1\nA=M\n@12\n0;JMP\n"
+
+    optimized, report = _optimize(source)
+
+    assert optimized == ["@SP", "M=M-1", "A=M", "@12", "0;JMP"]
+    assert report == {}
+
+
+def test_format_report():
+    report = peephole.format_report({"compact_push": 2, "eliminate_push_pop": 6}, 80)
+
+    assert report.splitlines() == [
+        "peephole: saved 8 of 80 words (10.0%)",
+        "        6  eliminate_push_pop",
+        "        2  compact_push",
+    ]
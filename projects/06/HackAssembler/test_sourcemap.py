@@ -0,0 +1,80 @@
+from HackAssembler import sourcemap
+from HackAssembler.assembler import assemble
+from HackAssembler.sourcemap import SourceMapEntry
+
+SOURCE = """// Calls Foo.bar twice
+@Foo.bar
+0;JMP
+(Foo.bar)
+@R0
+M=M+1
+(Foo.bar$ret.0)
+@R1
+M=M+1
+@R2
+M=M+1
+(END)
+@END
+0;JMP
+"""
+
+
+def _assemble_with_map():
+    lines = []
+    labels = {}
+    rom, _ = assemble(SOURCE, source_map=lines, labels=labels)
+    return rom, lines, labels
+
+
+def test_build():
+    _, lines, labels = _assemble_with_map()
+
+    assert sourcemap.build(lines, labels) == [
+        SourceMapEntry(0, 2, None),
+        SourceMapEntry(1, 3, None),
+        SourceMapEntry(2, 5, "Foo.bar"),
+        SourceMapEntry(3, 6, "Foo.bar"),
+        SourceMapEntry(4, 8, "Foo.bar$ret.0"),
+        SourceMapEntry(5, 9, "Foo.bar$ret.0"),
+        SourceMapEntry(6, 10, "Foo.bar$ret.0"),
+        SourceMapEntry(7, 11, "Foo.bar$ret.0"),
+        SourceMapEntry(8, 13, "END"),
+        SourceMapEntry(9, 14, "END"),
+    ]
+
+
+def test_write_read(tmp_path):
+    _, lines, labels = _assemble_with_map()
+    entries = sourcemap.build(lines, labels)
+
+    path = str(tmp_path / "Prog.map")
+    sourcemap.write(path, entries)
+    assert sourcemap.read(path) == entries
+
+
+def test_size_report_by_label():
+    rom, _, labels = _assemble_with_map()
+
+    assert sourcemap.size_report(labels, len(rom)) == [
+        ("Foo.bar$ret.0", 4),
+        ("(start)", 2),
+        ("END", 2),
+        ("Foo.bar", 2),
+    ]
+
+
+def test_size_report_by_function():
+    """Labels inside a function count towards it; END isn't a VM function so
+    it counts towards Foo.bar too"""
+    rom, _, labels = _assemble_with_map()
+
+    assert sourcemap.size_report(labels, len(rom), by_function=True) == [
+        ("Foo.bar", 8),
+        ("(start)", 2),
+    ]
+
+
+def test_size_report_shared_address():
+    """When labels share an address the last one defined takes the words"""
+    labels = {"A": 0, "B": 0, "C": 3}
+    assert sourcemap.size_report(labels, 5) == [("B", 3), ("C", 2)]
@@ -0,0 +1,253 @@
+"""Compares the size and speed of the code the translator writes with each of
+its options, run from projects/08/VMTranslator/src, e.g.,
+
+    python benchmark.py ../../FunctionCalls/FibonacciElement ../../../11/Pong
+
+Each program directory is translated into a temporary directory once for
+each configuration, assembled with projects/06's HackAssembler to count its
+ROM words and the symbols it defines, i.e., its labels and variables, and run
+with its CPUEmulator to count the cycles it takes to reach a halt loop, such
+as Sys.init's in the FunctionCalls tests or Sys.halt's. Programs without a
+Sys.init, such as those of projects/07, which don't halt within --cycles, or
+which don't fit in ROM, are reported by size alone.
+
+The cycles per VM command are the cycles divided by the number of VM commands
+the program runs, which is counted once by labelling the code of each command
+of the first configuration which halts and writes each command on its own,
+i.e., without fused patterns, and profiling it. Until then they're left out.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+from array import array
+from typing import Callable, Optional
+
+import callgraph
+import codewriter
+import main
+import vmparser
+
+PROJECTS_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+sys.path.insert(0, os.path.join(PROJECTS_DIR, "06"))
+
+from CPUEmulator.cpu import CPU, ROM_SIZE  # noqa: E402
+from CPUEmulator.profiler import ProfilingCPU  # noqa: E402
+from CPUEmulator.state import capture, restore  # noqa: E402
+from HackAssembler import assembler  # noqa: E402
+from HackAssembler.assembler import PREDEFINED_SYMBOLS  # noqa: E402
+
+# The keyword arguments of main for each configuration, the first of which
+# the others are compared with
+CONFIGURATIONS = {
+    "inline": {},
+    "shared calls": {"shared_calls": True},
+    "shared compares": {"shared_comparisons": True},
+    "shared both": {"shared_calls": True, "shared_comparisons": True},
+    "stack caching": {"stack_caching": True},
+    "fused": {"fused_patterns": True},
+    "fused caching": {"stack_caching": True, "fused_patterns": True},
+    "dead functions": {"eliminate_dead_functions": True},
+    "all": {
+        "shared_calls": True,
+        "shared_comparisons": True,
+        "stack_caching": True,
+        "fused_patterns": True,
+        "eliminate_dead_functions": True,
+    },
+}
+DEFAULT_PROGRAMS = [
+    os.path.join(PROJECTS_DIR, "07", "StackArithmetic", name)
+    for name in ["SimpleAdd", "StackTest"]
+] + [
+    os.path.join(PROJECTS_DIR, "08", "FunctionCalls", name)
+    for name in ["FibonacciElement", "NestedCall", "StaticsTest"]
+] + [os.path.join(PROJECTS_DIR, "11", "Pong")]
+DEFAULT_CYCLES = 50_000_000
+
+# 0;JMP
+JUMP = 0b1110101010000111
+# Cycles are counted this many at a time until the program halts
+CHUNK = 1000
+
+
+def halt_loops(rom, labels: dict[str, int]) -> set[int]:
+    """The addresses of the (L) @L 0;JMP loops which programs halt in"""
+    return {
+        address
+        for address in labels.values()
+        if address + 1 < len(rom) and rom[address] == address and rom[address + 1] == JUMP
+    }
+
+
+def cycles_to_halt(rom, labels: dict[str, int], limit: int) -> Optional[int]:
+    """The cycles the program takes to first reach a halt loop, or None if it
+    doesn't within limit"""
+    halts = halt_loops(rom, labels)
+    halts |= {address + 1 for address in halts}
+    cpu = CPU(rom)
+    while cpu.time < limit:
+        saved = capture(cpu)
+        cpu.run(CHUNK)
+        if cpu.pc in halts:
+            restore(cpu, saved)
+            while cpu.pc not in halts:
+                cpu.step()
+            return cpu.time
+    return None
+
+
+def _labelled(write: Callable) -> Callable:
+    def labelled(self, *args, **kwargs):
+        self.destination.write(f"($VM_{self.commands})\n")
+        self.commands += 1
+        return write(self, *args, **kwargs)
+    return labelled
+
+
+class CountingWriter(codewriter.CodeWriter):
+    """Labels the code of each VM command it writes as $VM_n, which doesn't
+    change the code, so that the commands a program runs can be counted"""
+
+    def __init__(self, path: str, **options) -> None:
+        self.commands = 0
+        super().__init__(path, **options)
+
+    write_arithmetic = _labelled(codewriter.CodeWriter.write_arithmetic)
+    write_push_pop = _labelled(codewriter.CodeWriter.write_push_pop)
+    write_label = _labelled(codewriter.CodeWriter.write_label)
+    write_goto = _labelled(codewriter.CodeWriter.write_goto)
+    write_if = _labelled(codewriter.CodeWriter.write_if)
+    write_function = _labelled(codewriter.CodeWriter.write_function)
+    write_call = _labelled(codewriter.CodeWriter.write_call)
+    write_return = _labelled(codewriter.CodeWriter.write_return)
+
+
+def _copy_program(directory: str, temporary: str) -> str:
+    program = os.path.join(temporary, os.path.basename(os.path.normpath(directory)))
+    os.mkdir(program)
+    for file in os.listdir(directory):
+        if file.endswith(".vm"):
+            shutil.copy(os.path.join(directory, file), program)
+    return program
+
+
+def _assemble(program: str) -> tuple[array, dict[str, str], dict[str, int]]:
+    labels: dict[str, int] = {}
+    with open(f"{program}/{os.path.basename(program)}.asm") as f:
+        rom, symbol_table = assembler.assemble(f, labels=labels)
+    return rom, symbol_table, labels
+
+
+def commands_run(directory: str, cycles: int, options: dict) -> int:
+    """The number of VM commands the program runs in cycles, as translated
+    with the options, which mustn't fuse patterns"""
+    options = dict(options)
+    eliminate_dead_functions = options.pop("eliminate_dead_functions", False)
+    with tempfile.TemporaryDirectory() as temporary:
+        program = _copy_program(directory, temporary)
+        writer = CountingWriter(f"{program}/{os.path.basename(program)}.asm", **options)
+        files = {
+            file.removesuffix(".vm"): main.read_commands(vmparser.VMParser(f"{program}/{file}"))
+            for file in os.listdir(program)
+            if file.endswith(".vm")
+        }
+        if eliminate_dead_functions:
+            files, _ = callgraph.remove_dead_functions(files)
+        for name, commands in files.items():
+            if commands:
+                writer.set_file_name(name)
+                main.write_commands(commands, writer)
+        writer.close()
+        rom, _, labels = _assemble(program)
+
+    cpu = ProfilingCPU(rom)
+    cpu.run(cycles)
+    # Commands which write no code, such as labels, share their address with
+    # the next, and both are run
+    return sum(
+        cpu.counts[address] for label, address in labels.items() if label.startswith("$VM_")
+    )
+
+
+def measure(directory: str, options: dict, limit: int) -> dict[str, Optional[int]]:
+    """Translate the .vm files of directory with the options, returning the
+    program's ROM words, symbols and cycles to halt"""
+    with tempfile.TemporaryDirectory() as temporary:
+        program = _copy_program(directory, temporary)
+        # Leaving out the report of the dead functions removed
+        with contextlib.redirect_stdout(io.StringIO()):
+            main.main(program, **options)
+        rom, symbol_table, labels = _assemble(program)
+
+    cycles = None
+    if "Sys.init" in labels and len(rom) <= ROM_SIZE:
+        cycles = cycles_to_halt(rom, labels, limit)
+    return {
+        "rom": len(rom),
+        "symbols": len(symbol_table) - len(PREDEFINED_SYMBOLS),
+        "cycles": cycles,
+    }
+
+
+def _change(value: Optional[int], baseline: Optional[int]) -> str:
+    if value is None or not baseline:
+        return ""
+    return f"{(value - baseline) / baseline:+.1%}"
+
+
+def run(programs: list[str], limit: int = DEFAULT_CYCLES) -> None:
+    print(
+        f"{'program':<18} {'configuration':<16} {'ROM words':>10} {'':>7}"
+        f" {'symbols':>8} {'':>7} {'cycles':>12} {'':>7} {'cycles/command':>14}"
+    )
+    for directory in programs:
+        name = os.path.basename(os.path.normpath(directory))
+        baseline = None
+        commands = None
+        for configuration, options in CONFIGURATIONS.items():
+            result = measure(directory, options, limit)
+            changes = {key: "" for key in result}
+            if baseline is None:
+                baseline = result
+            else:
+                changes = {key: _change(result[key], baseline[key]) for key in result}
+            if (
+                commands is None
+                and result["cycles"] is not None
+                and not options.get("fused_patterns")
+            ):
+                commands = commands_run(directory, result["cycles"], options)
+            cycles = per_command = "-"
+            if result["cycles"] is not None:
+                cycles = result["cycles"]
+                if commands is not None:
+                    per_command = f"{result['cycles'] / commands:.2f}"
+            print(
+                f"{name:<18} {configuration:<16} {result['rom']:>10} {changes['rom']:>7}"
+                f" {result['symbols']:>8} {changes['symbols']:>7}"
+                f" {cycles:>12} {changes['cycles']:>7} {per_command:>14}"
+            )
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Compare the code the translator writes with each of its options"
+    )
+    argparser.add_argument(
+        "programs", type=str, nargs="*", default=DEFAULT_PROGRAMS,
+        help="directories of .vm files"
+    )
+    argparser.add_argument(
+        "--cycles", type=int, default=DEFAULT_CYCLES,
+        help="the most cycles to run each program for"
+    )
+
+    args = argparser.parse_args()
+    run(args.programs, args.cycles)
@@ -0,0 +1,77 @@
+"""Finds the functions of a program which can be reached from Sys.init by
+following its call commands, so that the rest, such as the parts of the OS
+the program doesn't use, can be left out of its code.
+
+Each file's commands are (command_type, arg1, arg2) tuples, as main reads
+them. A function's commands run from its function command to the next.
+"""
+
+from typing import Optional
+
+ROOT = "Sys.init"
+
+
+def split_functions(commands: list[tuple]) -> list[tuple[Optional[str], list[tuple]]]:
+    """Split the commands of a file into (name, commands) pairs for each of
+    its functions, after the commands before the first function, if any,
+    whose name is None"""
+    functions = []
+    name, body = None, []
+    for command in commands:
+        if command[0].name == "C_FUNCTION":
+            if name is not None or body:
+                functions.append((name, body))
+            name, body = command[1], []
+        body.append(command)
+    if name is not None or body:
+        functions.append((name, body))
+    return functions
+
+
+def call_graph(files: dict[str, list[tuple]]) -> dict[str, set[str]]:
+    """The functions each function of the program calls"""
+    graph = {}
+    for commands in files.values():
+        for name, body in split_functions(commands):
+            if name is not None:
+                graph.setdefault(name, set()).update(
+                    command[1] for command in body if command[0].name == "C_CALL"
+                )
+    return graph
+
+
+def reachable_functions(graph: dict[str, set[str]], root: str = ROOT) -> set[str]:
+    """The functions which can be called from root, including itself.
+    Functions which are called but not defined are left out."""
+    reachable = set()
+    unvisited = [root]
+    while unvisited:
+        name = unvisited.pop()
+        if name in reachable or name not in graph:
+            continue
+        reachable.add(name)
+        unvisited.extend(graph[name])
+    return reachable
+
+
+def remove_dead_functions(
+    files: dict[str, list[tuple]], root: str = ROOT
+) -> tuple[dict[str, list[tuple]], list[str]]:
+    """Remove the functions which can't be reached from root, returning the
+    commands left in each file and the names of the functions removed. If
+    the program doesn't define root, nothing is removed."""
+    graph = call_graph(files)
+    if root not in graph:
+        return files, []
+
+    reachable = reachable_functions(graph, root)
+    live = {}
+    removed = []
+    for filename, commands in files.items():
+        live[filename] = []
+        for name, body in split_functions(commands):
+            if name is None or name in reachable:
+                live[filename].extend(body)
+            else:
+                removed.append(name)
+    return live, removed
@@ -13,6 +13,8 @@ class WritableCommandEnum(str, Enum):
 ARG = "@ARG\n"
 LCL = "@LCL\n"
 R13 = "@R13\n"
+R14 = "@R14\n"
+R15 = "@R15\n"
 PUSH_D = [
     "@SP\n",
     "A=M\n",
@@ -50,17 +52,105 @@ SEGMENT_TO_ADDRESS_MAP = {
     "that": "THAT",
 }
 UNCONDITIONAL_JUMP = "0;JMP\n"
+FILL_D = [
+    "@SP\n",
+    "AM=M-1\n",
+    "D=M\n",
+]
+# With stack caching, a value is popped into segment[index] by incrementing
+# the segment's address up to this many times, beyond which it's shorter to
+# compute the address
+POP_INCREMENT_LIMIT = 9
+# The jump on y - x, for the comparison of x and y, when the result is true
+COMPARISON_TO_TRUE_JUMP_MAP = {
+    "eq": "JEQ",
+    "gt": "JLT",
+    "lt": "JGT",
+}
+# And when it's false
+COMPARISON_TO_FALSE_JUMP_MAP = {
+    "eq": "JNE",
+    "lt": "JLE",  # This looks the wrong way round because of stack
+    "gt": "JGE",  # FILO behaviour
+}
+COMMAND_TYPE_TO_KEYWORD = {
+    "C_PUSH": "push",
+    "C_POP": "pop",
+    "C_LABEL": "label",
+    "C_GOTO": "goto",
+    "C_IF": "if-goto",
+    "C_FUNCTION": "function",
+    "C_CALL": "call",
+    "C_RETURN": "return",
+}
+COMPARISONS = ("eq", "gt", "lt")
+# Windows of VM commands which are written together as specialised code,
+# longest first, with the method which writes each. A word of None matches
+# any word, and a tuple of words any of them.
+FUSED_PATTERNS = [
+    (
+        (("pop", "temp", 0), ("pop", "pointer", 1), ("push", "temp", 0), ("pop", "that", 0)),
+        "_fuse_array_store",
+    ),
+    (
+        (("push", None, None), ("add",), ("pop", "pointer", 1), ("push", "that", 0)),
+        "_fuse_array_load",
+    ),
+    (((COMPARISONS,), ("not",), ("if-goto", None)), "_fuse_comparison_if"),
+    ((("push", None, None), ("push", "constant", 0), ("eq",)), "_fuse_is_zero"),
+    ((("push", "constant", 0), ("eq",)), "_fuse_is_zero"),
+    ((("push", "constant", None), (("add", "sub", "and", "or"),)), "_fuse_constant_arithmetic"),
+    ((("push", "constant", 0), ("not",)), "_fuse_true"),
+    ((("push", "constant", 1), ("neg",)), "_fuse_true"),
+    (((COMPARISONS,), ("if-goto", None)), "_fuse_comparison_if"),
+    ((("not",), ("if-goto", None)), "_fuse_not_if"),
+    ((("push", None, None), ("pop", None, None)), "_fuse_move"),
+]
+FUSED_WINDOW = max(len(pattern) for pattern, _ in FUSED_PATTERNS)
+# The computation of each command on the top of the stack, in M, and a
+# constant, in D
+CONSTANT_ARITHMETIC = {
+    "add": "D+M",
+    "sub": "M-D",
+    "and": "D&M",
+    "or": "D|M",
+}
             
 
 class CodeWriter:    
 
-    def __init__(self, path: str):
+    def __init__(
+        self,
+        path: str,
+        shared_calls: bool = False,
+        shared_comparisons: bool = False,
+        stack_caching: bool = False,
+        fused_patterns: bool = False,
+    ):
         self.destination = open(path, "w")
         self.filename = self._determine_filename(path)
         # Keep track of how many boolean checks there have been
         self.bool_count = 0
         # Keep track of function returns
         self.return_count = 0
+        # Labels are scoped to the function they're written in, as
+        # function$label, so that functions can reuse the same label names
+        self.function_name = None
+        # Calls and returns jump to the $CALL and $RETURN routines, written
+        # once by the bootstrap, rather than being written out in full
+        self.shared_calls = shared_calls
+        # Likewise, eq, gt and lt jump to the $EQ, $GT and $LT routines,
+        # which are written at the end for the comparisons that were used
+        self.shared_comparisons = shared_comparisons
+        self.comparisons: set[str] = set()
+        # The top of the stack is kept in D, rather than at SP - 1, from one
+        # command to the next until a label, goto, call or return. While it
+        # is, top_in_d is set and SP points to where it belongs.
+        self.stack_caching = stack_caching
+        self.top_in_d = False
+        # Windows of commands matching FUSED_PATTERNS may be written together
+        # with write_fused
+        self.fused_patterns = fused_patterns
         self._write_bootstap()
 
     def _write_bootstap(self):
@@ -73,13 +163,70 @@ class CodeWriter:
             ]
         )
         self.write_call("Sys.init", 0)
+        if self.shared_calls:
+            self._write_call_routines()
+
+    def _write_call_routines(self):
+        """Write the $CALL routine, which calls the function whose address is
+        in D with the return address in R15 and nargs in R14, and the $RETURN
+        routine. Sys.init never returns, so neither is run except by a jump."""
+        self.destination.writelines(
+            [
+                "($CALL)\n",
+                R13,
+                "M=D\n",
+                R15,
+                "D=M\n",
+                *PUSH_D,
+                *self._call_frame_lines(R14, "D=D-M\n"),
+                R13,
+                "A=M\n",
+                UNCONDITIONAL_JUMP,
+                "($RETURN)\n",
+                *self._return_lines(),
+            ]
+        )
+
+    def _write_comparison_routines(self):
+        """Write the $EQ, $GT and $LT routines of the comparisons used, which
+        replace the top two values of the stack with the result of comparing
+        them and then jump to the return address in R15"""
+        for command, jump in COMPARISON_TO_TRUE_JUMP_MAP.items():
+            if command not in self.comparisons:
+                continue
+            routine = f"${command.upper()}"
+            self.destination.writelines(
+                [
+                    f"({routine})\n",
+                    "@SP\n",
+                    "AM=M-1\n",
+                    "D=M\n",
+                    "A=A-1\n",
+                    "D=D-M\n",
+                    "M=-1\n",
+                    f"@{routine}_TRUE\n",
+                    f"D;{jump}\n",
+                    "@SP\n",
+                    "A=M-1\n",
+                    "M=0\n",
+                    f"({routine}_TRUE)\n",
+                    R15,
+                    "A=M\n",
+                    UNCONDITIONAL_JUMP,
+                ]
+            )
 
     def set_file_name(self, filename: str) -> None:
+        self.destination.writelines(self._spill())
         self.filename = filename
 
     def write_arithmetic(self, command: str) -> None:
         """Convert an arithmetic command into a series of instructions."""
 
+        if self.stack_caching:
+            self.destination.writelines(self._cached_arithmetic(command))
+            return
+
         single_argument_commands: dict[str, str] = {"neg": "-", "not": "!"}
         if command in single_argument_commands:
             op = single_argument_commands[command]
@@ -105,8 +252,14 @@ class CodeWriter:
 
         command = WritableCommandEnum[command.name]
 
-        if command == WritableCommandEnum.C_POP:
+        if command == WritableCommandEnum.C_POP and self.stack_caching:
+            lines = [*self._fill(), *self._store_d(segment, index)]
+            self.top_in_d = False
+        elif command == WritableCommandEnum.C_POP:
             lines = self._handle_pop(segment, index)
+        elif command == WritableCommandEnum.C_PUSH and self.stack_caching:
+            lines = [*self._spill(), *self._load_d(segment, index)]
+            self.top_in_d = True
         elif command == WritableCommandEnum.C_PUSH:
             lines = self._handle_push(segment, index)
         else:
@@ -116,25 +269,46 @@ class CodeWriter:
 
         self.destination.writelines(lines)
 
+    def write_fused(self, commands: list[tuple]) -> int:
+        """Write the commands at the start of a window of (command type,
+        arg1, arg2) commands that match the first of FUSED_PATTERNS that
+        they can, returning how many were written, or 0 if none match"""
+        words = [self._vm_words(*command) for command in commands]
+        for pattern, method in FUSED_PATTERNS:
+            if self._matches(pattern, words):
+                window = words[:len(pattern)]
+                self.destination.writelines(
+                    [*self._spill(), *getattr(self, method)(window)]
+                )
+                return len(pattern)
+        return 0
+
     def write_label(self, label: str) -> None:
         """Write a label for if-gotos and gotos to redirect to"""
-        self.destination.write(f"({label})\n")
+        self.destination.writelines(self._spill())
+        self.destination.write(f"({self._scope_label(label)})\n")
 
     def write_goto(self, label: str) -> None:
         """Write an unconditional goto operation, i.e., one that always goes
         to the provided label"""
-        self.destination.write(f"@{label}\n{UNCONDITIONAL_JUMP}")
+        self.destination.writelines(self._spill())
+        self.destination.write(f"@{self._scope_label(label)}\n{UNCONDITIONAL_JUMP}")
 
     def write_if(self, label: str) -> None:
         """Write an if-goto (i.e., conditional goto) operation, i.e., one that
         pops the top value off the stack and, if non-zero, goes to the provided
         label"""
-        self.destination.writelines([*POP_D, f"@{label}\n", "D;JNE\n",])
+        pop = self._fill() if self.stack_caching else POP_D
+        self.destination.writelines(
+            [*pop, f"@{self._scope_label(label)}\n", "D;JNE\n",]
+        )
+        self.top_in_d = False
 
     def write_function(self, function_name: str, nvars: int) -> None:
         """Write a function definition; zero out a number of memory locations
         equivalent to nvars and then push the function label"""
-        lines = [f"({function_name})\n",]
+        self.function_name = function_name
+        lines = [*self._spill(), f"({function_name})\n",]
         for _ in range(nvars):
             lines.extend(["@SP\n", "A=M\n", "M=0\n", "@SP\n", "M=M+1\n",])
 
@@ -142,11 +316,46 @@ class CodeWriter:
 
     def write_call(self, function_name: str, nargs: int) -> None:
         """Write a function call; push the return address, push the old memory
-        addresses, update arg and lcl and then set the return address"""
-        lines = [
-            f"@{function_name}$ret.{self.return_count}\n",
-            "D=A\n",
-            *PUSH_D,
+        addresses, update arg and lcl and then set the return address. With
+        shared calls, load the return address, nargs and the function's
+        address and jump to $CALL, which does the rest."""
+        return_label = f"{function_name}$ret.{self.return_count}"
+        self.destination.writelines(self._spill())
+        if self.shared_calls:
+            lines = [
+                f"@{return_label}\n",
+                "D=A\n",
+                R15,
+                "M=D\n",
+                f"@{nargs}\n",
+                "D=A\n",
+                R14,
+                "M=D\n",
+                f"@{function_name}\n",
+                "D=A\n",
+                "@$CALL\n",
+                UNCONDITIONAL_JUMP,
+                f"({return_label})\n",
+            ]
+        else:
+            lines = [
+                f"@{return_label}\n",
+                "D=A\n",
+                *PUSH_D,
+                *self._call_frame_lines(f"@{nargs}\n", "D=D-A\n"),
+                f"@{function_name}\n",
+                UNCONDITIONAL_JUMP,
+                f"({return_label})\n",
+            ]
+
+        self.destination.writelines(lines)
+        self.return_count += 1
+
+    def _call_frame_lines(self, nargs: str, subtract: str) -> list[str]:
+        """Push LCL, ARG, THIS and THAT, then set ARG to SP - 5 - nargs and
+        LCL to SP, where nargs is an A-instruction and subtract the
+        instruction which subtracts the value it loads from D"""
+        return [
             LCL,
             "D=M\n",
             *PUSH_D,
@@ -163,27 +372,27 @@ class CodeWriter:
             "D=M\n",
             "@5\n",
             "D=D-A\n",
-            f"@{nargs}\n",
-            "D=D-A\n",
+            nargs,
+            subtract,
             ARG,
             "M=D\n",
             "@SP\n",
             "D=M\n",
             LCL,
             "M=D\n",
-            f"@{function_name}\n",
-            UNCONDITIONAL_JUMP,
-            f"({function_name}$ret.{self.return_count})\n",
         ]
 
-        self.destination.writelines(lines)
-        self.return_count += 1
-
     def write_return(self):
         """Write a function return: reposition the return value for the caller,
         reposition THAT, THIS, ARG and LCL and return to the supplied return 
-        label"""
+        label. With shared calls, jump to $RETURN, which does the same."""
+        self.destination.writelines(self._spill())
+        if self.shared_calls:
+            self.destination.writelines(["@$RETURN\n", UNCONDITIONAL_JUMP,])
+        else:
+            self.destination.writelines(self._return_lines())
 
+    def _return_lines(self) -> list[str]:
         address_to_frame_offset = {
             "THAT": 1,
             "THIS": 2,
@@ -223,23 +432,206 @@ class CodeWriter:
             )
 
         lines.extend(["@6\n", "A=M\n", UNCONDITIONAL_JUMP,])
-        self.destination.writelines(lines)
+        return lines
+
+    def _spill(self) -> list[str]:
+        """Push the top of the stack from D, if it's there"""
+        if not self.top_in_d:
+            return []
+        self.top_in_d = False
+        return PUSH_D
+
+    def _fill(self) -> list[str]:
+        """Pop the top of the stack into D, unless it's there already"""
+        if self.top_in_d:
+            return []
+        self.top_in_d = True
+        return FILL_D
+
+    def _cached_arithmetic(self, command: str) -> list[str]:
+        """Write an arithmetic command with stack caching, which takes y from
+        D and leaves its result there"""
+        single_argument_commands: dict[str, str] = {"neg": "-", "not": "!"}
+        if command in COMPARISON_TO_TRUE_JUMP_MAP and self.shared_comparisons:
+            # The routines take both values from the stack
+            return [*self._spill(), *self._handle_multiline_commands(command)]
+        lines = self._fill()
+        if command in single_argument_commands:
+            lines = [*lines, f"D={single_argument_commands[command]}D\n"]
+        elif op := ONE_LINE_DOUBLE_ARG_COMMANDS.get(command):
+            lines = [*lines, "@SP\n", "AM=M-1\n", f"D=M{op}D\n"]
+        else:
+            lines = [*lines, *self._handle_multiline_commands(command)]
+        return lines
+
+    def _vm_words(self, command_type: Enum, arg1, arg2) -> tuple:
+        if command_type.name == "C_ARITHMETIC":
+            return (arg1,)
+        words = (COMMAND_TYPE_TO_KEYWORD[command_type.name], arg1, arg2)
+        return tuple(word for word in words if word is not None)
+
+    def _matches(self, pattern: tuple, words: list[tuple]) -> bool:
+        if len(words) < len(pattern):
+            return False
+        return all(
+            len(command) == len(expected) and all(
+                word == expected_word
+                or expected_word is None
+                or isinstance(expected_word, tuple) and word in expected_word
+                for word, expected_word in zip(command, expected)
+            )
+            for command, expected in zip(words, pattern)
+        )
+
+    def _fuse_array_store(self, window: list[tuple]) -> list[str]:
+        """pop temp 0 / pop pointer 1 / push temp 0 / pop that 0, which
+        stores the top of the stack at the address below it"""
+        return [
+            *FILL_D,
+            "@5\n",
+            "M=D\n",
+            *FILL_D,
+            "@THAT\n",
+            "M=D\n",
+            "@5\n",
+            "D=M\n",
+            "@THAT\n",
+            "A=M\n",
+            "M=D\n",
+        ]
+
+    def _fuse_array_load(self, window: list[tuple]) -> list[str]:
+        """push x / add / pop pointer 1 / push that 0, which replaces the
+        address on the stack with the value at the address plus x"""
+        _, segment, index = window[0]
+        return [
+            *self._load_d(segment, index),
+            "@SP\n",
+            "A=M-1\n",
+            "D=D+M\n",
+            "@THAT\n",
+            "M=D\n",
+            "A=D\n",
+            "D=M\n",
+            "@SP\n",
+            "A=M-1\n",
+            "M=D\n",
+        ]
+
+    def _fuse_comparison_if(self, window: list[tuple]) -> list[str]:
+        """A comparison, optionally followed by not, and then if-goto, which
+        jump on the comparison without pushing its result"""
+        comparison, label = window[0][0], window[-1][1]
+        if len(window) == 3:
+            jump = COMPARISON_TO_FALSE_JUMP_MAP[comparison]
+        else:
+            jump = COMPARISON_TO_TRUE_JUMP_MAP[comparison]
+        return [
+            *FILL_D,
+            "@SP\n",
+            "AM=M-1\n",
+            "D=D-M\n",
+            f"@{self._scope_label(label)}\n",
+            f"D;{jump}\n",
+        ]
+
+    def _fuse_is_zero(self, window: list[tuple]) -> list[str]:
+        """push constant 0 / eq, optionally after a push"""
+        if len(window) == 3:
+            _, segment, index = window[0]
+            lines = [*self._load_d(segment, index), "@SP\n", "M=M+1\n", "A=M-1\n"]
+        else:
+            lines = ["@SP\n", "A=M-1\n", "D=M\n"]
+        lines.extend(
+            [
+                "M=-1\n",
+                f"@CONTINUE_{self.bool_count}\n",
+                "D;JEQ\n",
+                "@SP\n",
+                "A=M-1\n",
+                "M=0\n",
+                f"(CONTINUE_{self.bool_count})\n",
+            ]
+        )
+        self.bool_count += 1
+        return lines
+
+    def _fuse_constant_arithmetic(self, window: list[tuple]) -> list[str]:
+        """push constant c / add, sub, and or or, which change the top of the
+        stack in place"""
+        constant, command = window[0][2], window[1][0]
+        if constant == 1 and command in ("add", "sub"):
+            op = ONE_LINE_DOUBLE_ARG_COMMANDS[command]
+            return ["@SP\n", "A=M-1\n", f"M=M{op}1\n"]
+        return [
+            f"@{constant}\n",
+            "D=A\n",
+            "@SP\n",
+            "A=M-1\n",
+            f"M={CONSTANT_ARITHMETIC[command]}\n",
+        ]
+
+    def _fuse_true(self, window: list[tuple]) -> list[str]:
+        """push constant 0 / not, or push constant 1 / neg, which push -1"""
+        return ["@SP\n", "M=M+1\n", "A=M-1\n", "M=-1\n"]
+
+    def _fuse_not_if(self, window: list[tuple]) -> list[str]:
+        """not / if-goto, which jumps unless the top of the stack is -1, as
+        !x is non-zero for any other x, not only 0"""
+        return [*FILL_D, f"@{self._scope_label(window[1][1])}\n", "D+1;JNE\n"]
+
+    def _fuse_move(self, window: list[tuple]) -> list[str]:
+        """push x / pop y, which copies x to y without the stack"""
+        (_, source, source_index), (_, destination, destination_index) = window
+        return [
+            *self._load_d(source, source_index),
+            *self._store_d(destination, destination_index),
+        ]
+
+    def _scope_label(self, label: str) -> str:
+        if self.function_name is None:
+            return label
+        return f"{self.function_name}${label}"
 
     def _determine_filename(self, path: str):
         return path.split("/")[-1].split(".")[0]
 
     def _handle_multiline_commands(self, command: str) -> list[str]:
 
-        equality_command_to_false_jump_map = {
-            "eq": "JNE",
-            "lt": "JLE",  # This looks the wrong way round because of stack
-            "gt": "JGE",  # FILO behaviour
-        }
-
-        if not (jump := equality_command_to_false_jump_map.get(command, None)):
+        if not (jump := COMPARISON_TO_FALSE_JUMP_MAP.get(command, None)):
             raise ValueError(
                 f"Received invalid command {command}"
             )
+        elif self.shared_comparisons:
+            # Only the return label is needed, rather than FALSE_n as well
+            self.comparisons.add(command)
+            lines = [
+                f"@CONTINUE_{self.bool_count}\n",
+                "D=A\n",
+                R15,
+                "M=D\n",
+                f"@${command.upper()}\n",
+                UNCONDITIONAL_JUMP,
+                f"(CONTINUE_{self.bool_count})\n",
+            ]
+            self.bool_count += 1
+            return lines
+        elif self.stack_caching:
+            lines = [
+                "@SP\n",
+                "AM=M-1\n",
+                "D=D-M\n",
+                f"@FALSE_{self.bool_count}\n",
+                f"D;{jump}\n",
+                "D=-1\n",
+                f"@CONTINUE_{self.bool_count}\n",
+                UNCONDITIONAL_JUMP,
+                f"(FALSE_{self.bool_count})\n",
+                "D=0\n",
+                f"(CONTINUE_{self.bool_count})\n",
+            ]
+            self.bool_count += 1
+            return lines
         else:
             lines = [
                 *POP_D,
@@ -293,6 +685,10 @@ class CodeWriter:
         return lines
 
     def _handle_push(self, segment: str, index: int) -> list[str]:
+        # Push to stack
+        return [*self._load_d(segment, index), *PUSH_D]
+
+    def _load_d(self, segment: str, index: int) -> list[str]:
         if segment == "constant":
             lines = [
                 f"@{index}\n",
@@ -326,16 +722,49 @@ class CodeWriter:
                 "A=M+D\n",
                 "D=M\n",
             ]
-        # Push to stack
-        lines.extend(PUSH_D)
         return lines
 
+    def _store_d(self, segment: str, index: int) -> list[str]:
+        """Store D in segment[index]"""
+        if segment == "temp":
+            return [f"@{5 + index}\n", "M=D\n"]
+        elif segment == "pointer":
+            address = "THIS" if index == 0 else "THAT"
+            return [f"@{address}\n", "M=D\n"]
+        elif segment == "static":
+            return [f"@{self.filename}.{index}\n", "M=D\n"]
+        elif index <= POP_INCREMENT_LIMIT:
+            return [
+                f"@{SEGMENT_TO_ADDRESS_MAP[segment]}\n",
+                "A=M\n",
+                *["A=A+1\n"] * index,
+                "M=D\n",
+            ]
+        # Keep D in R13 while the address is computed into R14
+        return [
+            R13,
+            "M=D\n",
+            f"@{SEGMENT_TO_ADDRESS_MAP[segment]}\n",
+            "D=M\n",
+            f"@{index}\n",
+            "D=D+A\n",
+            R14,
+            "M=D\n",
+            R13,
+            "D=M\n",
+            R14,
+            "A=M\n",
+            "M=D\n",
+        ]
+
     def close(self):
         end_loop = [
+            *self._spill(),
             "(END)\n",
             "@END\n",
             UNCONDITIONAL_JUMP,
         ]
         self.destination.writelines(end_loop)
+        self._write_comparison_routines()
         self.destination.close()
         
@@ -1,26 +1,47 @@
 import argparse
 import os
 
+import callgraph
 import codewriter
 import vmparser 
 
-def main(path: str):
+def main(
+    path: str,
+    shared_calls: bool = False,
+    shared_comparisons: bool = False,
+    stack_caching: bool = False,
+    fused_patterns: bool = False,
+    eliminate_dead_functions: bool = False,
+):
 
     if os.path.isdir(path):
         filename = path.split("/")[-1]
         output_path = f"{path}/{filename}.asm"
-        writer = codewriter.CodeWriter(output_path)
+        writer = codewriter.CodeWriter(
+            output_path, shared_calls, shared_comparisons, stack_caching, fused_patterns
+        )
 
-        for file in os.listdir(path):
-            if file.endswith(".vm"):
-                parser = vmparser.VMParser(f"{path}/{file}")
-                writer.set_file_name(file.removesuffix(".vm"))
-                write_lines(parser, writer)
+        files = {
+            file.removesuffix(".vm"): read_commands(vmparser.VMParser(f"{path}/{file}"))
+            for file in os.listdir(path)
+            if file.endswith(".vm")
+        }
+        if eliminate_dead_functions:
+            live, removed = callgraph.remove_dead_functions(files)
+            report_removed(files, live, removed)
+            files = live
+
+        for name, commands in files.items():
+            if commands:
+                writer.set_file_name(name)
+                write_commands(commands, writer)
 
     elif os.path.isfile(path):
         parser = vmparser.VMParser(path)
         output_path = path.replace(".vm", ".asm")
-        writer = codewriter.CodeWriter(output_path)
+        writer = codewriter.CodeWriter(
+            output_path, shared_calls, shared_comparisons, stack_caching, fused_patterns
+        )
         write_lines(parser, writer)
     else:
         raise TypeError("Provided path is neither a file or a folder")
@@ -28,35 +49,75 @@ def main(path: str):
     writer.close()
 
 
-def write_lines(parser, writer) -> None:
+def report_removed(files: dict, live: dict, removed: list[str]) -> None:
+    functions = sum(
+        command[0] == vmparser.CommandTypeEnum.C_FUNCTION
+        for commands in files.values()
+        for command in commands
+    )
+    total = sum(len(commands) for commands in files.values())
+    left = sum(len(commands) for commands in live.values())
+    print(
+        f"Removed {len(removed)} of {functions} functions,"
+        f" {total - left} of {total} commands"
+    )
+    for name in sorted(removed):
+        print(f"    {name}")
+
+
+def read_commands(parser) -> list[tuple]:
+    commands = []
     while parser.has_more_lines:
         parser.advance()
-        if parser.command_type == vmparser.CommandTypeEnum.C_ARITHMETIC:
-            writer.write_arithmetic(parser.arg1)
-        elif parser.command_type in (
-            vmparser.CommandTypeEnum.C_POP, vmparser.CommandTypeEnum.C_PUSH
-        ):
-            writer.write_push_pop(
-                command=parser.command_type,
-                segment=parser.arg1,
-                index=parser.arg2
-            )
-        elif parser.command_type == vmparser.CommandTypeEnum.C_LABEL:
-            writer.write_label(parser.arg1)
-        elif parser.command_type == vmparser.CommandTypeEnum.C_GOTO:
-            writer.write_goto(parser.arg1)
-        elif parser.command_type == vmparser.CommandTypeEnum.C_IF:
-            writer.write_if(parser.arg1)
-        elif parser.command_type == vmparser.CommandTypeEnum.C_FUNCTION:
-            writer.write_function(parser.arg1, parser.arg2)
-        elif parser.command_type == vmparser.CommandTypeEnum.C_CALL:
-            writer.write_call(parser.arg1, parser.arg2)
-        elif parser.command_type == vmparser.CommandTypeEnum.C_RETURN:
-            writer.write_return()
-        else:
-            raise NotImplementedError(
-                f"Translator cannot handle command: {parser.command_type.name}"
+        commands.append((parser.command_type, parser.arg1, parser.arg2))
+    return commands
+
+
+def write_lines(parser, writer) -> None:
+    write_commands(read_commands(parser), writer)
+
+
+def write_commands(commands: list[tuple], writer) -> None:
+    index = 0
+    while index < len(commands):
+        written = 0
+        if writer.fused_patterns:
+            written = writer.write_fused(
+                commands[index:index + codewriter.FUSED_WINDOW]
             )
+        if not written:
+            write_command(writer, *commands[index])
+            written = 1
+        index += written
+
+
+def write_command(writer, command_type, arg1, arg2) -> None:
+    if command_type == vmparser.CommandTypeEnum.C_ARITHMETIC:
+        writer.write_arithmetic(arg1)
+    elif command_type in (
+        vmparser.CommandTypeEnum.C_POP, vmparser.CommandTypeEnum.C_PUSH
+    ):
+        writer.write_push_pop(
+            command=command_type,
+            segment=arg1,
+            index=arg2
+        )
+    elif command_type == vmparser.CommandTypeEnum.C_LABEL:
+        writer.write_label(arg1)
+    elif command_type == vmparser.CommandTypeEnum.C_GOTO:
+        writer.write_goto(arg1)
+    elif command_type == vmparser.CommandTypeEnum.C_IF:
+        writer.write_if(arg1)
+    elif command_type == vmparser.CommandTypeEnum.C_FUNCTION:
+        writer.write_function(arg1, arg2)
+    elif command_type == vmparser.CommandTypeEnum.C_CALL:
+        writer.write_call(arg1, arg2)
+    elif command_type == vmparser.CommandTypeEnum.C_RETURN:
+        writer.write_return()
+    else:
+        raise NotImplementedError(
+            f"Translator cannot handle command: {command_type.name}"
+        )
 
 
 if __name__ == "__main__":
@@ -64,7 +125,41 @@ if __name__ == "__main__":
         description="Convert .vm files into .asm files"
     )
     argparser.add_argument("path", type=str)
+    argparser.add_argument(
+        "--shared-calls",
+        action="store_true",
+        help="write the code for calls and returns once, rather than at every"
+        " call and return",
+    )
+    argparser.add_argument(
+        "--shared-comparisons",
+        action="store_true",
+        help="write the code for eq, gt and lt once, rather than at every"
+        " comparison",
+    )
+    argparser.add_argument(
+        "--stack-caching",
+        action="store_true",
+        help="keep the top of the stack in D between commands",
+    )
+    argparser.add_argument(
+        "--fuse",
+        action="store_true",
+        help="write common sequences of commands together as specialised code",
+    )
+    argparser.add_argument(
+        "--eliminate-dead-functions",
+        action="store_true",
+        help="leave out the functions which can't be called from Sys.init",
+    )
 
     args = argparser.parse_args()
-    main(args.path)
+    main(
+        args.path,
+        args.shared_calls,
+        args.shared_comparisons,
+        args.stack_caching,
+        args.fuse,
+        args.eliminate_dead_functions,
+    )
 
@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+
+TRANSLATOR_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"
+)
+CALLS = 800
+
+
+def test_inline_too_big_for_rom(tmp_path):
+    """A program which only fits in ROM with shared calls is run from the
+    first configuration which fits"""
+    program = tmp_path / "Calls"
+    program.mkdir()
+    (program / "Sys.vm").write_text(
+        "function Sys.init 0\n"
+        + "call Main.zero 0\npop temp 0\n" * CALLS
+        + "label HALT\ngoto HALT\n"
+    )
+    (program / "Main.vm").write_text("function Main.zero 0\npush constant 0\nreturn\n")
+
+    output = subprocess.run(
+        [sys.executable, "benchmark.py", str(program)],
+        cwd=TRANSLATOR_DIR,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    rows = {
+        line[19:35].strip(): line.split()
+        for line in output.splitlines()[1:]
+    }
+
+    assert int(rows["inline"][2]) > 32768
+    assert rows["inline"][-2:] == ["-", "-"]
+    assert rows["shared calls"][-1] != "-"
+    # Fused configurations use the commands counted with shared calls
+    assert rows["all"][-1] != "-"
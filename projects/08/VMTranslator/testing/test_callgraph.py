@@ -0,0 +1,85 @@
+import pytest
+
+from VMTranslator.src.callgraph import (
+    call_graph,
+    reachable_functions,
+    remove_dead_functions,
+    split_functions,
+)
+from VMTranslator.src.vmparser import CommandTypeEnum
+
+
+def _function(name: str, *calls: str) -> list[tuple]:
+    return [
+        (CommandTypeEnum.C_FUNCTION, name, 0),
+        *[(CommandTypeEnum.C_CALL, call, 0) for call in calls],
+        (CommandTypeEnum.C_RETURN, None, None),
+    ]
+
+
+FILES = {
+    "Sys": _function("Sys.init", "Main.main") + _function("Sys.halt"),
+    "Main": _function("Main.main", "Main.loop", "Math.multiply")
+    + _function("Main.loop", "Main.loop", "Main.main")
+    + _function("Main.unused", "Math.divide"),
+    "Math": _function("Math.multiply") + _function("Math.divide"),
+}
+
+
+def test_split_functions():
+    top = [(CommandTypeEnum.C_PUSH, "constant", 1), (CommandTypeEnum.C_POP, "temp", 0)]
+    commands = top + FILES["Sys"]
+
+    assert split_functions(commands) == [
+        (None, top),
+        ("Sys.init", FILES["Sys"][:3]),
+        ("Sys.halt", FILES["Sys"][3:]),
+    ]
+
+
+def test_call_graph():
+    assert call_graph(FILES) == {
+        "Sys.init": {"Main.main"},
+        "Sys.halt": set(),
+        "Main.main": {"Main.loop", "Math.multiply"},
+        "Main.loop": {"Main.loop", "Main.main"},
+        "Main.unused": {"Math.divide"},
+        "Math.multiply": set(),
+        "Math.divide": set(),
+    }
+
+
+@pytest.mark.parametrize(
+    "root,expected", [
+        ("Sys.init", {"Sys.init", "Main.main", "Main.loop", "Math.multiply"}),
+        ("Main.unused", {"Main.unused", "Math.divide"}),
+        ("Output.init", set()),
+    ]
+)
+def test_reachable_functions(root, expected):
+    """Check that cycles are followed once, and that undefined functions are
+    left out"""
+    graph = call_graph(FILES)
+    graph["Main.unused"].add("Output.printInt")
+
+    assert reachable_functions(graph, root) == expected
+
+
+def test_remove_dead_functions():
+    live, removed = remove_dead_functions(FILES)
+
+    assert live == {
+        "Sys": _function("Sys.init", "Main.main"),
+        "Main": _function("Main.main", "Main.loop", "Math.multiply")
+        + _function("Main.loop", "Main.loop", "Main.main"),
+        "Math": _function("Math.multiply"),
+    }
+    assert removed == ["Sys.halt", "Main.unused", "Math.divide"]
+
+
+def test_remove_dead_functions_without_sys_init():
+    """Programs without a Sys.init, such as those of projects/07, are left
+    as they are"""
+    files = {"Main": _function("Main.main") + _function("Main.unused")}
+
+    assert remove_dead_functions(files) == (files, [])
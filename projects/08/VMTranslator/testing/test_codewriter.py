@@ -1,6 +1,7 @@
 from io import StringIO
 
 from VMTranslator.src.codewriter import CodeWriter, WritableCommandEnum
+from VMTranslator.src.vmparser import CommandTypeEnum
 
 import pytest
 
@@ -10,6 +11,13 @@ def codewriter():
         self.destination = StringIO()
         self.bool_count = 0
         self.return_count = 0
+        self.function_name = None
+        self.shared_calls = False
+        self.shared_comparisons = False
+        self.comparisons = set()
+        self.stack_caching = False
+        self.top_in_d = False
+        self.fused_patterns = False
         self.filename = "Foo"
 
     CodeWriter.__init__ = mock_init
@@ -286,6 +294,19 @@ def test_if(codewriter: CodeWriter):
     assert "\n".join(expected_asm) == codewriter.destination.getvalue()
 
 
+def test_labels_scoped_to_function(codewriter: CodeWriter):
+    """Check that labels within a function are prefixed with its name, so
+    that functions can use the same label names"""
+    codewriter.write_function("Foo.bar", 0)
+    codewriter.write_label("LOOP")
+    codewriter.write_goto("LOOP")
+    codewriter.write_if("LOOP")
+
+    asm = codewriter.destination.getvalue()
+    assert "(Foo.bar$LOOP)\n" in asm
+    assert asm.count("@Foo.bar$LOOP\n") == 2
+
+
 def test_set_file_name(codewriter: CodeWriter):
     codewriter.set_file_name("foo")
     assert codewriter.filename == "foo"
@@ -429,3 +450,358 @@ def test_write_return(codewriter: CodeWriter):
     codewriter.set_file_name("Foo")
     codewriter.write_return()
     assert "\n".join(expected_asm) + "\n" == codewriter.destination.getvalue()
+
+
+def test_write_shared_call(codewriter: CodeWriter):
+    expected_asm = [
+        "@Foo.bar$ret.0",  # Store the return address in R15
+        "D=A",
+        "@R15",
+        "M=D",
+        "@2",  # Store the number of arguments in R14
+        "D=A",
+        "@R14",
+        "M=D",
+        "@Foo.bar",  # Call the function through $CALL
+        "D=A",
+        "@$CALL",
+        "0;JMP",
+        "(Foo.bar$ret.0)\n",
+    ]
+
+    codewriter.shared_calls = True
+    codewriter.write_call("Foo.bar", 2)
+    assert "\n".join(expected_asm) == codewriter.destination.getvalue()
+    assert codewriter.return_count == 1
+
+
+def test_write_shared_return(codewriter: CodeWriter):
+    codewriter.shared_calls = True
+    codewriter.write_return()
+    assert codewriter.destination.getvalue() == "@$RETURN\n0;JMP\n"
+
+
+def test_write_call_routines(codewriter: CodeWriter):
+    push_d = ["@SP", "A=M", "M=D", "@SP", "M=M+1"]
+    expected_call = [
+        "($CALL)",
+        "@R13",  # Store the function's address
+        "M=D",
+        "@R15",  # Push the return address
+        "D=M",
+        *push_d,
+        "@LCL",
+        "D=M",
+        *push_d,
+        "@ARG",
+        "D=M",
+        *push_d,
+        "@THIS",
+        "D=M",
+        *push_d,
+        "@THAT",
+        "D=M",
+        *push_d,
+        "@SP",  # Set ARG to SP - 5 - R14
+        "D=M",
+        "@5",
+        "D=D-A",
+        "@R14",
+        "D=D-M",
+        "@ARG",
+        "M=D",
+        "@SP",
+        "D=M",
+        "@LCL",
+        "M=D",
+        "@R13",  # Jump to the function
+        "A=M",
+        "0;JMP",
+    ]
+    codewriter.write_return()
+    inline_return = codewriter.destination.getvalue()
+    codewriter.destination = StringIO()
+
+    codewriter._write_call_routines()
+    assert codewriter.destination.getvalue() == (
+        "\n".join(expected_call) + "\n($RETURN)\n" + inline_return
+    )
+
+
+def test_write_shared_comparison(codewriter: CodeWriter):
+    codewriter.shared_comparisons = True
+    codewriter.write_arithmetic("lt")
+    codewriter.write_arithmetic("lt")
+
+    assert codewriter.destination.getvalue().splitlines()[7:] == [
+        "@CONTINUE_1",  # Store the return address in R15
+        "D=A",
+        "@R15",
+        "M=D",
+        "@$LT",
+        "0;JMP",
+        "(CONTINUE_1)",
+    ]
+    assert codewriter.comparisons == {"lt"}
+
+
+def test_write_comparison_routines(codewriter: CodeWriter):
+    codewriter.comparisons = {"eq"}
+    codewriter._write_comparison_routines()
+
+    assert codewriter.destination.getvalue().splitlines() == [
+        "($EQ)",
+        "@SP",  # Pop y, leaving SP at x
+        "AM=M-1",
+        "D=M",
+        "A=A-1",
+        "D=D-M",  # y - x
+        "M=-1",  # Replace x with true, or with false unless y - x = 0
+        "@$EQ_TRUE",
+        "D;JEQ",
+        "@SP",
+        "A=M-1",
+        "M=0",
+        "($EQ_TRUE)",
+        "@R15",  # Return
+        "A=M",
+        "0;JMP",
+    ]
+
+
+def test_stack_caching(codewriter: CodeWriter):
+    codewriter.stack_caching = True
+    codewriter.write_push_pop(WritableCommandEnum.C_PUSH, "constant", 7)
+    codewriter.write_push_pop(WritableCommandEnum.C_PUSH, "static", 2)
+    codewriter.write_arithmetic("sub")
+    codewriter.write_arithmetic("neg")
+    codewriter.write_push_pop(WritableCommandEnum.C_POP, "local", 2)
+
+    assert codewriter.destination.getvalue().splitlines() == [
+        "@7",
+        "D=A",
+        "@SP",  # Spill 7 to make way for Foo.2
+        "A=M",
+        "M=D",
+        "@SP",
+        "M=M+1",
+        "@Foo.2",
+        "D=M",
+        "@SP",  # 7 - Foo.2
+        "AM=M-1",
+        "D=M-D",
+        "D=-D",
+        "@LCL",
+        "A=M",
+        "A=A+1",
+        "A=A+1",
+        "M=D",
+    ]
+    assert not codewriter.top_in_d
+
+
+def test_stack_caching_spills(codewriter: CodeWriter):
+    codewriter.stack_caching = True
+    codewriter.write_push_pop(WritableCommandEnum.C_PUSH, "temp", 1)
+    codewriter.write_label("LOOP")
+    codewriter.write_push_pop(WritableCommandEnum.C_PUSH, "pointer", 0)
+    codewriter.write_goto("LOOP")
+
+    assert codewriter.destination.getvalue().splitlines() == [
+        "@1",
+        "D=A",
+        "@5",
+        "A=D+A",
+        "D=M",
+        "@SP",
+        "A=M",
+        "M=D",
+        "@SP",
+        "M=M+1",
+        "(LOOP)",
+        "@THIS",
+        "D=M",
+        "@SP",
+        "A=M",
+        "M=D",
+        "@SP",
+        "M=M+1",
+        "@LOOP",
+        "0;JMP",
+    ]
+    assert not codewriter.top_in_d
+
+
+def test_stack_caching_close(codewriter: CodeWriter):
+    codewriter.stack_caching = True
+    codewriter.write_push_pop(WritableCommandEnum.C_PUSH, "constant", 7)
+    # Keep what was written once the writer is closed
+    codewriter.destination.close = lambda: None
+    codewriter.close()
+
+    assert codewriter.destination.getvalue().splitlines() == [
+        "@7",
+        "D=A",
+        "@SP",
+        "A=M",
+        "M=D",
+        "@SP",
+        "M=M+1",
+        "(END)",
+        "@END",
+        "0;JMP",
+    ]
+
+
+def test_stack_caching_if(codewriter: CodeWriter):
+    codewriter.stack_caching = True
+    codewriter.write_if("END")
+    codewriter.write_push_pop(WritableCommandEnum.C_PUSH, "constant", 0)
+    codewriter.write_if("END")
+
+    assert codewriter.destination.getvalue().splitlines() == [
+        "@SP",  # Pop, as nothing is cached
+        "AM=M-1",
+        "D=M",
+        "@END",
+        "D;JNE",
+        "@0",
+        "D=A",
+        "@END",
+        "D;JNE",
+    ]
+
+
+def test_stack_caching_comparison(codewriter: CodeWriter):
+    codewriter.stack_caching = True
+    codewriter.top_in_d = True
+    codewriter.write_arithmetic("gt")
+
+    assert codewriter.destination.getvalue().splitlines() == [
+        "@SP",
+        "AM=M-1",
+        "D=D-M",
+        "@FALSE_0",
+        "D;JGE",
+        "D=-1",
+        "@CONTINUE_0",
+        "0;JMP",
+        "(FALSE_0)",
+        "D=0",
+        "(CONTINUE_0)",
+    ]
+    assert codewriter.top_in_d
+
+
+def test_stack_caching_pop_far(codewriter: CodeWriter):
+    codewriter.stack_caching = True
+    codewriter.top_in_d = True
+    codewriter.write_push_pop(WritableCommandEnum.C_POP, "that", 10)
+
+    assert codewriter.destination.getvalue().splitlines() == [
+        "@R13",
+        "M=D",
+        "@THAT",
+        "D=M",
+        "@10",
+        "D=D+A",
+        "@R14",
+        "M=D",
+        "@R13",
+        "D=M",
+        "@R14",
+        "A=M",
+        "M=D",
+    ]
+
+
+@pytest.mark.parametrize(
+    "commands,written,expected_asm", [
+        (
+            [
+                (CommandTypeEnum.C_PUSH, "constant", 1),
+                (CommandTypeEnum.C_ARITHMETIC, "add", None),
+            ],
+            2,
+            ["@SP", "A=M-1", "M=M+1"],
+        ),
+        (
+            [
+                (CommandTypeEnum.C_PUSH, "constant", 3),
+                (CommandTypeEnum.C_ARITHMETIC, "sub", None),
+                (CommandTypeEnum.C_ARITHMETIC, "neg", None),
+            ],
+            2,
+            ["@3", "D=A", "@SP", "A=M-1", "M=M-D"],
+        ),
+        (
+            [
+                (CommandTypeEnum.C_PUSH, "local", 1),
+                (CommandTypeEnum.C_POP, "static", 4),
+            ],
+            2,
+            ["@1", "D=A", "@LCL", "A=M+D", "D=M", "@Foo.4", "M=D"],
+        ),
+        (
+            [
+                (CommandTypeEnum.C_ARITHMETIC, "lt", None),
+                (CommandTypeEnum.C_ARITHMETIC, "not", None),
+                (CommandTypeEnum.C_IF, "END", None),
+                (CommandTypeEnum.C_LABEL, "LOOP", None),
+            ],
+            3,
+            ["@SP", "AM=M-1", "D=M", "@SP", "AM=M-1", "D=D-M", "@END", "D;JLE"],
+        ),
+        (
+            [
+                (CommandTypeEnum.C_ARITHMETIC, "not", None),
+                (CommandTypeEnum.C_IF, "END", None),
+            ],
+            2,
+            ["@SP", "AM=M-1", "D=M", "@END", "D+1;JNE"],
+        ),
+        (
+            [
+                (CommandTypeEnum.C_POP, "temp", 0),
+                (CommandTypeEnum.C_POP, "pointer", 1),
+                (CommandTypeEnum.C_PUSH, "temp", 0),
+                (CommandTypeEnum.C_POP, "that", 0),
+            ],
+            4,
+            [
+                "@SP",  # Pop the value into temp 0
+                "AM=M-1",
+                "D=M",
+                "@5",
+                "M=D",
+                "@SP",  # Pop the address into THAT
+                "AM=M-1",
+                "D=M",
+                "@THAT",
+                "M=D",
+                "@5",  # Store the value
+                "D=M",
+                "@THAT",
+                "A=M",
+                "M=D",
+            ],
+        ),
+    ]
+)
+def test_write_fused(
+    commands: list[tuple], written: int, expected_asm: list[str], codewriter: CodeWriter
+):
+    assert codewriter.write_fused(commands) == written
+    assert codewriter.destination.getvalue().splitlines() == expected_asm
+
+
+def test_write_fused_no_match(codewriter: CodeWriter):
+    commands = [
+        (CommandTypeEnum.C_PUSH, "local", 0),
+        (CommandTypeEnum.C_ARITHMETIC, "add", None),
+        (CommandTypeEnum.C_POP, "pointer", 1),
+    ]
+
+    assert codewriter.write_fused(commands) == 0
+    assert codewriter.write_fused(commands[:1]) == 0
+    assert codewriter.destination.getvalue() == ""
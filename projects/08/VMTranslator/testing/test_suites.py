@@ -0,0 +1,160 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+PROJECTS_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+TRANSLATOR_DIR = os.path.join(PROJECTS_DIR, "08", "VMTranslator", "src")
+EMULATOR_DIR = os.path.join(PROJECTS_DIR, "06")
+
+# Programs without a Sys.init, whose test scripts set up the stack and
+# segments instead. The translator always writes the bootstrap, so they are
+# run as the body of a Sys.init which sets them up in the same way.
+WRAPPED_PROGRAMS = [
+    "07/StackArithmetic/SimpleAdd",
+    "07/StackArithmetic/StackTest",
+    "07/MemoryAccess/BasicTest",
+    "07/MemoryAccess/PointerTest",
+    "07/MemoryAccess/StaticTest",
+    "08/ProgramFlow/BasicLoop",
+    "08/ProgramFlow/FibonacciSeries",
+]
+# NestedCall checks RAM[5], which the translator's return uses for the frame
+PROGRAMS = [
+    "08/FunctionCalls/FibonacciElement",
+    "08/FunctionCalls/StaticsTest",
+]
+OPTIONS = [
+    [],
+    ["--fuse"],
+    ["--stack-caching"],
+    ["--fuse", "--stack-caching"],
+    ["--eliminate-dead-functions"],
+    [
+        "--fuse", "--stack-caching", "--shared-calls", "--shared-comparisons",
+        "--eliminate-dead-functions",
+    ],
+]
+# Jumps on conditions which aren't true or false, such as the results of
+# arithmetic in the OS, storing which way each went in static 0 to 2
+CONDITIONS = """function Sys.init 0
+push constant 5
+not
+if-goto NOT_FIVE
+push constant 1
+pop static 0
+goto MINUS_ONE
+label NOT_FIVE
+push constant 2
+pop static 0
+label MINUS_ONE
+push constant 1
+neg
+not
+if-goto NOT_MINUS_ONE
+push constant 3
+pop static 1
+goto SEVEN
+label NOT_MINUS_ONE
+push constant 4
+pop static 1
+label SEVEN
+push constant 7
+if-goto IS_SEVEN
+push constant 5
+pop static 2
+goto HALT
+label IS_SEVEN
+push constant 6
+pop static 2
+label HALT
+goto HALT
+"""
+CONDITIONS_SCRIPT = """load Conditions.asm,
+output-file Conditions.out,
+compare-to Conditions.cmp,
+output-list RAM[16]%D1.6.1 RAM[17]%D1.6.1 RAM[18]%D1.6.1;
+
+repeat 1000 {
+  ticktock;
+}
+
+output;
+"""
+CONDITIONS_COMPARISON = "|RAM[16] |RAM[17] |RAM[18] |\n|      2 |      3 |      6 |\n"
+SET_PATTERN = re.compile(r"set RAM\[(\d+)\] (\d+),?")
+WRAPPED_CYCLES = 20_000
+
+
+def _wrap(program: str, directory) -> None:
+    """Write the program as the body of Sys.init, with a copy of its test
+    script which leaves the setting up to Sys.init, into directory"""
+    name = os.path.basename(program)
+    source = os.path.join(PROJECTS_DIR, program)
+    directory.mkdir()
+    with open(os.path.join(source, f"{name}.tst")) as f:
+        script = f.read()
+    with open(os.path.join(source, f"{name}.vm")) as f:
+        body = f.read()
+
+    # Each RAM[address] is set through pointer 1, so THAT is set last
+    settings = sorted(SET_PATTERN.findall(script), key=lambda setting: setting[0] == "4")
+    setup = "".join(
+        f"push constant {value}\npush constant {address}\npop pointer 1\npop that 0\n"
+        for address, value in settings
+    )
+    (directory / "Sys.vm").write_text(
+        f"function Sys.init 0\n{setup}{body}\nlabel HALT\ngoto HALT\n"
+    )
+    script = SET_PATTERN.sub("", script)
+    (directory / f"{name}.tst").write_text(
+        re.sub(r"repeat \d+", f"repeat {WRAPPED_CYCLES}", script)
+    )
+    shutil.copy(os.path.join(source, f"{name}.cmp"), directory)
+
+
+@pytest.mark.parametrize("options", OPTIONS, ids=lambda options: " ".join(options) or "plain")
+def test_suites(tmp_path, options):
+    programs = []
+    for program in WRAPPED_PROGRAMS:
+        programs.append(tmp_path / os.path.basename(program))
+        _wrap(program, programs[-1])
+    for program in PROGRAMS:
+        programs.append(tmp_path / os.path.basename(program))
+        shutil.copytree(
+            os.path.join(PROJECTS_DIR, program),
+            programs[-1],
+            ignore=shutil.ignore_patterns("*.asm", "*.out"),
+        )
+    programs.append(tmp_path / "Conditions")
+    programs[-1].mkdir()
+    (programs[-1] / "Sys.vm").write_text(CONDITIONS)
+    (programs[-1] / "Conditions.tst").write_text(CONDITIONS_SCRIPT)
+    (programs[-1] / "Conditions.cmp").write_text(CONDITIONS_COMPARISON)
+    for program in programs:
+        subprocess.run(
+            [sys.executable, "main.py", str(program), *options],
+            cwd=TRANSLATOR_DIR,
+            check=True,
+        )
+
+    results_path = tmp_path / "results.json"
+    subprocess.run(
+        [
+            sys.executable, "-m", "CPUEmulator.runner", *map(str, programs),
+            "--workers", "1", "--json", str(results_path),
+        ],
+        cwd=EMULATOR_DIR,
+        stdout=subprocess.DEVNULL,
+    )
+    results = json.loads(results_path.read_text())["results"]
+
+    run = [result for result in results if result["status"] != "skipped"]
+    assert len(run) == len(programs)
+    assert [result for result in run if result["status"] != "passed"] == []